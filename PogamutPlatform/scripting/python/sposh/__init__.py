@@ -8,4 +8,24 @@ from element import Element, PlanElement, ElementCollection, FireResult
 from action_pattern import ActionPattern
 from drive import DriveCollection, DriveElement, DrivePriorityElement
 from competence import Competence, CompetencePriorityElement, CompetenceElement
-from planbuilder import PlanBuilder
\ No newline at end of file
+from planbuilder import PlanBuilder, PlanDiff
+from lazyimport import LazyClass
+SenseBits = LazyClass('bittrigger', 'SenseBits')
+Blackboard = LazyClass('blackboard', 'Blackboard')
+TraceRecorder = LazyClass('sensetrace', 'TraceRecorder')
+TraceReader = LazyClass('sensetrace', 'TraceReader')
+TraceReplayer = LazyClass('sensetrace', 'TraceReplayer')
+PlanWatcher = LazyClass('planreload', 'PlanWatcher')
+BatchEngine = LazyClass('batch', 'BatchEngine')
+Speculator = LazyClass('speculation', 'Speculator')
+SensePool = LazyClass('parallelsense', 'SensePool')
+CostRecorder = LazyClass('plananalysis', 'CostRecorder')
+Zygote = LazyClass('zygote', 'Zygote')
+EngineServer = LazyClass('engineserver', 'EngineServer')
+EngineClient = LazyClass('engineserver', 'EngineClient')
+OverloadController = LazyClass('loadshed', 'OverloadController')
+InspectionServer = LazyClass('inspection', 'InspectionServer')
+InspectionClient = LazyClass('inspection', 'InspectionClient')
+PlanLibrary = LazyClass('planlibrary', 'PlanLibrary')
+TriggerPredictor = LazyClass('prediction', 'TriggerPredictor')
+MetricsServer = LazyClass('metrics', 'MetricsServer')
@@ -26,9 +26,19 @@ class Action(CopiableElement):
         beh_dict = agent.getBehaviourDict()
         self._action = beh_dict.getAction(action_name)
         behaviour = beh_dict.getActionBehaviour(action_name)
-        self._name = "%s.%s" % (behaviour.getName(), action_name)
+        self._name = intern("%s.%s" % (behaviour.getName(), action_name))
         self.debug("Created")
     
+    def getActionName(self):
+        """Returns the name of the action in the behaviour dictionary.
+
+        The name is taken from the log domain, "Action.[action_name]".
+
+        @return: The action name.
+        @rtype: string
+        """
+        return self._domain[7:]
+
     def fire(self):
         """Performs the action and returns if it was successful.
         
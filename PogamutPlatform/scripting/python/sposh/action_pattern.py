@@ -1,18 +1,21 @@
 """Implementation of an ActionPattern.
 """
 
-# Python modules
-from copy import copy
-
 # POSH modules
 from element import ElementCollection, FireResult
 from action import Action
 from sense import Sense
+# copy is imported by copy(), when needed
 
 
 class ActionPattern(ElementCollection):
     """An Action Pattern.
     """
+    # completes the action pattern when first fired, if built lazily
+    _lazy = None
+    # the maximum time spent in the action pattern, or None if not limited
+    _time_limit = None
+
     def __init__(self, agent, pattern_name, elements):
         """Initialises the action pattern.
         
@@ -28,7 +31,7 @@ class ActionPattern(ElementCollection):
             and L{SPOSH.Competence}
         """
         ElementCollection.__init__(self, agent, "AP.%s" % pattern_name)
-        self._name = pattern_name
+        self._name = intern(pattern_name)
         self._elements = elements
         self._element_idx = 0
         self.debug("Created")
@@ -41,6 +44,69 @@ class ActionPattern(ElementCollection):
         """
         self.debug("Reset")
         self._element_idx = 0
+
+    def getState(self):
+        """Returns the mutable execution state of the action pattern.
+
+        @return: The index of the element to fire next.
+        @rtype: int
+        """
+        return self._element_idx
+
+    def setState(self, element_idx):
+        """Sets the mutable execution state of the action pattern.
+
+        An index that is out of the range of the pattern's elements
+        resets the pattern.
+
+        @param element_idx: The index of the element to fire next.
+        @type element_idx: int
+        """
+        if element_idx < 0 or element_idx >= len(self._elements):
+            element_idx = 0
+        self._element_idx = element_idx
+
+    def getTimeLimit(self):
+        """Returns the maximum time that a drive element may spend in the
+        action pattern.
+
+        @return: The time limit in milliseconds, or None if the time is
+            not limited.
+        @rtype: long or None
+        """
+        return self._time_limit
+
+    def setTimeLimit(self, time_limit):
+        """Sets the maximum time that a drive element may spend in the
+        action pattern.
+
+        The time is taken from the agent's timer, and covers the elements
+        that the action pattern descends into. See L{SPOSH.DriveElement.fire}.
+
+        @param time_limit: The time limit in milliseconds, or None to not
+            limit the time.
+        @type time_limit: long or None
+        """
+        self._time_limit = time_limit
+
+    def getLazyBuild(self):
+        """Returns the object that completes the action pattern when it
+        is first fired.
+
+        @return: The lazy build, or None if the action pattern is complete.
+        @rtype: L{SPOSH.planbuilder._LazyBuild} or None
+        """
+        return self._lazy
+
+    def setLazyBuild(self, lazy):
+        """Sets the object that completes the action pattern when it is
+        first fired.
+
+        @param lazy: The lazy build, or None if the action pattern is
+            complete.
+        @type lazy: L{SPOSH.planbuilder._LazyBuild} or None
+        """
+        self._lazy = lazy
     
     def fire(self):
         """Fires the action pattern.
@@ -63,6 +129,8 @@ class ActionPattern(ElementCollection):
         @rtype: L{SPOSH.FireResult}
         """
         self.debug("Fired")
+        if self._lazy:
+            self._lazy.complete(self)
         element = self._elements[self._element_idx]
         # type() doesn't work, which is why we have to use __class__
         if element.__class__ == Action or element.__class__ == Sense:
@@ -91,6 +159,7 @@ class ActionPattern(ElementCollection):
         @return: A reset copy of itsself.
         @rtype: L{SPOSH.ActionPattern}
         """
+        from copy import copy
         new_obj = copy(self)
         new_obj.reset()
         return new_obj
@@ -13,9 +13,19 @@
 
 # POSH modules
 from behaviour_dict import BehaviourDict
+from blackboard import Blackboard
 from lapparser import LAPParser
 from logbase import *
 from timer import *
+from competence import Competence
+# the modules of the optional checkpoints, bitmask triggers, decision
+# cache, speculation, parallel senses, load shedding, inspection and plan
+# library are imported when these are used, to keep the agent's startup
+# short
+
+# Python modules
+import thread
+import time
 
 # drive collection results
 DRIVE_FOLLOWED = 0
@@ -25,18 +35,35 @@ DRIVE_LOST = -1
 class Agent(LogBase):
     """A POSH Agent.
     """
-    def __init__(self, behaviours, plan, log):
+    def __init__(self, behaviours, plan, log, recorder = None, lazy = 0,
+                 plan_builder = None):
         """Initialises the agent with the given behaviours and plan.
         
         This method register the behaviours and uses them in
         the plan with the given name.
 
+        If a recorder is given, it is attached to the behaviour dictionary
+        before the plan is built, such that all senses and actions of the
+        plan are recorded, and it is added as a tick listener.
+
+        If lazy is set, then the competences and action pattern of the plan
+        are only built when they are fired for the first time (see
+        L{SPOSH.PlanBuilder.setLazy}). The senses of elements that are built
+        lazily do not use threshold indices.
+
         @param behaviours: list or sequence of Behaviours instances
         @type behaviours: list or sequence of Behavours instances
         @param plan: Name of the plan (complete path + file + extension).
         @type plan: string
         @param log: java.util.logging.Logger instance
         @type java.logging.Logger        
+        @param recorder: An optional sense / action recorder.
+        @type recorder: L{SPOSH.TraceRecorder} or None
+        @param lazy: If the plan is built lazily.
+        @type lazy: boolean
+        @param plan_builder: The parsed plan, which is used rather than
+            parsing the plan file, or None. It must not have been built.
+        @type plan_builder: L{SPOSH.PlanBuilder} or None
         """
         # initialize the logging
         LogBase.__init__(self, log, "Agent")
@@ -45,15 +72,79 @@ class Agent(LogBase):
         # the timer will fail. setTimer() is called when the drive
         # collection is built.
         self._timer = None
+        self._dc = None
+        # the index of the plan's stateful elements, built on demand
+        self._plan_state = None
+        # the senses of the plan that the optimisations were prepared for
+        self._prepared_senses = {}
+        # the sense bits of compiled triggers, if enabled
+        self._bits = None
+        # the decision cache, if enabled
+        self._decisions = None
+        # the speculator of triggers, if enabled
+        self._speculator = None
+        # the parallel evaluation of senses, if enabled
+        self._parallel = None
+        # the shedding of drives under overload, if enabled
+        self._shedding = None
+        # the prediction of trigger outcomes, if enabled
+        self._prediction = None
+        # the counters of the engine, if enabled
+        self._metrics = None
+        # the snapshots of the behaviours' inspectors, if enabled
+        self._inspection = None
+        # the built plans to switch between, if enabled
+        self._library = None
+        # guards the plan library and the pending plan, which are changed
+        # by other threads than the one running the agent
+        self._plan_lock = thread.allocate_lock()
+        # objects that are notified at the start and end of each tick
+        self._tick_listeners = []
+        # if plans are built lazily
+        self._lazy = lazy
                 
+        # the world state that slot senses read
+        self._blackboard = Blackboard()
         # load the behaviours
+        start = time.time()
         self._bdict = self._loadBehaviours(behaviours)
+        registered = time.time()
+        if recorder:
+            recorder.attach(self._bdict)
+            self.addTickListener(recorder)
         
         # load the plan an create the tree
-        plan_str = open(plan).read()
-        plan_builder = LAPParser().parse(plan_str)
-        self._dc = plan_builder.build(self)
+        self._plan = plan
+        if plan_builder:
+            self._plan_builder = plan_builder
+        else:
+            self._plan_builder = LAPParser().parse(open(plan).read())
+        parsed = time.time()
+        self._plan_builder.setLazy(lazy)
+        self._dc = self._plan_builder.build(self)
+        self._attachThresholdIndices(None)
+        self._setPreparedSenses()
+        # the time to register the behaviours, and to parse and build
+        # the plan, in milliseconds
+        self._startup_times = ((registered - start) * 1000.0,
+                               (parsed - registered) * 1000.0,
+                               (time.time() - parsed) * 1000.0)
+        # a rebuilt plan that replaces the current one at the next tick,
+        # as (plan builder, drive collection, timer, plan name)
+        self._pending_plan = None
+        # the name of the plan in the plan library
+        self._plan_name = plan
         
+    def getStartupTimes(self):
+        """Returns the time that the creation of the agent took.
+
+        @return: The time to register the behaviours, to parse the plan
+            (including reading its file), and to build the plan, in
+            milliseconds.
+        @rtype: (float, float, float)
+        """
+        return self._startup_times
+
     def getBehaviourDict(self):
         """Returns the agent's behaviour dictionary.
 
@@ -62,6 +153,25 @@ class Agent(LogBase):
         """
         return self._bdict
     
+    def getBlackboard(self):
+        """Returns the agent's blackboard.
+
+        The game connector writes the world state into the blackboard
+        once per tick, from which the slot senses of the behaviours read.
+
+        @return: The agent's blackboard.
+        @rtype: L{SPOSH.Blackboard}
+        """
+        return self._blackboard
+
+    def getDriveCollection(self):
+        """Returns the drive collection, i.e. the root of the agent's plan.
+
+        @return: The agent's drive collection.
+        @rtype: L{SPOSH.DriveCollection}
+        """
+        return self._dc
+
     def getBehaviours(self):
         """Returns the agent's behaviour objects.
         
@@ -83,6 +193,11 @@ class Agent(LogBase):
         """
         self._timer = timer
         self._timer.reset()
+        if self._speculator:
+            timer.setIdleTask(self._speculator)
+        # the drive collection might have been built with another timer
+        if self._dc:
+            self._dc.setTimer(timer)
         
     def setSteppedTimer(self):
         """
@@ -111,6 +226,651 @@ class Agent(LogBase):
         """
         self._timer.reset()
     
+    def snapshot(self):
+        """Returns a snapshot of the agent's execution state.
+
+        The snapshot contains the slip-stack position and firing frequency
+        state of the drive elements, the positions of the action patterns,
+        the retry counts of the competence elements and the timer time.
+        It does not contain the plan itself, nor the behaviours.
+
+        @return: The snapshot.
+        @rtype: string
+        """
+        from checkpoint import snapshot
+        return snapshot(self, self._getPlanState())
+
+    def restore(self, data):
+        """Restores the agent's execution state from a snapshot.
+
+        The agent needs to have been built from the same plan as the
+        agent that the snapshot was taken from. Elements that are not
+        part of the plan anymore are ignored.
+
+        @param data: The snapshot, as returned by L{snapshot}.
+        @type data: string
+        @raise ValueError: If the snapshot has an unsupported version.
+        """
+        from checkpoint import restore
+        restore(self, self._getPlanState(), data)
+
+    def _getPlanState(self):
+        """Returns the state index of the agent's plan.
+
+        @return: The state index.
+        @rtype: L{SPOSH.checkpoint.PlanState}
+        """
+        if not self._plan_state:
+            from checkpoint import PlanState
+            self._plan_state = PlanState(self._dc)
+        return self._plan_state
+
+    def reloadPlan(self, plan = None):
+        """Re-reads the plan and rebuilds its changed parts.
+
+        Only the competences, action pattern and drive elements that
+        changed are rebuilt. All other elements are taken over from the
+        running plan, together with their execution state. The new plan
+        replaces the running one at the start of the next call to
+        L{followDrive}, such that this method can also be called from
+        another thread than the one running the agent.
+
+        @param plan: Name of the plan (complete path + file + extension),
+            or None to re-read the current plan file.
+        @type plan: string or None
+        @return: The differences between the running and the new plan.
+        @rtype: L{SPOSH.PlanDiff}
+        @raise ParseError: If the plan could not be parsed.
+        @raise NameError: If the plan could not be built.
+        """
+        if plan == None:
+            plan = self._plan
+        self.debug("Reloading plan '%s'" % plan)
+        plan_builder = LAPParser().parse(open(plan).read())
+        plan_builder.setLazy(self._lazy)
+        dc, timer, diff = plan_builder.rebuild(self, self._plan_builder)
+        self._plan_lock.acquire()
+        try:
+            self._plan = plan
+            if self._library:
+                self._library.addPlan(self._plan_name, plan)
+            self._pending_plan = (plan_builder, dc, timer, self._plan_name)
+        finally:
+            self._plan_lock.release()
+        self.debug("Plan rebuilt (%s)" % diff)
+        return diff
+
+    def getPlanSenses(self):
+        """Returns the distinct senses and sense-acts of the plan.
+
+        If the plan builder does not share identical senses, then these
+        are all given.
+
+        @rtype: list of L{SPOSH.Sense}
+        """
+        return self._plan_builder.getSenses()
+
+    def getPlan(self):
+        """Returns the name of the plan file of the agent.
+
+        @return: Name of the plan (complete path + file + extension).
+        @rtype: string
+        """
+        return self._plan
+
+    def _installPendingPlan(self):
+        """Replaces the running plan by the pending one.
+        """
+        self._plan_lock.acquire()
+        try:
+            if not self._pending_plan:
+                return
+            plan_builder, dc, timer, name = self._pending_plan
+            self._pending_plan = None
+            running = self._plan_builder
+            self._plan_builder = plan_builder
+            self._attachThresholdIndices(running)
+            self._dc = dc
+            if timer:
+                # a timer that a plan of the plan library used before
+                # continues with its time
+                now = timer.time()
+                self.setTimer(timer)
+                timer.setTime(now)
+            self._plan_name = name
+            if self._library:
+                self._library.store(name, plan_builder, dc, self._timer)
+        finally:
+            self._plan_lock.release()
+        self._preparePlan()
+        self.debug("Plan replaced")
+
+    def enablePlanLibrary(self, max_bytes = None):
+        """Enables the library of built plans, as described in
+        L{SPOSH.planlibrary}.
+
+        The current plan is the first plan of the library, named by its
+        plan file. The library is also enabled by L{addPlan}.
+
+        @param max_bytes: The maximum estimated bytes of the built plans,
+            or None to not limit them.
+        @type max_bytes: long or None
+        """
+        from planlibrary import PlanLibrary
+        library = PlanLibrary(max_bytes)
+        self._plan_lock.acquire()
+        try:
+            library.addPlan(self._plan_name, self._plan)
+            library.store(self._plan_name, self._plan_builder, self._dc,
+                          self._timer)
+            self._library = library
+        finally:
+            self._plan_lock.release()
+
+    def getPlanLibrary(self):
+        """Returns the library of built plans.
+
+        @return: The library, or None if it is not enabled.
+        @rtype: L{SPOSH.planlibrary.PlanLibrary} or None
+        """
+        return self._library
+
+    def addPlan(self, name, plan, build = 1):
+        """Adds a plan to the plan library, such that the agent can
+        switch to it by L{switchPlan}.
+
+        @param name: The name of the plan.
+        @type name: string
+        @param plan: Name of the plan (complete path + file + extension).
+        @type plan: string
+        @param build: If the plan is built now, rather than at the first
+            switch to it.
+        @type build: boolean
+        @raise ParseError: If the plan could not be parsed.
+        @raise NameError: If the plan could not be built.
+        """
+        if not self._library:
+            self.enablePlanLibrary()
+        self._plan_lock.acquire()
+        try:
+            self._library.addPlan(name, plan)
+        finally:
+            self._plan_lock.release()
+        if build:
+            plan_builder, dc, timer = self._buildAside(plan)
+            self._plan_lock.acquire()
+            try:
+                self._library.store(name, plan_builder, dc, timer,
+                                    self._plan_name)
+            finally:
+                self._plan_lock.release()
+
+    def _buildAside(self, plan):
+        """Reads, parses and builds a plan without putting it in place.
+
+        @return: The plan builder, the drive collection and the timer.
+        @rtype: (L{SPOSH.PlanBuilder}, L{SPOSH.DriveCollection},
+            L{SPOSH.TimerBase})
+        """
+        plan_builder = LAPParser().parse(open(plan).read())
+        plan_builder.setLazy(self._lazy)
+        dc, timer = plan_builder.buildAside(self)
+        return plan_builder, dc, timer
+
+    def switchPlan(self, name):
+        """Switches to a plan of the plan library.
+
+        The plan replaces the running one at the start of the next call to
+        L{followDrive}, such that this method can also be called from
+        another thread than the one running the agent. The plan library
+        and the pending plan are guarded by a lock, which is not held
+        while a plan is built. If the plan is built, neither the plan nor
+        any other part of the plan is built again, and the plan continues
+        with the execution state that it had when the agent switched away
+        from it. Otherwise, it is built from its plan file.
+
+        @param name: The name of the plan, as given to L{addPlan}.
+        @type name: string
+        @raise KeyError: If the plan is not in the library.
+        @raise ParseError: If the plan could not be parsed.
+        @raise NameError: If the plan could not be built.
+        """
+        if not self._library:
+            self.enablePlanLibrary()
+        self._plan_lock.acquire()
+        try:
+            library = self._library
+            plan = library.getPlanFile(name)
+            if name == self._plan_name and not self._pending_plan:
+                return
+            self.debug("Switching to plan '%s'" % name)
+            # the running plan keeps the current timer for its next use
+            library.store(self._plan_name, self._plan_builder, self._dc,
+                          self._timer)
+            built = library.lookup(name)
+        finally:
+            self._plan_lock.release()
+        if built:
+            plan_builder, dc, timer = built
+        else:
+            plan_builder, dc, timer = self._buildAside(plan)
+        self._plan_lock.acquire()
+        try:
+            if timer.__class__ == self._timer.__class__:
+                timer = None
+                dc.setTimer(self._timer)
+            self._plan = plan
+            self._pending_plan = (plan_builder, dc, timer, name)
+        finally:
+            self._plan_lock.release()
+
+    def getPlanName(self):
+        """Returns the name of the plan in the plan library.
+
+        @return: The name of the plan, which is its plan file if it was
+            not given another name by L{addPlan}.
+        @rtype: string
+        """
+        return self._plan_name
+
+    def planExtended(self, element):
+        """Notifies the agent that a competence or action pattern of a
+        lazily built plan was completed.
+
+        Only the completed element is prepared: it is added to the state
+        index, the triggers of a competence are compiled and it caches its
+        decisions, and the senses that were built with it are prepared for
+        the decision cache, the parallel sense evaluation and the metrics.
+        The drive collection does not change, so neither do speculation,
+        load shedding and trigger prediction.
+
+        @param element: The completed element.
+        @type element: L{SPOSH.Competence} or L{SPOSH.ActionPattern}
+        """
+        self.debug("Plan extended by '%s'" % element.getName())
+        prepared = self._prepared_senses
+        senses = []
+        for sense in self.getPlanSenses():
+            if not prepared.has_key(sense):
+                prepared[sense] = 1
+                senses.append(sense)
+        if self._plan_state:
+            self._plan_state.extend(element)
+        competence = element.__class__ == Competence
+        if self._bits and competence:
+            for priority_element in element.getElements():
+                self._bits.compilePriorityElement(priority_element)
+        if self._decisions:
+            self._decisions.attach(senses)
+            if competence:
+                element.setDecisionCache(self._decisions)
+        if self._parallel:
+            self._parallel.addSenses(senses)
+        if self._metrics:
+            self._metrics.addSenses(senses)
+
+    def _setPreparedSenses(self):
+        """Notes the senses of the current plan as prepared, such that
+        L{planExtended} only prepares the senses that are built later.
+        """
+        prepared = {}
+        for sense in self.getPlanSenses():
+            prepared[sense] = 1
+        self._prepared_senses = prepared
+
+    def _preparePlan(self):
+        """Prepares the enabled optimisations for the current plan.
+        """
+        dc = self._dc
+        self._plan_state = None
+        self._setPreparedSenses()
+        # the senses are counted with the methods that the other
+        # optimisations set
+        if self._metrics:
+            self._metrics.restore()
+        if self._bits:
+            self._compileBitTriggers(self._bits)
+        if self._decisions:
+            self._decisions.clear()
+            self._setDecisionCaches(self._decisions)
+        if self._speculator:
+            self._speculator.prepare(dc)
+        if self._parallel:
+            self._parallel.prepare(dc, self.getPlanSenses())
+        if self._shedding:
+            self._shedding.prepare(dc)
+        if self._prediction:
+            self._prediction.prepare(dc)
+        if self._metrics:
+            self._metrics.prepare(dc)
+
+    def _attachThresholdIndices(self, running):
+        """Attaches the threshold indices of the plan to their senses.
+
+        @param running: The plan builder of the plan that is replaced,
+            whose indices are detached, or None.
+        @type running: L{SPOSH.PlanBuilder} or None
+        """
+        if running:
+            for index in running.getThresholdIndices():
+                self.removeTickListener(index)
+                index.detach()
+        for index in self._plan_builder.getThresholdIndices():
+            index.attach()
+            self.addTickListener(index)
+
+    def enableBitTriggers(self, enable = 1):
+        """Enables or disables the evaluation of triggers by bitmasks.
+
+        If enabled, the triggers of all drive and competence elements
+        are compiled such that their boolean senses are sampled once per
+        tick into a bitmask, and the readiness of the elements is checked
+        by mask operations. Senses that are not declared boolean by their
+        behaviour are fired as before.
+
+        @param enable: If bitmask triggers are to be used.
+        @type enable: boolean
+        """
+        if enable and not self._bits:
+            from bittrigger import SenseBits
+            self._bits = SenseBits(self._bdict)
+            self.addTickListener(self._bits)
+            self._compileBitTriggers(self._bits)
+        elif not enable and self._bits:
+            self.removeTickListener(self._bits)
+            self._bits = None
+            self._compileBitTriggers(None)
+
+    def _compileBitTriggers(self, bits):
+        """Compiles the triggers of all priority elements of the plan.
+
+        @param bits: The sense bits to compile the triggers with, or None
+            to return to firing the triggers.
+        @type bits: L{SPOSH.bittrigger.SenseBits} or None
+        """
+        from checkpoint import indexPlan
+        priority_elements = list(self._dc.getElements())
+        for path, element in indexPlan(self._dc).items():
+            if path[:2] == "C.":
+                priority_elements.extend(element.getElements())
+        for priority_element in priority_elements:
+            if bits:
+                bits.compilePriorityElement(priority_element)
+            else:
+                priority_element.setBitTriggers(None, [], [])
+
+    def enableDecisionCache(self, size = 256):
+        """Enables or disables caching the decisions of the plan.
+
+        If enabled, the drive collection and the competences cache which
+        element they select, given the readings of the pure senses of
+        their goal and triggers, as described in
+        L{SPOSH.decisioncache}.
+
+        @param size: The maximum number of cached decisions, or 0 to
+            disable the cache.
+        @type size: int
+        """
+        if self._decisions:
+            self.removeTickListener(self._decisions)
+            self._decisions.detach()
+            self._decisions = None
+            self._setDecisionCaches(None)
+        if size > 0:
+            from decisioncache import DecisionCache
+            self._decisions = DecisionCache(self._bdict, size)
+            self.addTickListener(self._decisions)
+            self._setDecisionCaches(self._decisions)
+
+    def getDecisionCache(self):
+        """Returns the decision cache.
+
+        @return: The decision cache, or None if it is not enabled.
+        @rtype: L{SPOSH.decisioncache.DecisionCache} or None
+        """
+        return self._decisions
+
+    def _setDecisionCaches(self, cache):
+        """Sets the decision cache of the drive collection and all
+        competences of the plan.
+
+        @param cache: The decision cache, or None.
+        @type cache: L{SPOSH.decisioncache.DecisionCache} or None
+        """
+        from checkpoint import indexPlan
+        if cache:
+            cache.detach()
+            cache.attach(self.getPlanSenses())
+        self._dc.setDecisionCache(cache)
+        for path, element in indexPlan(self._dc).items():
+            if path[:2] == "C.":
+                element.setDecisionCache(cache)
+
+    def enableSpeculation(self, enable = 1, max_elements = None):
+        """Enables or disables the evaluation of triggers ahead of time.
+
+        If enabled, the triggers of the drive elements whose senses are
+        all speculative are evaluated while the real-time timer waits,
+        as described in L{SPOSH.speculation}.
+
+        @param enable: If triggers are evaluated ahead of time.
+        @type enable: boolean
+        @param max_elements: The number of drive elements, in their order
+            of priority, whose triggers are evaluated, or None for all.
+        @type max_elements: int or None
+        """
+        if self._speculator:
+            self.removeTickListener(self._speculator)
+            self._speculator.discard()
+            self._timer.setIdleTask(None)
+            self._speculator = None
+        if enable:
+            from speculation import Speculator
+            self._speculator = Speculator(self, max_elements)
+            self.addTickListener(self._speculator)
+            self._timer.setIdleTask(self._speculator)
+
+    def getSpeculator(self):
+        """Returns the speculator of triggers.
+
+        @return: The speculator, or None if speculation is not enabled.
+        @rtype: L{SPOSH.speculation.Speculator} or None
+        """
+        return self._speculator
+
+    def enableParallelSenses(self, pool = None, max_elements = None):
+        """Enables or disables the concurrent evaluation of senses.
+
+        If enabled, the parallel senses of the triggers of the drive
+        elements are evaluated in the given pool at the start of each
+        tick, as described in L{SPOSH.parallelsense}.
+
+        @param pool: The pool to evaluate the senses in, or None to disable
+            the concurrent evaluation.
+        @type pool: L{SPOSH.SensePool} or None
+        @param max_elements: The number of drive elements, in their order
+            of priority, whose triggers' senses are evaluated, or None for
+            all.
+        @type max_elements: int or None
+        """
+        if self._parallel:
+            self.removeTickListener(self._parallel)
+            self._parallel.restore()
+            self._parallel = None
+        if pool:
+            from parallelsense import ParallelSenses
+            self._parallel = ParallelSenses(self, pool, max_elements)
+            self.addTickListener(self._parallel)
+
+    def getParallelSenses(self):
+        """Returns the concurrent evaluation of senses.
+
+        @return: The parallel senses, or None if not enabled.
+        @rtype: L{SPOSH.parallelsense.ParallelSenses} or None
+        """
+        return self._parallel
+
+    def enableLoadShedding(self, enable = 1, threshold = 5, patience = 10,
+                           recovery = 50, interval = 500, protect = 1,
+                           external = 0):
+        """Enables or disables the shedding of drives under overload.
+
+        If enabled, the lower-priority elements of the drive collection
+        are selected less often, or not at all, while the ticks of the
+        agent are late, as described in L{SPOSH.loadshed}. See
+        L{SPOSH.loadshed.OverloadController} for the parameters.
+
+        @param enable: If drives are shed under overload.
+        @type enable: boolean
+        """
+        if self._shedding:
+            self.removeTickListener(self._shedding)
+            self._shedding.restore()
+            self._shedding = None
+        if enable:
+            from loadshed import OverloadController
+            self._shedding = OverloadController(self, threshold, patience,
+                                                recovery, interval, protect,
+                                                external)
+            self.addTickListener(self._shedding)
+
+    def getOverloadController(self):
+        """Returns the controller of the shedding of drives.
+
+        @return: The controller, or None if load shedding is not enabled.
+        @rtype: L{SPOSH.loadshed.OverloadController} or None
+        """
+        return self._shedding
+
+    def enableTriggerPrediction(self, enable = 1, min_rate = 0.02,
+                                min_samples = 20, recheck = 50,
+                                window = 1000):
+        """Enables or disables the prediction of trigger outcomes.
+
+        If enabled, the triggers of drive elements that are unlikely to be
+        satisfied, given the drive element selected in the tick before,
+        are not evaluated, as described in L{SPOSH.prediction}. See
+        L{SPOSH.prediction.TriggerPredictor} for the parameters.
+
+        @param enable: If trigger outcomes are predicted.
+        @type enable: boolean
+        """
+        if self._prediction:
+            self.removeTickListener(self._prediction)
+            self._prediction.restore()
+            self._prediction = None
+        if enable:
+            from prediction import TriggerPredictor
+            self._prediction = TriggerPredictor(self, min_rate, min_samples,
+                                                recheck, window)
+            self.addTickListener(self._prediction)
+
+    def getTriggerPredictor(self):
+        """Returns the predictor of trigger outcomes.
+
+        @return: The predictor, or None if prediction is not enabled.
+        @rtype: L{SPOSH.prediction.TriggerPredictor} or None
+        """
+        return self._prediction
+
+    def enableMetrics(self, enable = 1, samples = 1024):
+        """Enables or disables the counters of the engine.
+
+        If enabled, the ticks, their results and durations, the firings of
+        the drive elements and the calls of the senses are counted, as
+        described in L{SPOSH.metrics}. Metrics should be enabled after the
+        other optimisations, as those might replace the counted senses.
+
+        @param enable: If the counters are enabled.
+        @type enable: boolean
+        @param samples: The number of the last ticks whose durations are
+            kept.
+        @type samples: int
+        """
+        if self._metrics:
+            self.removeTickListener(self._metrics)
+            self._metrics.restore()
+            self._metrics = None
+        if enable:
+            from metrics import AgentMetrics
+            self._metrics = AgentMetrics(self, samples)
+            self.addTickListener(self._metrics)
+
+    def getMetrics(self):
+        """Returns the counters of the engine.
+
+        @return: The counters, or None if they are not enabled.
+        @rtype: L{SPOSH.metrics.AgentMetrics} or None
+        """
+        return self._metrics
+
+    def serveMetrics(self, name, port = 0):
+        """Starts serving the counters of the engine over HTTP.
+
+        The counters are enabled if they are not. See
+        L{SPOSH.metrics.MetricsServer}.
+
+        @param name: The name of the agent in the metrics.
+        @type name: string
+        @param port: The port of the local host to listen on, or 0 for any
+            free port.
+        @type port: int
+        @return: The started server, which has to be stopped by the caller.
+        @rtype: L{SPOSH.metrics.MetricsServer}
+        """
+        from metrics import MetricsServer
+        server = MetricsServer({name: self}, port)
+        server.start()
+        return server
+
+    def enableInspection(self, enable = 1):
+        """Enables or disables the snapshots of the inspectors.
+
+        If enabled, the values of the inspectors of all behaviours can be
+        collected at the end of a tick and read from other threads, as
+        described in L{SPOSH.inspection}.
+
+        @param enable: If snapshots of the inspectors are enabled.
+        @type enable: boolean
+        """
+        if self._inspection:
+            self.removeTickListener(self._inspection)
+            self._inspection = None
+        if enable:
+            from inspection import Inspection
+            self._inspection = Inspection(self)
+            self.addTickListener(self._inspection)
+
+    def getInspection(self):
+        """Returns the snapshots of the inspectors.
+
+        @return: The inspection, or None if it is not enabled.
+        @rtype: L{SPOSH.inspection.Inspection} or None
+        """
+        return self._inspection
+
+    def addTickListener(self, listener):
+        """Adds an object that is notified at the start and end of each tick.
+
+        The listener has to provide the methods C{tickStart(agent)}, which
+        is called just before the drive collection is fired, and
+        C{tickEnd(agent, result)}, which is called after the drive collection
+        has been fired, with the result of L{followDrive}.
+
+        @param listener: The listener to add.
+        @type listener: object providing tickStart() and tickEnd()
+        """
+        self._tick_listeners.append(listener)
+
+    def removeTickListener(self, listener):
+        """Removes a previously added tick listener.
+
+        @param listener: The listener to remove.
+        @type listener: object providing tickStart() and tickEnd()
+        @raise ValueError: If the listener was never added.
+        """
+        self._tick_listeners.remove(listener)
+
     def getBehaviour(self, behav_name):
         """Returns the agent's behaviour object with the given name.
 
@@ -131,7 +891,7 @@ class Agent(LogBase):
         """
         
         self.debug("Registering behaviour methods")
-        beh_dict = BehaviourDict()
+        beh_dict = BehaviourDict(self._blackboard)
         
         for behaviour in behaviours:
             self.debug("Loading behaviour '%s'" % behaviour.getName())
@@ -154,13 +914,20 @@ class Agent(LogBase):
         @rtype: DRIVE_FOLLOWED, DRIVE_WON or DRIVE_LOST
         """
         self.debug("SPOSH iteration - processing Drive Collection")
+        if self._pending_plan:
+            self._installPendingPlan()
         self._timer.loopWait()
+        listeners = self._tick_listeners
+        for listener in listeners:
+            listener.tickStart(self)
         result = self._dc.fire()
         self._timer.loopEnd()
         if result.continueExecution():
-            return DRIVE_FOLLOWED
+            result = DRIVE_FOLLOWED
+        elif result.nextElement():
+            result = DRIVE_WON
         else:
-            if result.nextElement():
-                return DRIVE_WON
-            else:
-                return DRIVE_LOST
+            result = DRIVE_LOST
+        for listener in listeners:
+            listener.tickEnd(self, result)
+        return result
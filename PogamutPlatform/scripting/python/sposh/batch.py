@@ -0,0 +1,425 @@
+"""Batch evaluation of a single plan for a population of agents.
+
+For offline population studies, the same plan is run for many agents. A
+L{BatchEngine} takes the plan of a single built agent and the number of
+agents, and keeps the execution state of all agents in Java integer
+arrays, one array per stateful plan element:
+
+  - the current element (slip-stack position) and the time of the last
+    firing of each drive element,
+  - the number of retries of each competence element, and
+  - the position of each action pattern.
+
+At every tick, the sense readings of all agents are given as one column
+per sense, holding a value for each agent. Each sense comparison is
+evaluated over its whole column at once, and so are the conjunctions of
+the triggers. The element selection of each agent then only looks up
+the truth values of its triggers, and returns the index of the action to
+perform (see L{BatchEngine.getActionNames}), or -1 if no action is
+performed. The actions are dispatched to the agents' behaviours, if
+given, and their results are used by the action patterns.
+
+As the senses are given as columns, they are read once per agent and tick,
+even if the agent would not have evaluated them. Sense-acts are treated
+like senses, i.e. their side effects are not performed.
+
+Priority elements of the plan that are shed (see
+L{SPOSH.DrivePriorityElement.setShedInterval}) are shed for all agents,
+each of which selects their drive elements at most once per interval. If
+load shedding is enabled for the plan's agent, its controller is told
+about each tick, as by the agent. The lateness of the ticks is given to
+an external controller (see L{SPOSH.loadshed.OverloadController.observe}).
+"""
+
+# Python modules
+import operator
+
+# Java modules
+from jarray import zeros
+
+# POSH modules
+from action import Action
+from sense import Sense
+from competence import Competence
+from action_pattern import ActionPattern
+from agent import DRIVE_FOLLOWED, DRIVE_WON, DRIVE_LOST
+from behaviour_dict import findMethodName
+
+# kinds of plan nodes and action pattern steps
+_ACTION = 0
+_COMPETENCE = 1
+_ACTIONPATTERN = 2
+_SENSE = 3
+_ELEMENT = 4
+
+
+def _truthColumn(sense, column):
+    """Evaluates a sense for the readings of all agents.
+
+    The comparison is the same as in L{SPOSH.Sense.fire}.
+
+    @param sense: The sense.
+    @type sense: L{SPOSH.Sense}
+    @param column: The readings of the sense of all agents.
+    @type column: sequence
+    @return: If the sense evaluates to 1, for each agent.
+    @rtype: list of booleans
+    """
+    value, pred = sense.getValue(), sense.getPredicate()
+    if value == None:
+        return map(operator.truth, column)
+    elif pred == "==":
+        return [reading == value for reading in column]
+    elif pred == "!=":
+        return [reading != value for reading in column]
+    elif pred == "<=":
+        return [reading <= value for reading in column]
+    elif pred == ">=":
+        return [reading >= value for reading in column]
+    elif pred == ">":
+        return [reading > value for reading in column]
+    elif pred == "<":
+        return [reading < value for reading in column]
+    else:
+        return map(operator.truth, column)
+
+
+class BatchEngine:
+    """Runs the plan of an agent for a population of agents.
+
+    The engine uses the timer of the given agent, which is advanced at
+    the end of each tick, and its load shedding. The agent itself is not
+    fired.
+    """
+    def __init__(self, agent, n):
+        """Compiles the plan of the given agent for n agents.
+
+        @param agent: The agent whose plan is run.
+        @type agent: L{SPOSH.Agent}
+        @param n: The number of agents.
+        @type n: int
+        """
+        self._n = n
+        self._agent = agent
+        self._timer = agent.getTimer()
+        beh_dict = agent.getBehaviourDict()
+        self._behaviour_names = []
+        for behaviour in agent.getBehaviours():
+            self._behaviour_names.append(behaviour.getName())
+        # the senses, triggers, actions and nodes of the plan, by index
+        self._senses, self._sense_ids = [], {}
+        self._triggers, self._trigger_ids = [], {}
+        self._actions, self._action_ids = [], {}
+        # for each action, the index of its behaviour, and the name of the
+        # method that performs it
+        self._action_behaviours, self._action_methods = [], []
+        self._nodes, self._node_ids = [], {}
+        dc = agent.getDriveCollection()
+        self._goal = self._trigger(dc.getGoal())
+        # the priority elements in priority order, and for each, the array
+        # of the timestamps of its last selection while shed, and the
+        # (trigger, max. frequency, root node, current node array,
+        #  last fired array) of each of its drive elements
+        self._priority_elements = list(dc.getElements())
+        self._priorities = []
+        for priority_element in self._priority_elements:
+            drives = []
+            for element in priority_element.getElements():
+                root = self._node(element.getRoot(), beh_dict)
+                current = zeros(n, 'i')
+                last_fired = zeros(n, 'l')
+                for i in xrange(n):
+                    current[i] = root
+                    last_fired[i] = -100000l
+                drives.append((self._trigger(element.getTrigger()),
+                               element.getMaxFreq(), root, current,
+                               last_fired))
+            shed_last = zeros(n, 'l')
+            for i in xrange(n):
+                shed_last[i] = -100000l
+            self._priorities.append((shed_last, drives))
+        # the drive results of the last tick
+        self._results = zeros(n, 'i')
+
+    def _trigger(self, trigger, senses = None):
+        """Returns the index of the given trigger, or None if no
+        trigger is given.
+
+        @param trigger: The trigger.
+        @type trigger: L{SPOSH.Trigger} or None
+        @param senses: The senses of the trigger, if no trigger is given.
+        @type senses: sequence of L{SPOSH.Sense}
+        @rtype: int or None
+        """
+        if trigger:
+            senses = trigger.getSenses()
+        if not senses:
+            return None
+        sense_ids = []
+        for sense in senses:
+            if not self._sense_ids.has_key(sense):
+                self._sense_ids[sense] = len(self._senses)
+                self._senses.append(sense)
+            sense_ids.append(self._sense_ids[sense])
+        sense_ids = tuple(sense_ids)
+        if not self._trigger_ids.has_key(sense_ids):
+            self._trigger_ids[sense_ids] = len(self._triggers)
+            self._triggers.append(sense_ids)
+        return self._trigger_ids[sense_ids]
+
+    def _action(self, action, beh_dict):
+        """Returns the index of the given action.
+
+        @param action: The action.
+        @type action: L{SPOSH.Action}
+        @param beh_dict: The behaviour dictionary of the plan's agent.
+        @type beh_dict: L{SPOSH.BehaviourDict}
+        @rtype: int
+        """
+        name = action.getActionName()
+        if not self._action_ids.has_key(name):
+            self._action_ids[name] = len(self._actions)
+            self._actions.append(name)
+            behaviour = beh_dict.getActionBehaviour(name)
+            self._action_behaviours.append(
+                self._behaviour_names.index(behaviour.getName()))
+            self._action_methods.append(
+                findMethodName(behaviour, "action", name))
+        return self._action_ids[name]
+
+    def _node(self, element, beh_dict):
+        """Returns the index of the node of the given element, compiling
+        the element and everything that it refers to if required.
+
+        @param element: An action, competence or action pattern.
+        @type element: L{SPOSH.Action}, L{SPOSH.Competence} or
+            L{SPOSH.ActionPattern}
+        @param beh_dict: The behaviour dictionary of the plan's agent.
+        @type beh_dict: L{SPOSH.BehaviourDict}
+        @rtype: int
+        """
+        if self._node_ids.has_key(element):
+            return self._node_ids[element]
+        index = len(self._nodes)
+        self._node_ids[element] = index
+        self._nodes.append(None)
+        n = self._n
+        if element.__class__ == Action:
+            node = (_ACTION, self._action(element, beh_dict))
+        elif element.__class__ == Competence:
+            # (trigger, max. retries, target node, retries array) for
+            # each competence element, in priority order
+            comp_elements = []
+            for priority_element in element.getElements():
+                for comp_element in priority_element.getElements():
+                    comp_elements.append(
+                        (self._trigger(comp_element.getTrigger()),
+                         comp_element.getMaxRetries(),
+                         self._node(comp_element.getElement(), beh_dict),
+                         zeros(n, 'i')))
+            node = (_COMPETENCE, self._trigger(element.getGoal()),
+                    comp_elements)
+        elif element.__class__ == ActionPattern:
+            steps = []
+            for ap_element in element.getElements():
+                if ap_element.__class__ == Action:
+                    steps.append((_ACTION,
+                                  self._action(ap_element, beh_dict)))
+                elif ap_element.__class__ == Sense:
+                    steps.append((_SENSE,
+                                  self._trigger(None, (ap_element, ))))
+                else:
+                    steps.append((_ELEMENT,
+                                  self._node(ap_element, beh_dict)))
+            node = (_ACTIONPATTERN, steps, zeros(n, 'i'))
+        else:
+            raise TypeError, "Cannot compile element '%s'" % \
+                  element.getName()
+        self._nodes[index] = node
+        return index
+
+    def getSenseNames(self):
+        """Returns the names of the senses that need to be given for
+        every tick.
+
+        @rtype: list of strings
+        """
+        names = {}
+        for sense in self._senses:
+            names[sense.getSenseName()] = 1
+        return names.keys()
+
+    def getSenses(self):
+        """Returns the distinct senses of the plan.
+
+        @rtype: list of L{SPOSH.Sense}
+        """
+        return self._senses
+
+    def getActionNames(self):
+        """Returns the names of the actions, by their index.
+
+        @rtype: list of strings
+        """
+        return self._actions
+
+    def getResults(self):
+        """Returns the drive results of the last tick, for each agent.
+
+        @return: DRIVE_FOLLOWED, DRIVE_WON or DRIVE_LOST for each agent.
+        @rtype: Java int array
+        """
+        return self._results
+
+    def _evaluate(self, columns):
+        """Evaluates all triggers for all agents.
+
+        @param columns: The sense readings, by sense name.
+        @type columns: dictionary, string -> sequence
+        @return: The truth values of all agents, for each trigger.
+        @rtype: list of lists
+        """
+        sense_truth = []
+        for sense in self._senses:
+            sense_truth.append(_truthColumn(sense,
+                                            columns[sense.getSenseName()]))
+        trigger_truth = []
+        for sense_ids in self._triggers:
+            truth = sense_truth[sense_ids[0]]
+            for sense_id in sense_ids[1:]:
+                truth = map(operator.and_, truth, sense_truth[sense_id])
+            trigger_truth.append(truth)
+        return trigger_truth
+
+    def tick(self, columns, behaviours = None):
+        """Performs one tick for all agents.
+
+        If behaviours are given, the selected action of each agent is
+        performed by the agent's behaviour. Otherwise, all actions are
+        assumed to succeed.
+
+        @param columns: The sense readings of all agents, by sense name.
+            All senses returned by L{getSenseNames} need to be given.
+        @type columns: dictionary, string -> sequence
+        @param behaviours: For each agent, its behaviours in the same order
+            as the behaviours of the plan's agent, or None.
+        @type behaviours: sequence of sequences of L{SPOSH.Behaviour}
+        @return: The index of the selected action for each agent, or -1
+            if no action was selected.
+        @rtype: Java int array
+        @raise KeyError: If the readings of a sense are missing.
+        """
+        shedding = self._agent.getOverloadController()
+        if shedding:
+            shedding.tickStart(self._agent)
+        truth = self._evaluate(columns)
+        timestamp = self._timer.time()
+        # the shed interval of each priority element
+        intervals = [priority_element.getShedInterval() for \
+                     priority_element in self._priority_elements]
+        actions = zeros(self._n, 'i')
+        for i in xrange(self._n):
+            actions[i] = self._tickAgent(i, truth, timestamp, intervals,
+                                         behaviours)
+        self._timer.loopEnd()
+        return actions
+
+    def _tickAgent(self, i, truth, timestamp, intervals, behaviours):
+        """Performs one tick for the agent with the given index.
+
+        This follows L{SPOSH.DriveCollection.fire}, and the selection of
+        L{SPOSH.DrivePriorityElement.select} with the given shed intervals
+        of the priority elements.
+
+        @return: The index of the selected action, or -1.
+        @rtype: int
+        """
+        results = self._results
+        if self._goal != None and truth[self._goal][i]:
+            results[i] = DRIVE_WON
+            return -1
+        priorities = self._priorities
+        for index in xrange(len(priorities)):
+            shed_last, drives = priorities[index]
+            interval = intervals[index]
+            if interval != None:
+                if interval < 0 or timestamp - shed_last[i] < interval:
+                    continue
+                shed_last[i] = timestamp
+            for trigger, max_freq, root, current, last_fired in drives:
+                if trigger != None and not truth[trigger][i]:
+                    continue
+                if max_freq >= 0 and timestamp - last_fired[i] < max_freq:
+                    continue
+                last_fired[i] = timestamp
+                results[i] = DRIVE_FOLLOWED
+                return self._fireDrive(i, root, current, truth, behaviours)
+        results[i] = DRIVE_LOST
+        return -1
+
+    def _fireDrive(self, i, root, current, truth, behaviours):
+        """Fires the current element of a drive element for the agent
+        with the given index.
+
+        This follows L{SPOSH.DriveElement.fire}, and the fire() methods
+        of the actions, competences and action pattern.
+
+        @return: The index of the selected action, or -1.
+        @rtype: int
+        """
+        node = self._nodes[current[i]]
+        if node[0] == _ACTION:
+            current[i] = root
+            self._perform(i, node[1], behaviours)
+            return node[1]
+        elif node[0] == _COMPETENCE:
+            goal, comp_elements = node[1], node[2]
+            if goal != None and truth[goal][i]:
+                current[i] = root
+                return -1
+            for trigger, max_retries, target, retries in comp_elements:
+                if (trigger == None or truth[trigger][i]) and \
+                   (max_retries < 0 or retries[i] <= max_retries):
+                    retries[i] += 1
+                    target_node = self._nodes[target]
+                    if target_node[0] == _ACTION:
+                        current[i] = root
+                        self._perform(i, target_node[1], behaviours)
+                        return target_node[1]
+                    current[i] = target
+                    return -1
+            current[i] = root
+            return -1
+        # action pattern
+        steps, positions = node[1], node[2]
+        kind, index = steps[positions[i]]
+        if kind == _ELEMENT:
+            positions[i] = 0
+            current[i] = index
+            return -1
+        elif kind == _ACTION:
+            action = index
+            success = self._perform(i, action, behaviours)
+        else:
+            action = -1
+            success = truth[index][i]
+        if not success:
+            positions[i] = 0
+            current[i] = root
+        elif positions[i] + 1 >= len(steps):
+            positions[i] = 0
+            current[i] = root
+        else:
+            positions[i] += 1
+        return action
+
+    def _perform(self, i, action, behaviours):
+        """Performs the given action for the agent with the given index.
+
+        @return: The result of the action, or 1 if no behaviours are given.
+        @rtype: boolean
+        """
+        if behaviours == None:
+            return 1
+        behaviour = behaviours[i][self._action_behaviours[action]]
+        return getattr(behaviour, self._action_methods[action])()
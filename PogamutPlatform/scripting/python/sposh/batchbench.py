@@ -0,0 +1,84 @@
+"""A benchmark of the batch engine for growing numbers of agents.
+
+The benchmark runs the plan of an agent with L{SPOSH.batch.BatchEngine}
+for populations of different sizes, with random sense readings, and
+reports the time per tick and per agent and tick. It is run as follows::
+
+    print scalingReport(behaviours, plan, log)
+"""
+
+# Python modules
+import time
+
+# Java modules
+from java.util import Random
+
+# POSH modules
+from agent import Agent
+from batch import BatchEngine
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+
+
+def randomColumns(engine, n, random):
+    """Returns random sense readings for n agents.
+
+    Senses that are compared to numbers in the plan are given integer
+    readings between 0 and twice the largest of these numbers. All other
+    senses are given readings of 0 or 1.
+
+    @param engine: The batch engine.
+    @type engine: L{SPOSH.batch.BatchEngine}
+    @param n: The number of agents.
+    @type n: int
+    @param random: The random number generator.
+    @type random: java.util.Random
+    @return: The readings, by sense name.
+    @rtype: dictionary, string -> list
+    """
+    limits = {}
+    for sense in engine.getSenses():
+        name, value = sense.getSenseName(), sense.getValue()
+        limit = limits.get(name, 1)
+        if type(value) == type(0) or type(value) == type(0.0):
+            limit = max(limit, 2 * int(value))
+        limits[name] = limit
+    columns = {}
+    for name, limit in limits.items():
+        column = []
+        for i in xrange(n):
+            column.append(random.nextInt(limit + 1))
+        columns[name] = column
+    return columns
+
+
+def scalingReport(behaviours, plan, log, sizes = DEFAULT_SIZES, ticks = 10):
+    """Returns a report of the batch engine's time for several numbers
+    of agents.
+
+    The time to generate the sense readings is not included.
+
+    @param behaviours: list or sequence of Behaviours instances
+    @type behaviours: list or sequence of Behavours instances
+    @param plan: Name of the plan (complete path + file + extension).
+    @type plan: string
+    @param log: java.util.logging.Logger instance
+    @type log: java.util.logging.Logger
+    @param sizes: The numbers of agents.
+    @type sizes: sequence of int
+    @param ticks: The number of ticks for each number of agents.
+    @type ticks: int
+    @return: The report.
+    @rtype: string
+    """
+    agent = Agent(behaviours, plan, log)
+    lines = ["%12s%16s%20s" % ("agents", "ms per tick", "us per agent-tick")]
+    for n in sizes:
+        engine = BatchEngine(agent, n)
+        columns = randomColumns(engine, n, Random(n))
+        start = time.time()
+        for tick in range(ticks):
+            engine.tick(columns)
+        elapsed = (time.time() - start) * 1000.0 / ticks
+        lines.append("%12d%16.2f%20.3f" % (n, elapsed, elapsed * 1000.0 / n))
+    return "\n".join(lines)
@@ -4,9 +4,80 @@
 # POSH modules
 from logbase import LogBase
 
+# behaviour class -> dispatch table, for classes that discover their
+# actions and senses
+_dispatch_tables = {}
+
+
+class DispatchTable:
+    """The actions and senses that a behaviour class provides by methods
+    named 'action_' or 'sense_' followed by their name.
+
+    The table is built once per class by L{dispatchTable}, and holds
+    the names of the actions and senses, each with the name of the
+    attribute that provides it, such that they are bound to an instance
+    by C{getattr}.
+    """
+    def __init__(self, behaviour_class):
+        """Collects the action and sense methods of the class and its
+        base classes.
+
+        @param behaviour_class: The behaviour class.
+        @type behaviour_class: class
+        """
+        attributes = {}
+        _collectAttributes(behaviour_class, attributes)
+        self.actions, self.senses = [], []
+        for attribute in attributes.keys():
+            if attribute[:7] == "action_":
+                self.actions.append((attribute[7:], attribute))
+            elif attribute[:6] == "sense_":
+                self.senses.append((attribute[6:], attribute))
+        self.actions.sort()
+        self.senses.sort()
+        self.action_names = [name for name, attribute in self.actions]
+        self.sense_names = [name for name, attribute in self.senses]
+
+
+def _collectAttributes(behaviour_class, attributes):
+    """Adds the names of the callable attributes of the class and its
+    base classes to the given dictionary.
+    """
+    for base in behaviour_class.__bases__:
+        _collectAttributes(base, attributes)
+    for name, value in behaviour_class.__dict__.items():
+        if callable(value):
+            attributes[name] = 1
+
+
+def dispatchTable(behaviour_class):
+    """Returns the dispatch table of a behaviour class.
+
+    @param behaviour_class: The behaviour class.
+    @type behaviour_class: class
+    @return: The table, which is built at the first call for the class.
+    @rtype: L{DispatchTable}
+    """
+    table = _dispatch_tables.get(behaviour_class)
+    if table == None:
+        table = DispatchTable(behaviour_class)
+        _dispatch_tables[behaviour_class] = table
+    return table
+
+
 class Behaviour(LogBase):
     """Behaviour base class.
+
+    A behaviour lists its actions and senses in C{self._actions} and
+    C{self._senses}, and provides each of them by a method named
+    'action_' or 'sense_' followed by its name, or by its name only.
+    Alternatively, a behaviour class declares C{_discover_methods = 1},
+    and provides its actions and senses by methods named 'action_' or
+    'sense_' followed by their name, which are found once per class (see
+    L{dispatchTable}), rather than being listed by every instance.
     """
+    # if the actions and senses are given by the names of the methods
+    _discover_methods = 0
     def __init__(self, log):
         """Initialises behaviour.
         
@@ -34,6 +105,8 @@ class Behaviour(LogBase):
         @return: List of behaviour actions.
         @rtype: sequence of strings
         """
+        if self._discover_methods:
+            return dispatchTable(self.__class__).action_names
         return self._actions
     
     def getSenses(self):
@@ -42,8 +115,97 @@ class Behaviour(LogBase):
         @return: List of behaviour senses.
         @rtype: sequence of strings
         """
+        if self._discover_methods:
+            return dispatchTable(self.__class__).sense_names
         return self._senses
 
+    def getDispatchTable(self):
+        """Returns the dispatch table of the behaviour's class.
+
+        @return: The table, or None if the behaviour lists its actions and
+            senses rather than discovering them.
+        @rtype: L{DispatchTable} or None
+        """
+        if self._discover_methods:
+            return dispatchTable(self.__class__)
+        return None
+
+    def getPureSenses(self):
+        """Returns a list of the senses that do not have side effects.
+
+        A pure sense returns the same value when it is called several
+        times within the same tick, and calling it does not change the
+        state of the behaviour or the world. The engine is allowed to
+        call pure senses in a different order or less often than the plan
+        specifies. Behaviours declare them by setting C{self._pure_senses};
+        by default, no sense is pure.
+
+        @return: List of pure behaviour senses.
+        @rtype: sequence of strings
+        """
+        return getattr(self, '_pure_senses', [])
+
+    def getBooleanSenses(self):
+        """Returns a list of the pure senses that only return 0 or 1.
+
+        Behaviours declare them by setting C{self._boolean_senses}.
+        Boolean senses are also pure senses, even if they are not given by
+        L{getPureSenses}.
+
+        @return: List of boolean behaviour senses.
+        @rtype: sequence of strings
+        """
+        return getattr(self, '_boolean_senses', [])
+
+    def getSpeculativeSenses(self):
+        """Returns a list of the pure senses that may be read ahead of
+        the tick in which they are used.
+
+        Behaviours declare them by setting C{self._speculative_senses}.
+        Speculative senses are also pure senses, even if they are not
+        given by L{getPureSenses}. See L{SPOSH.speculation}.
+
+        @return: List of speculative behaviour senses.
+        @rtype: sequence of strings
+        """
+        return getattr(self, '_speculative_senses', [])
+
+    def getParallelSenses(self):
+        """Returns the pure senses that may be evaluated concurrently.
+
+        Behaviours declare them by setting C{self._parallel_senses}, see
+        L{SPOSH.parallelsense}. Parallel senses are also pure senses, even
+        if they are not given by L{getPureSenses}.
+
+        @return: The maximum number of concurrent calls, the timeout in
+            milliseconds and optionally the limit group, by sense name.
+        @rtype: dictionary, string -> (int, long) or (int, long, string)
+        """
+        return getattr(self, '_parallel_senses', {})
+
+    def getSlots(self):
+        """Returns the blackboard slots that the behaviour uses.
+
+        Behaviours declare them by setting C{self._slots}, see
+        L{SPOSH.blackboard}.
+
+        @return: The slot types, by slot name.
+        @rtype: dictionary, string -> string
+        """
+        return getattr(self, '_slots', {})
+
+    def getSlotSenses(self):
+        """Returns the senses that are answered by blackboard slots.
+
+        Behaviours declare them by setting C{self._slot_senses}, see
+        L{SPOSH.blackboard}. These senses do not need to be given by
+        L{getSenses}, nor do they need a method in the behaviour.
+
+        @return: The slot expressions, by sense name.
+        @rtype: dictionary, string -> string
+        """
+        return getattr(self, '_slot_senses', {})
+
     def registerInspectors(self, inspectors):
         """Sets the methods to call to get/modify the state of the behaviour.
         
@@ -85,7 +247,9 @@ class Behaviour(LogBase):
         and C{mutator} is the mutator method (taking a single string as its
         only argument), or C{None} if no mutator is provided.
         
+        If no inspectors were registered, the list is empty.
+
         @return: List of inspectors.
         @rtype: Sequence of (string, method, method|None)
         """
-        return self._inspectors
+        return getattr(self, '_inspectors', [])
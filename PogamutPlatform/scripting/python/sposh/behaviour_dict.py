@@ -1,6 +1,31 @@
 """Implementation of the behaviour dictionary.
 """
 
+def findMethodName(behaviour, kind, name):
+    """Returns the name of the method of a listed action or sense.
+
+    The method is named by the kind, followed by an underscore and the
+    name, or by the name only.
+
+    @param behaviour: The behaviour that provides the method.
+    @type behaviour: L{SPOSH.Behaviour}
+    @param kind: 'action' or 'sense'.
+    @type kind: string
+    @param name: The name of the action or sense.
+    @type name: string
+    @return: The name of the method.
+    @rtype: string
+    @raise AttributeError: If the behaviour does not provide the method.
+    """
+    method_name = "%s_%s" % (kind, name)
+    if hasattr(behaviour, method_name):
+        return method_name
+    if hasattr(behaviour, name):
+        return name
+    raise AttributeError, "Behaviour '%s' does not provide " \
+        "the %s method '%s'" % (behaviour.getName(), kind, name)
+
+
 class BehaviourDict:
     """The behaviour dictionary.
     
@@ -10,15 +35,27 @@ class BehaviourDict:
     and senses by their names, and returns their behaviour and
     their actual method.
     """
-    def __init__(self):
+    def __init__(self, blackboard = None):
         """Initialises the behaviour dictionary.
+
+        @param blackboard: The blackboard that slot senses read, or None
+            if the behaviours may not declare slots.
+        @type blackboard: L{SPOSH.Blackboard} or None
         """
+        self._blackboard = blackboard
         # name -> behaviour
         self._behaviours = {}
         # name -> (method, behaviour)
         self._actions = {}
         # name -> (method, behaviour)
         self._senses = {}
+        # names of pure, boolean and speculative senses -> 1
+        self._pure_senses = {}
+        self._boolean_senses = {}
+        self._speculative_senses = {}
+        # names of parallel senses -> (max. concurrent calls, timeout,
+        # limit group)
+        self._parallel_senses = {}
     
     def registerBehaviour(self, behaviour):
         """Registers the given behaviour.
@@ -33,7 +70,10 @@ class BehaviourDict:
         
         The actions and senses are aquired by using the behaviour's
         L{SPOSH.Behaviour.getActions} and L{SPOSH.Behaviour.getSenses}
-        methods.
+        methods, or, if the behaviour discovers its methods, from the
+        dispatch table of its class (see L{SPOSH.Behaviour.getDispatchTable}).
+        The slots of the behaviour are defined on the blackboard, and its
+        slot senses are resolved to accessors of the slots.
         
         @param behaviour: The behaviour to register.
         @type behaviour: L{SPOSH.Behaviour}
@@ -42,42 +82,99 @@ class BehaviourDict:
         @raise NameError: If a given action or sense is already
             registered in the behaviour dictionary, or if a behaviour
             with the same name is already registered in the
-            dictionary.
+            dictionary, or if a slot sense refers to an unknown slot.
+        @raise ValueError: If the behaviour declares slots without a
+            blackboard.
         """
-        actions = behaviour.getActions()
-        senses = behaviour.getSenses()
         # add the behaviour
         behaviourName = behaviour.getName()
         if self._behaviours.has_key(behaviourName):
             raise NameError, "Behaviour '%s' cannot be registered twice" % behaviourName
+        table = behaviour.getDispatchTable()
+        if table:
+            # the methods were found once for the behaviour's class
+            actions = [(action, getattr(behaviour, attribute)) \
+                       for action, attribute in table.actions]
+            senses = [(sense, getattr(behaviour, attribute)) \
+                      for sense, attribute in table.senses]
+        else:
+            find = self._findMethod
+            actions = [(action, find(behaviour, "action", action)) \
+                       for action in behaviour.getActions()]
+            senses = [(sense, find(behaviour, "sense", sense)) \
+                      for sense in behaviour.getSenses()]
         self._behaviours[behaviourName] = behaviour
-		# add the actions
-        for action in actions:
+        # add the actions
+        for action, actionMethod in actions:
             if self._actions.has_key(action):
-                raise NameError, "Action '%s' registered twice: For '%s' and '%s'" % (action, self._actions[action].getName(), behaviourName)
-            try:
-                actionMethod = getattr(behaviour, "action_"+action)
-            except AttributeError:
-                try:
-                    actionMethod = getattr(behaviour, action)
-                except AttributeError:	
-                    raise AttributeError, "Behaviour '%s' does not provide an action method named '%s'" % (behaviourName, action)
+                raise NameError, "Action '%s' registered twice: For '%s' and '%s'" % (action, self._actions[action][1].getName(), behaviourName)
             self._actions[action] = (actionMethod, behaviour)
         # .. and the senses
-        for sense in senses:
+        for sense, senseMethod in senses:
             if self._senses.has_key(sense):
                 raise NameError, \
                     "Sense '%s' registered twice: For '%s' and '%s'" % \
-                    (sense, self._senses[sense].getName(), behaviourName)
-            try:
-				senseMethod = getattr(behaviour, "sense_"+sense)
-            except AttributeError:
-                try:
-                    senseMethod = getattr(behaviour, sense)
-                except AttributeError:
-                    raise AttributeError, "Behaviour '%s' does no provide a sense method named '%s'" % (behaviourName, sense)
+                    (sense, self._senses[sense][1].getName(), behaviourName)
             self._senses[sense] = (senseMethod, behaviour)
+        # .. and the slots and slot senses
+        self._registerSlots(behaviour)
+        # .. and the properties of the senses
+        for sense in behaviour.getPureSenses():
+            self._pure_senses[sense] = 1
+        for sense in behaviour.getBooleanSenses():
+            self._pure_senses[sense] = 1
+            self._boolean_senses[sense] = 1
+        for sense in behaviour.getSpeculativeSenses():
+            self._pure_senses[sense] = 1
+            self._speculative_senses[sense] = 1
+        for sense, limits in behaviour.getParallelSenses().items():
+            self._pure_senses[sense] = 1
+            if len(limits) < 3:
+                # the sense is its own limit group
+                limits = (limits[0], limits[1], sense)
+            self._parallel_senses[sense] = tuple(limits)
     
+    def _findMethod(self, behaviour, kind, name):
+        """Returns the method of a listed action or sense, as named by
+        L{findMethodName}.
+
+        @param behaviour: The behaviour that provides the method.
+        @type behaviour: L{SPOSH.Behaviour}
+        @param kind: 'action' or 'sense'.
+        @type kind: string
+        @param name: The name of the action or sense.
+        @type name: string
+        @return: The method.
+        @rtype: callable taking no arguments
+        @raise AttributeError: If the behaviour does not provide the method.
+        """
+        return getattr(behaviour, findMethodName(behaviour, kind, name))
+
+    def _registerSlots(self, behaviour):
+        """Defines the slots of the behaviour on the blackboard and
+        registers its slot senses as pure senses.
+
+        @param behaviour: The behaviour to register.
+        @type behaviour: L{SPOSH.Behaviour}
+        """
+        slots, slot_senses = behaviour.getSlots(), behaviour.getSlotSenses()
+        if not slots and not slot_senses:
+            return
+        if not self._blackboard:
+            raise ValueError, "Behaviour '%s' declares slots, but there " \
+                "is no blackboard" % behaviour.getName()
+        for name, slot_type in slots.items():
+            self._blackboard.defineSlot(name, slot_type)
+        for sense, expression in slot_senses.items():
+            if self._senses.has_key(sense):
+                raise NameError, \
+                    "Sense '%s' registered twice: For '%s' and '%s'" % \
+                    (sense, self._senses[sense][1].getName(),
+                     behaviour.getName())
+            self._senses[sense] = (self._blackboard.reader(expression),
+                                   behaviour)
+            self._pure_senses[sense] = 1
+
     def getBehaviours(self):
         """Returns a list of behaviours.
         
@@ -114,6 +211,26 @@ class BehaviourDict:
             raise NameError, "Action '%s' not provided by any behaviour" % \
                 actionName
 
+    def replaceAction(self, actionName, method):
+        """Replaces the method of an already registered action.
+
+        The behaviour that provides the action stays the same. This
+        allows wrapping action methods, e.g. for recording. It needs
+        to be done before the plan is built, as plan elements pick
+        their methods when they are created.
+
+        @param actionName: The name of the action.
+        @type actionName: string
+        @param method: The callable to use for the action.
+        @type method: callable taking no arguments
+        @raise NameError: If action wasn't registered.
+        """
+        try:
+            self._actions[actionName] = (method, self._actions[actionName][1])
+        except KeyError:
+            raise NameError, "Action '%s' not provided by any behaviour" % \
+                actionName
+
     def getActionNames(self):
         """Returns the list of available action names.
 
@@ -152,6 +269,26 @@ class BehaviourDict:
             raise NameError, "Sense '%s' not provided by any behaviour" % \
                 senseName
 
+    def replaceSense(self, senseName, method):
+        """Replaces the method of an already registered sense.
+
+        The behaviour that provides the sense stays the same. This
+        allows wrapping sense methods, e.g. for recording. It needs
+        to be done before the plan is built, as plan elements pick
+        their methods when they are created.
+
+        @param senseName: The name of the sense.
+        @type senseName: string
+        @param method: The callable to use for the sense.
+        @type method: callable taking no arguments
+        @raise NameError: If sense wasn't registered.
+        """
+        try:
+            self._senses[senseName] = (method, self._senses[senseName][1])
+        except KeyError:
+            raise NameError, "Sense '%s' not provided by any behaviour" % \
+                senseName
+
     def getSenseNames(self):
         """Returns a list of available sense names.
 
@@ -160,6 +297,51 @@ class BehaviourDict:
         """
         return self._senses.keys()
 
+    def isPureSense(self, senseName):
+        """Returns if the given sense was declared to be pure.
+
+        @param senseName: The name of the sense.
+        @type senseName: string
+        @return: If the sense has no side effects.
+        @rtype: boolean
+        """
+        return self._pure_senses.has_key(senseName)
+
+    def isBooleanSense(self, senseName):
+        """Returns if the given sense was declared to be a pure sense
+        that only returns 0 or 1.
+
+        @param senseName: The name of the sense.
+        @type senseName: string
+        @return: If the sense is boolean.
+        @rtype: boolean
+        """
+        return self._boolean_senses.has_key(senseName)
+
+    def isSpeculativeSense(self, senseName):
+        """Returns if the given sense was declared to be a pure sense
+        that may be read ahead of the tick in which it is used.
+
+        @param senseName: The name of the sense.
+        @type senseName: string
+        @return: If the sense is speculative.
+        @rtype: boolean
+        """
+        return self._speculative_senses.has_key(senseName)
+
+    def getParallelSenseLimits(self, senseName):
+        """Returns the limits of the given sense if it was declared to be
+        a sense that may be evaluated concurrently.
+
+        @param senseName: The name of the sense.
+        @type senseName: string
+        @return: The maximum number of concurrent calls, the timeout in
+            milliseconds and the limit group, or None if the sense is not
+            a parallel sense.
+        @rtype: (int, long, string) or None
+        """
+        return self._parallel_senses.get(senseName)
+
     def getSenseBehaviour(self, senseName):
         """Returns the behaviour that provides the given sense.
 
@@ -0,0 +1,150 @@
+"""Compilation of triggers on boolean senses into bitmasks.
+
+Most triggers are conjunctions of boolean senses, like '(sense)' or
+'(sense True)'. If the senses are declared as boolean by their behaviour
+(see L{SPOSH.Behaviour.getBooleanSenses}), then each of them is given a
+bit in a bitmask, and the triggers are compiled into a mask of bits that
+need to be set and a mask of bits that need to be cleared. The bits that a
+priority element needs are sampled once per tick, after which the trigger
+of each of its elements is checked by two mask operations.
+
+Only the leading boolean senses of a trigger are compiled. The remaining
+senses (starting with the first sense that is not boolean, or that is not
+compared to 0 or 1) are fired as before, in their order, and only if
+the compiled part of the trigger is satisfied. This keeps the order in
+which senses with side effects are called.
+"""
+
+
+class SenseBits:
+    """The bitmask of the boolean senses of an agent.
+
+    The bitmask is cleared at the start of every tick, for which the
+    object needs to be added as tick listener to the agent. Each bit is
+    sampled at most once per tick.
+    """
+    def __init__(self, beh_dict):
+        """Initialises the sense bits.
+
+        @param beh_dict: The behaviour dictionary that provides the senses.
+        @type beh_dict: L{SPOSH.BehaviourDict}
+        """
+        self._bdict = beh_dict
+        # sense name -> bit
+        self._bits = {}
+        # the bits sampled in this tick, and their values
+        self._known, self._values = 0, 0
+        # the number of sense calls made for sampling
+        self.samples = 0
+
+    def tickStart(self, agent):
+        """Clears the sampled bits.
+        """
+        self._known, self._values = 0, 0
+
+    def tickEnd(self, agent, result):
+        """Does nothing.
+        """
+        pass
+
+    def bitFor(self, sense_name):
+        """Returns the bit of the given boolean sense.
+
+        @param sense_name: The name of the sense.
+        @type sense_name: string
+        @return: The bit, or None if the sense is not boolean.
+        @rtype: int, long or None
+        """
+        if not self._bdict.isBooleanSense(sense_name):
+            return None
+        bit = self._bits.get(sense_name)
+        if bit == None:
+            n = len(self._bits)
+            # the integers of Jython 2.1 don't overflow into longs
+            if n < 31:
+                bit = 1 << n
+            else:
+                bit = 1L << n
+            self._bits[sense_name] = bit
+        return bit
+
+    def neededBits(self, mask):
+        """Returns the bits of the given mask, with their sense methods.
+
+        @param mask: A mask of sense bits.
+        @type mask: int or long
+        @return: The bits given in the mask, with their sense methods.
+        @rtype: list of (bit, method)
+        """
+        needed = []
+        for name, bit in self._bits.items():
+            if mask & bit:
+                needed.append((bit, self._bdict.getSense(name)))
+        return needed
+
+    def sample(self, needed):
+        """Samples the given sense bits, if not yet done in this tick.
+
+        @param needed: The bits to sample, as returned by L{neededBits}.
+        @type needed: sequence of (bit, method)
+        @return: The values of all bits sampled in this tick.
+        @rtype: int or long
+        """
+        known, values = self._known, self._values
+        for bit, method in needed:
+            if not known & bit:
+                known = known | bit
+                self.samples += 1
+                if method():
+                    values = values | bit
+        self._known, self._values = known, values
+        return values
+
+    def compileTrigger(self, trigger):
+        """Compiles the given trigger.
+
+        @param trigger: The trigger to compile, or None for a trigger
+            that is always satisfied.
+        @type trigger: L{SPOSH.Trigger} or None
+        @return: The mask of bits that need to be set, the mask of bits
+            that need to be cleared, and the remaining senses that need to
+            be fired.
+        @rtype: (int or long, int or long, list of L{SPOSH.Sense})
+        """
+        true_mask, false_mask = 0, 0
+        if not trigger:
+            return true_mask, false_mask, []
+        senses = trigger.getSenses()
+        for i in range(len(senses)):
+            sense = senses[i]
+            bit = self.bitFor(sense.getSenseName())
+            value, predicate = sense.getValue(), sense.getPredicate()
+            if bit == None:
+                return true_mask, false_mask, senses[i:]
+            elif value == None or \
+               (value == 1 and predicate == "==") or \
+               (value == 0 and predicate == "!="):
+                true_mask = true_mask | bit
+            elif (value == 0 and predicate == "==") or \
+                 (value == 1 and predicate == "!="):
+                false_mask = false_mask | bit
+            else:
+                return true_mask, false_mask, senses[i:]
+        return true_mask, false_mask, []
+
+    def compilePriorityElement(self, priority_element):
+        """Compiles the triggers of all elements of the given drive or
+        competence priority element, and sets them.
+
+        @param priority_element: The priority element.
+        @type priority_element: L{SPOSH.DrivePriorityElement} or
+            L{SPOSH.CompetencePriorityElement}
+        """
+        compiled = []
+        mask = 0
+        for element in priority_element.getElements():
+            true_mask, false_mask, senses = \
+                self.compileTrigger(element.getTrigger())
+            mask = mask | true_mask | false_mask
+            compiled.append((element, true_mask, false_mask, senses))
+        priority_element.setBitTriggers(self, self.neededBits(mask), compiled)
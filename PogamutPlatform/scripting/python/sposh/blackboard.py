@@ -0,0 +1,172 @@
+"""A blackboard of world state in typed array slots.
+
+Rather than having each sense fetch its value from the game on demand,
+the game connector writes the world state into the slots of the agent's
+blackboard once per tick, either slot by slot or in bulk by
+L{Blackboard.ingest}. Behaviours declare their slots by setting
+C{self._slots}, a dictionary of slot name -> type, where the type is
+one of::
+
+    'i' - integers and booleans, stored in a Java int array
+    'd' - numbers, stored in a Java double array
+    'o' - any other object, stored in a list
+
+Behaviours can then declare senses that read slots by setting
+C{self._slot_senses}, a dictionary of sense name -> expression. An
+expression is a slot name or a simple Python expression of slot names,
+numbers and operators, like 'health < 30' or 'enemy_x - x'. The behaviour
+dictionary resolves these senses to accessors that read the slots
+directly. Slot senses are pure senses, and they do not need a method in
+the behaviour.
+"""
+
+# Jython modules
+from org.python.modules import re
+
+# Java modules
+from jarray import zeros
+
+# matches the names in expressions, compiled when the first reader is
+# created
+_nameMatcher = None
+
+# the names that are allowed in expressions besides slot names
+_operatorNames = {'and': 1, 'or': 1, 'not': 1}
+
+# the attribute that holds the slot values of each type
+_storage = {'i': '_ints', 'd': '_doubles', 'o': '_objects'}
+
+
+class Blackboard:
+    """The typed slots of world state of an agent.
+    """
+    def __init__(self):
+        """Initialises a blackboard without slots.
+        """
+        # slot name -> (type, index)
+        self._slots = {}
+        # slot names by type, in the order of their index
+        self._names = {'i': [], 'd': [], 'o': []}
+        self._ints = zeros(0, 'i')
+        self._doubles = zeros(0, 'd')
+        self._objects = []
+
+    def defineSlot(self, name, slot_type):
+        """Defines a slot, if it is not yet defined.
+
+        Defining slots reallocates the slot arrays, which is why they
+        should all be defined before the slots are written.
+
+        @param name: The name of the slot.
+        @type name: string
+        @param slot_type: The type of the slot, 'i', 'd' or 'o'.
+        @type slot_type: string
+        @raise ValueError: If the type is unknown.
+        @raise NameError: If the slot is already defined with another type.
+        """
+        if not _storage.has_key(slot_type):
+            raise ValueError, "Unknown type '%s' of slot '%s'" % \
+                  (slot_type, name)
+        if self._slots.has_key(name):
+            if self._slots[name][0] != slot_type:
+                raise NameError, "Slot '%s' defined with types '%s' and " \
+                      "'%s'" % (name, self._slots[name][0], slot_type)
+            return
+        names = self._names[slot_type]
+        self._slots[name] = (slot_type, len(names))
+        names.append(name)
+        if slot_type == 'o':
+            self._objects.append(None)
+        else:
+            old = getattr(self, _storage[slot_type])
+            new = zeros(len(names), slot_type)
+            for i in range(len(old)):
+                new[i] = old[i]
+            setattr(self, _storage[slot_type], new)
+
+    def getSlotNames(self, slot_type):
+        """Returns the names of the slots of the given type, in the
+        order in which L{ingest} expects their values.
+
+        @param slot_type: The type of the slots, 'i', 'd' or 'o'.
+        @type slot_type: string
+        @rtype: list of strings
+        """
+        return self._names[slot_type]
+
+    def write(self, name, value):
+        """Writes a single slot.
+
+        @param name: The name of the slot.
+        @type name: string
+        @param value: The value of the slot.
+        @type value: int, float or any object, depending on the slot type.
+        @raise KeyError: If the slot is not defined.
+        """
+        slot_type, index = self._slots[name]
+        getattr(self, _storage[slot_type])[index] = value
+
+    def read(self, name):
+        """Reads a single slot.
+
+        @param name: The name of the slot.
+        @type name: string
+        @return: The value of the slot.
+        @raise KeyError: If the slot is not defined.
+        """
+        slot_type, index = self._slots[name]
+        return getattr(self, _storage[slot_type])[index]
+
+    def ingest(self, ints = None, doubles = None, objects = None):
+        """Replaces the values of all slots of the given types at once.
+
+        The values are given in the order of L{getSlotNames}. The given
+        arrays are used by the blackboard rather than copied, and must
+        not be modified by the caller until the next ingest.
+
+        @param ints: The values of the 'i' slots, or None to keep them.
+        @type ints: Java int array
+        @param doubles: The values of the 'd' slots, or None to keep them.
+        @type doubles: Java double array
+        @param objects: The values of the 'o' slots, or None to keep them.
+        @type objects: list
+        @raise ValueError: If the number of values does not match the
+            number of slots.
+        """
+        for slot_type, values in (('i', ints), ('d', doubles),
+                                  ('o', objects)):
+            if values == None:
+                continue
+            if len(values) != len(self._names[slot_type]):
+                raise ValueError, "Expected %d values of type '%s', got %d" \
+                      % (len(self._names[slot_type]), slot_type, len(values))
+            setattr(self, _storage[slot_type], values)
+
+    def _slotCode(self, match):
+        """Returns the code that reads the slot of the given name match.
+        """
+        name = match.group(0)
+        if _operatorNames.has_key(name):
+            return name
+        if not self._slots.has_key(name):
+            raise NameError, "Unknown slot '%s'" % name
+        slot_type, index = self._slots[name]
+        return "b.%s[%d]" % (_storage[slot_type], index)
+
+    def reader(self, expression):
+        """Returns an accessor that evaluates the given expression on
+        the current slot values.
+
+        @param expression: A slot name, or an expression of slot names,
+            numbers and operators.
+        @type expression: string
+        @return: A function taking no arguments.
+        @rtype: callable
+        @raise NameError: If the expression refers to an unknown slot.
+        @raise SyntaxError: If the expression is not valid.
+        """
+        global _nameMatcher
+        if not _nameMatcher:
+            _nameMatcher = re.compile(r'\b[A-Za-z_]\w*')
+        code = _nameMatcher.sub(self._slotCode, expression)
+        return eval("lambda b=b: %s" % code, {'b': self})
@@ -0,0 +1,217 @@
+"""Checkpointing of the execution state of an agent.
+
+The execution state of an agent consists of the position in the
+slip-stack and the firing frequency state of each drive element, the
+position of each action pattern, the retry count of each competence
+element, and the time of the agent's timer. Everything else in the plan
+is built from the plan file and is not part of a checkpoint.
+
+The state is stored with the elements identified by stable paths that
+are derived from the plan element names, rather than their element ids,
+which depend on the build order. The paths are::
+
+    DE.[drive_element_name]
+    C.[competence_name]
+    CE.[competence_name].[competence_element_name]
+    AP.[action_pattern_name]
+
+If several elements share the same path, '#2', '#3', ... is appended
+to the path of the second, third, ... element.
+"""
+
+# Python modules
+import cPickle
+
+# POSH modules
+from competence import Competence
+from action_pattern import ActionPattern
+
+CHECKPOINT_VERSION = 1
+
+
+def _addPath(index, path, element):
+    """Adds the element with the given path to the index, and returns
+    the path that was used.
+    """
+    if index.has_key(path):
+        n = 2
+        while index.has_key("%s#%d" % (path, n)):
+            n += 1
+        path = "%s#%d" % (path, n)
+    index[path] = element
+    return path
+
+
+def _indexElement(index, element):
+    """Adds the given competence or action pattern and everything that
+    it refers to to the index.
+    """
+    if element.__class__ == Competence:
+        path = "C.%s" % element.getName()
+        if index.has_key(path):
+            return
+        index[path] = element
+        for priority_element in element.getElements():
+            for comp_element in priority_element.getElements():
+                _addPath(index, "CE.%s.%s" % (element.getName(),
+                                              comp_element.getName()),
+                         comp_element)
+                _indexElement(index, comp_element.getElement())
+    elif element.__class__ == ActionPattern:
+        path = "AP.%s" % element.getName()
+        if index.has_key(path):
+            return
+        index[path] = element
+        for ap_element in element.getElements():
+            _indexElement(index, ap_element)
+
+
+def indexPlan(drive_collection):
+    """Returns all stateful elements of the plan, by their path.
+
+    Competences are included as they can be the current element of
+    a drive element.
+
+    @param drive_collection: The root of the plan.
+    @type drive_collection: L{SPOSH.DriveCollection}
+    @return: The elements of the plan.
+    @rtype: dictionary, path -> element
+    """
+    index = {}
+    for priority_element in drive_collection.getElements():
+        for drive_element in priority_element.getElements():
+            _addPath(index, "DE.%s" % drive_element.getName(), drive_element)
+            _indexElement(index, drive_element.getRoot())
+    return index
+
+
+class PlanState:
+    """The execution state of a built plan.
+
+    An instance holds the path index of a plan, which is built once,
+    such that getting and setting the state only needs to loop over
+    the stateful elements.
+    """
+    def __init__(self, drive_collection):
+        """Indexes the given plan.
+
+        @param drive_collection: The root of the plan.
+        @type drive_collection: L{SPOSH.DriveCollection}
+        """
+        self._index = indexPlan(drive_collection)
+        # element id -> path, to store the current element of drive elements
+        self._paths = {}
+        self._drive_elements, self._stateful = [], []
+        for path, element in self._index.items():
+            self._addPath(path, element)
+
+    def _addPath(self, path, element):
+        """Adds an element of the index to the stateful elements.
+        """
+        self._paths[element.getId()] = path
+        if path[:3] == "DE.":
+            self._drive_elements.append((path, element))
+        elif path[:3] == "CE." or path[:3] == "AP.":
+            self._stateful.append((path, element))
+
+    def extend(self, element):
+        """Adds the elements of a competence or action pattern of a lazily
+        built plan that was completed after the plan was indexed.
+
+        The paths are the same as if the plan was indexed after the
+        completion.
+
+        @param element: The completed element.
+        @type element: L{SPOSH.Competence} or L{SPOSH.ActionPattern}
+        """
+        index = self._index
+        indexed = index.copy()
+        if element.__class__ == Competence:
+            path = "C.%s" % element.getName()
+        else:
+            path = "AP.%s" % element.getName()
+        if index.has_key(path):
+            del index[path]
+        _indexElement(index, element)
+        for path, added in index.items():
+            if not indexed.has_key(path):
+                self._addPath(path, added)
+
+    def getIndex(self):
+        """Returns the elements of the plan by their path.
+
+        @rtype: dictionary, path -> element
+        """
+        return self._index
+
+    def getState(self):
+        """Returns the execution state of the plan.
+
+        @return: A list of (path, state) pairs.
+        @rtype: list
+        """
+        state = []
+        paths = self._paths
+        for path, element in self._drive_elements:
+            current, last_fired = element.getState()
+            if current is element.getRoot():
+                state.append((path, (None, last_fired)))
+            else:
+                state.append((path, (paths[current.getId()], last_fired)))
+        for path, element in self._stateful:
+            state.append((path, element.getState()))
+        return state
+
+    def setState(self, state):
+        """Sets the execution state of the plan.
+
+        Paths that are not part of the plan are ignored, and so are
+        current elements of drive elements that are not part of the plan
+        (in which case the drive element returns to its root).
+
+        @param state: A list of (path, state) pairs, as returned by
+            L{getState}.
+        @type state: list
+        """
+        index = self._index
+        for path, element_state in state:
+            element = index.get(path)
+            if not element:
+                continue
+            if path[:3] == "DE.":
+                current, last_fired = element_state
+                element.setState(index.get(current), last_fired)
+            else:
+                element.setState(element_state)
+
+
+def snapshot(agent, plan_state):
+    """Returns a compact snapshot of the execution state of the agent.
+
+    @param agent: The agent.
+    @type agent: L{SPOSH.Agent}
+    @param plan_state: The state index of the agent's plan.
+    @type plan_state: L{PlanState}
+    @return: The snapshot.
+    @rtype: string
+    """
+    return cPickle.dumps((CHECKPOINT_VERSION, agent.getTimer().time(),
+                          plan_state.getState()), 1)
+
+
+def restore(agent, plan_state, data):
+    """Restores the execution state of the agent from a snapshot.
+
+    @param agent: The agent.
+    @type agent: L{SPOSH.Agent}
+    @param plan_state: The state index of the agent's plan.
+    @type plan_state: L{PlanState}
+    @param data: The snapshot, as returned by L{snapshot}.
+    @type data: string
+    @raise ValueError: If the snapshot has an unsupported version.
+    """
+    version, time, state = cPickle.loads(data)
+    if version != CHECKPOINT_VERSION:
+        raise ValueError, "Unsupported checkpoint version %s" % version
+    plan_state.setState(state)
+    agent.getTimer().setTime(time)
@@ -12,11 +12,21 @@ fired.
 # POSH modules
 from element import Element, ElementCollection, FireResult
 from action import Action
-from copy import copy
+from sense import fireSenses
+# copy is imported by the copy() methods, when needed
 
 class Competence(ElementCollection):
     """A POSH competence, containing competence priority elements.
     """
+    # the decision cache, or None if decisions are not cached
+    _cache = None
+    # completes the competence when first fired, if built lazily
+    _lazy = None
+    # if the last firing reached the goal or failed
+    _finished = 0
+    # the maximum time spent in the competence, or None if not limited
+    _time_limit = None
+
     def __init__(self, agent, competence_name, priority_elements, goal):
         """Initialises the competence.
 
@@ -35,11 +45,79 @@ class Competence(ElementCollection):
         @type goal: L{SPOSH.Trigger} or None
         """
         ElementCollection.__init__(self, agent, "C.%s" % competence_name)
-        self._name = competence_name
+        self._name = intern(competence_name)
         self._elements = priority_elements
         self._goal = goal
         self.debug("Created")
     
+    def getGoal(self):
+        """Returns the goal of the competence.
+
+        @return: The goal, or None if the goal can never be reached.
+        @rtype: L{SPOSH.Trigger} or None
+        """
+        return self._goal
+
+    def setGoal(self, goal):
+        """Sets the goal of the competence.
+
+        @param goal: The goal, or None if the goal can never be reached.
+        @type goal: L{SPOSH.Trigger} or None
+        """
+        self._goal = goal
+
+    def getTimeLimit(self):
+        """Returns the maximum time that a drive element may spend in the
+        competence.
+
+        @return: The time limit in milliseconds, or None if the time is
+            not limited.
+        @rtype: long or None
+        """
+        return self._time_limit
+
+    def setTimeLimit(self, time_limit):
+        """Sets the maximum time that a drive element may spend in the
+        competence.
+
+        The time is taken from the agent's timer, and covers the elements
+        that the competence descends into. See L{SPOSH.DriveElement.fire}.
+
+        @param time_limit: The time limit in milliseconds, or None to not
+            limit the time.
+        @type time_limit: long or None
+        """
+        self._time_limit = time_limit
+
+    def isFinished(self):
+        """Returns if the last firing of the competence ended it.
+
+        A firing ends the competence if its goal is satisfied or if none
+        of its elements is ready. Both, and the firing of an action of
+        the competence, return FireResult(0, None).
+
+        @rtype: boolean
+        """
+        return self._finished
+
+    def getLazyBuild(self):
+        """Returns the object that completes the competence when it is
+        first fired.
+
+        @return: The lazy build, or None if the competence is complete.
+        @rtype: L{SPOSH.planbuilder._LazyBuild} or None
+        """
+        return self._lazy
+
+    def setLazyBuild(self, lazy):
+        """Sets the object that completes the competence when it is
+        first fired.
+
+        @param lazy: The lazy build, or None if the competence is complete.
+        @type lazy: L{SPOSH.planbuilder._LazyBuild} or None
+        """
+        self._lazy = lazy
+
     def reset(self):
         """Resets all the competence's priority elements.
         """
@@ -63,20 +141,94 @@ class Competence(ElementCollection):
         @rtype: L{SPOSH.FireResult}
         """
         self.debug("Fired")
-        # check if goal is satisfied
-        if self._goal and self._goal.fire():
+        if self._lazy:
+            self._lazy.complete(self)
+        if self._cache:
+            decision = self._cachedDecision()
+        else:
+            decision = self._decide()
+        if decision is self:
             self.debug("Goal satisfied")
+            self._finished = 1
             return FireResult(0, None)
-        # process the elements
-        for element in self._elements:
-            result = element.fire()
-            # check if the competence priority element failed
-            if result.continueExecution() and not result.nextElement():
-                continue
-            return result
+        elif decision:
+            self._finished = 0
+            return decision.fire()
         # we failed
         self.debug("Failed")
+        self._finished = 1
         return FireResult(0, None)
+
+    def _decide(self):
+        """Checks the goal and selects the competence element to fire.
+
+        @return: The competence itself if its goal is satisfied, the
+            competence element to fire, or () if no element is ready.
+        @rtype: L{SPOSH.Competence}, L{SPOSH.CompetenceElement} or tuple
+        """
+        # check if goal is satisfied
+        if self._goal and self._goal.fire():
+            return self
+        # process the elements
+        for element in self._elements:
+            # a priority element returns None if none of its elements
+            # is ready
+            comp_element = element.select()
+            if comp_element:
+                return comp_element
+        return ()
+
+    def _cachedDecision(self):
+        """Returns the decision from the decision cache, or makes the
+        decision and caches it, if possible.
+
+        See L{_decide} for the returned values.
+        """
+        cache = self._cache
+        key = (self, cache.signature(self._cache_senses))
+        decision = cache.lookup(key)
+        if decision is None:
+            decision = self._decide()
+            if self._cacheable.has_key(decision):
+                cache.store(key, decision)
+        elif decision is not self and decision:
+            # count the retry, as done by the selection
+            decision.isReadyTriggered(0)
+        return decision
+
+    def setDecisionCache(self, cache):
+        """Sets the cache for the decisions of the competence.
+
+        The cache is only used if all senses of the goal and the triggers
+        of the competence are pure. Decisions are only cached if none of
+        the competence elements up to and including the selected one
+        has a maximum number of retries.
+
+        @param cache: The decision cache, or None to not cache decisions.
+        @type cache: L{SPOSH.decisioncache.DecisionCache} or None
+        """
+        self._cache = None
+        if not cache:
+            return
+        elements = []
+        for priority_element in self._elements:
+            elements.extend(priority_element.getElements())
+        triggers = [self._goal]
+        for element in elements:
+            triggers.append(element.getTrigger())
+        senses = cache.senseNames(triggers)
+        if senses == None:
+            self.debug("Decisions depend on impure senses, not cached")
+            return
+        cacheable = {self : 1}
+        for element in elements:
+            if element.getMaxRetries() >= 0:
+                break
+            cacheable[element] = 1
+        else:
+            cacheable[()] = 1
+        self._cache, self._cache_senses = cache, senses
+        self._cacheable = cacheable
     
     def copy(self):
         """Returns a reset copy of itsself.
@@ -90,6 +242,7 @@ class Competence(ElementCollection):
         # name and goal stays the same, only elements need to be copied
         # therefore we'll make a shallow copy of the object and
         # copy the elements separately
+        from copy import copy
         new_obj = copy(self)
         new_elements = []
         for element in self._elements:
@@ -112,6 +265,10 @@ class Competence(ElementCollection):
 class CompetencePriorityElement(ElementCollection):
     """A competence priority element, containing competence elements.
     """
+    # the sense bits of compiled triggers, or None if the triggers
+    # are not compiled
+    _bits = None
+
     def __init__(self, agent, competence_name, elements):
         """Initialises the competence priority element.
         
@@ -126,7 +283,7 @@ class CompetencePriorityElement(ElementCollection):
         @type elements: sequence of L{SPOSH.CompetenceElement}
         """
         ElementCollection.__init__(self, agent, "CP.%s" % competence_name)
-        self._name = competence_name
+        self._name = intern(competence_name)
         self._elements = elements
         self.debug("Created")
     
@@ -150,13 +307,52 @@ class CompetencePriorityElement(ElementCollection):
         @rtype: L{SPOSH.FireResult}
         """
         self.debug("Fired")
+        element = self.select()
+        if element:
+            return element.fire()
+        self.debug("Priority Element failed")
+        return FireResult(1, None)
+
+    def select(self):
+        """Returns the first ready competence element.
+
+        As L{SPOSH.CompetenceElement.isReady} counts the retries, the
+        returned element has to be fired.
+
+        @return: The first ready competence element, or None if no
+            competence element is ready.
+        @rtype: L{SPOSH.CompetenceElement} or None
+        """
+        if self._bits:
+            mask = self._bits.sample(self._needed)
+            for element, true_mask, false_mask, senses in self._compiled:
+                if (mask & true_mask) == true_mask and \
+                   not (mask & false_mask) and \
+                   (not senses or fireSenses(senses)) and \
+                   element.isReadyTriggered(0):
+                    return element
+            return None
         for element in self._elements:
             # as the method ignores the timestamp, we can give it
             # whatever we want
             if element.isReady(0):
-                return element.fire()
-        self.debug("Priority Element failed")
-        return FireResult(1, None)
+                return element
+        return None
+
+    def setBitTriggers(self, bits, needed, compiled):
+        """Sets the compiled triggers of the competence elements.
+
+        See L{SPOSH.DrivePriorityElement.setBitTriggers}.
+
+        @param bits: The sense bits to sample, or None.
+        @type bits: L{SPOSH.bittrigger.SenseBits} or None
+        @param needed: The sense bits needed by the triggers.
+        @type needed: sequence of (bit, method)
+        @param compiled: For each competence element, in order,
+            (element, true mask, false mask, remaining senses).
+        @type compiled: sequence of tuples
+        """
+        self._bits, self._needed, self._compiled = bits, needed, compiled
     
     def copy(self):
         """Returns a reset copy of itsself.
@@ -169,6 +365,7 @@ class CompetencePriorityElement(ElementCollection):
         """
         # everything besides the elements stays the same. That's why
         # we make a shallow copy and only copy the elements separately.
+        from copy import copy
         new_obj = copy(self)
         new_elements = []
         for element in self._elements:
@@ -199,7 +396,7 @@ class CompetenceElement(Element):
         @type max_retries: int
         """
         Element.__init__(self, agent, "CE.%s" % element_name)
-        self._name = element_name
+        self._name = intern(element_name)
         self._trigger = trigger
         self._element = element
         self._max_retries = max_retries
@@ -210,6 +407,40 @@ class CompetenceElement(Element):
         """Resets the retry count.
         """
         self._retries = 0
+
+    def getElement(self):
+        """Returns the element that the competence element fires.
+
+        @return: The element to fire.
+        @rtype: L{SPOSH.Action}, L{SPOSH.Competence}, or
+            L{SPOSH.ActionPattern}
+        """
+        return self._element
+
+    def getMaxRetries(self):
+        """Returns the maximum number of retries of the element.
+
+        @return: The maximum number of retries, or a negative number if
+            the retries are not limited.
+        @rtype: int
+        """
+        return self._max_retries
+
+    def getState(self):
+        """Returns the mutable execution state of the competence element.
+
+        @return: The number of retries so far.
+        @rtype: int
+        """
+        return self._retries
+
+    def setState(self, retries):
+        """Sets the mutable execution state of the competence element.
+
+        @param retries: The number of retries so far.
+        @type retries: int
+        """
+        self._retries = retries
     
     def isReady(self, timestamp):
         """Returns if the element is ready to be fired.
@@ -224,11 +455,22 @@ class CompetenceElement(Element):
         @rtype: boolean
         """
         if self._trigger.fire():
-            if self._max_retries < 0 or self._retries <= self._max_retries:
-                self._retries += 1
-                return 1
-            else:
-                self.debug("Retry limit exceeded")
+            return self.isReadyTriggered(timestamp)
+        return 0
+
+    def isReadyTriggered(self, timestamp):
+        """Returns if the element is ready to be fired, given that its
+        trigger is satisfied.
+
+        This only checks the number of retries, as described in L{isReady}.
+
+        @return: If the element is ready to be fired.
+        @rtype: boolean
+        """
+        if self._max_retries < 0 or self._retries <= self._max_retries:
+            self._retries += 1
+            return 1
+        self.debug("Retry limit exceeded")
         return 0
     
     def fire(self):
@@ -260,6 +502,7 @@ class CompetenceElement(Element):
         @return: A reset copy of itself.
         @rtype: L{SPOSH.CompetenceElement}
         """
+        from copy import copy
         new_obj = copy(self)
         new_obj.reset()
         return new_obj
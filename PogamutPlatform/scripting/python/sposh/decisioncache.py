@@ -0,0 +1,168 @@
+"""A cache of the decisions of drive collections and competences.
+
+In steady states, the agent selects the same drive element and the same
+competence elements tick after tick, given the same sense values. If
+the decision cache is enabled (see L{SPOSH.Agent.enableDecisionCache}),
+the drive collection and each competence read the pure senses (see
+L{SPOSH.Behaviour.getPureSenses}) of their goal and element triggers at
+the start of firing, and look up their decision by these values. For the
+drive collection, the slip-stack position of all drive elements is part
+of the key as well. If the decision is found, the triggers are not fired
+and the cached element is fired right away, which eventually fires the
+same actions as without the cache.
+
+Collections whose goal or triggers use a sense that is not pure are
+never cached. Decisions are only stored if they do not depend on any
+firing frequency (of drive elements) or retry count (of competence
+elements), i.e. if none of the elements up to and including the selected
+element has such a limit.
+
+Each pure sense is read at most once per tick, for which the cache needs
+to be a tick listener of the agent. The pure senses of the plan share
+their readings with the cache (see L{SPOSH.Sense.setReadings}), such
+that a decision that is not cached does not read the senses of the key
+again. The cache is bounded and evicts the least recently used decisions.
+"""
+
+
+class DecisionCache:
+    """A bounded cache of decisions, with least recently used eviction.
+    """
+    def __init__(self, beh_dict, size = 256):
+        """Initialises the cache.
+
+        @param beh_dict: The behaviour dictionary that provides the senses.
+        @type beh_dict: L{SPOSH.BehaviourDict}
+        @param size: The maximum number of cached decisions.
+        @type size: int
+        """
+        self._bdict = beh_dict
+        self._size = size
+        # key -> [decision, use count at the last use]
+        self._entries = {}
+        self._uses = 0
+        # the sense readings of the current tick, shared with the senses
+        self._readings = {}
+        # sense name -> the senses of the plan with that name that share
+        # the readings
+        self._senses = {}
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def tickStart(self, agent):
+        """Forgets the sense readings of the previous tick.
+        """
+        self._readings.clear()
+
+    def tickEnd(self, agent, result):
+        """Does nothing.
+        """
+        pass
+
+    def clear(self):
+        """Removes all cached decisions.
+        """
+        self._entries = {}
+
+    def attach(self, senses):
+        """Makes the pure senses among the given ones share the readings
+        of the cache.
+
+        @param senses: Senses of the plan that are not yet attached.
+        @type senses: sequence of L{SPOSH.Sense}
+        """
+        for sense in senses:
+            name = sense.getSenseName()
+            if self._bdict.isPureSense(name):
+                sense.setReadings(self._readings)
+                self._senses.setdefault(name, []).append(sense)
+
+    def detach(self):
+        """Makes the attached senses call their methods whenever fired.
+        """
+        for senses in self._senses.values():
+            for sense in senses:
+                sense.setReadings(None)
+        self._senses = {}
+
+    def senseNames(self, triggers):
+        """Returns the names of the senses used by the given triggers.
+
+        @param triggers: The triggers and goals of a collection. None
+            stands for a missing trigger or goal.
+        @type triggers: sequence of L{SPOSH.Trigger} or None
+        @return: The distinct sense names, or None if any of the senses
+            is not pure.
+        @rtype: list of strings or None
+        """
+        names = {}
+        for trigger in triggers:
+            if not trigger:
+                continue
+            for sense in trigger.getSenses():
+                name = sense.getSenseName()
+                if not self._bdict.isPureSense(name):
+                    return None
+                names[name] = 1
+        names = names.keys()
+        names.sort()
+        return names
+
+    def signature(self, names):
+        """Returns the readings of the given senses in the current tick.
+
+        @param names: The sense names, as returned by L{senseNames}.
+        @type names: sequence of strings
+        @return: The readings of the senses.
+        @rtype: tuple
+        """
+        readings = self._readings
+        values = []
+        for name in names:
+            if readings.has_key(name):
+                values.append(readings[name])
+            else:
+                senses = self._senses.get(name)
+                if senses:
+                    value = senses[0].read()
+                else:
+                    value = self._bdict.getSense(name)()
+                    readings[name] = value
+                values.append(value)
+        return tuple(values)
+
+    def lookup(self, key):
+        """Returns the cached decision for the given key.
+
+        @param key: The key of the decision.
+        @type key: tuple
+        @return: The decision, or None if it is not cached.
+        @rtype: any
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._uses += 1
+        entry[1] = self._uses
+        return entry[0]
+
+    def store(self, key, decision):
+        """Caches a decision, evicting the least recently used decision
+        if the cache is full.
+
+        @param key: The key of the decision.
+        @type key: tuple
+        @param decision: The decision, which must not be None.
+        @type decision: any
+        """
+        entries = self._entries
+        if len(entries) >= self._size and not entries.has_key(key):
+            oldest_key, oldest_use = None, None
+            for entry_key, entry in entries.items():
+                if oldest_use == None or entry[1] < oldest_use:
+                    oldest_key, oldest_use = entry_key, entry[1]
+            del entries[oldest_key]
+            self.evictions += 1
+        self._uses += 1
+        entries[key] = [decision, self._uses]
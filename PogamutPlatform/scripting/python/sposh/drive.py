@@ -12,11 +12,18 @@ of its drive elements is ready and can be fired.
 # POSH modules
 from element import Element, ElementCollection, FireResult
 from action import Action
+from competence import Competence
+from sense import fireSenses
 
 
 class DriveCollection(ElementCollection):
     """A drive collection, containing drive priority elements.
     """
+    # the decision cache, or None if decisions are not cached
+    _cache = None
+    # the drive element fired by the last firing, or None
+    _fired = None
+
     def __init__(self, agent, collection_name, priority_elements, goal):
         """Initialises the drive collection.
         
@@ -35,17 +42,46 @@ class DriveCollection(ElementCollection):
         @type goal: L{SPOSH.Trigger} or None
         """
         ElementCollection.__init__(self, agent, "DC.%s" % collection_name)
-        self._name = collection_name
+        self._name = intern(collection_name)
         self._elements = priority_elements
         self._goal = goal
+        self._timer = agent.getTimer()
         self.debug("Created")
     
+    def getGoal(self):
+        """Returns the goal of the drive collection.
+
+        @return: The goal, or None if the goal can never be reached.
+        @rtype: L{SPOSH.Trigger} or None
+        """
+        return self._goal
+
+    def getFired(self):
+        """Returns the drive element that the last firing fired.
+
+        @return: The drive element, or None if the goal was reached or
+            no drive element was ready.
+        @rtype: L{SPOSH.DriveElement} or None
+        """
+        return self._fired
+
     def reset(self):
         """Resets all the priority elements of the drive collection.
         """
         self.debug("Reset")
         for element in self._elements:
             element.reset()
+
+    def setTimer(self, timer):
+        """Sets the timer that the priority elements use for their
+        frequency checks.
+
+        @param timer: The agent's timer.
+        @type timer: L{SPOSH.TimerBase}
+        """
+        self._timer = timer
+        for element in self._elements:
+            element.setTimer(timer)
     
     def fire(self):
         """Fires the drive collection.
@@ -68,19 +104,104 @@ class DriveCollection(ElementCollection):
         @rtype: L{SPOSH.FireResult}
         """
         self.debug("Fired")
-        # check if goal reached
-        if self._goal and self._goal.fire():
+        if self._cache:
+            decision = self._cachedDecision()
+        else:
+            decision = self._decide()
+        if decision is self:
             self.debug("Goal Satisfied")
+            self._fired = None
             return FireResult(0, self)
-        # fire elements
-        for element in self._elements:
-            # a priority element returns None if it wasn't
-            # successfully fired
-            if element.fire() != None:
-                return FireResult(1, None)
+        elif decision:
+            self._fired = decision
+            decision.fire()
+            return FireResult(1, None)
         # drive failed (no element fired)
         self.debug("Failed")
+        self._fired = None
         return FireResult(0, None)
+
+    def _decide(self):
+        """Checks the goal and selects the drive element to fire.
+
+        @return: The drive collection itself if its goal is reached,
+            the drive element to fire, or () if no element is ready.
+        @rtype: L{SPOSH.DriveCollection}, L{SPOSH.DriveElement} or tuple
+        """
+        # check if goal reached
+        if self._goal and self._goal.fire():
+            return self
+        # select element
+        for element in self._elements:
+            # a priority element returns None if none of its elements
+            # is ready
+            drive_element = element.select()
+            if drive_element:
+                return drive_element
+        return ()
+
+    def _cachedDecision(self):
+        """Returns the decision from the decision cache, or makes the
+        decision and caches it, if possible.
+
+        See L{_decide} for the returned values.
+        """
+        cache = self._cache
+        slip_stack = []
+        for element in self._drive_elements:
+            slip_stack.append(element.getState()[0])
+        key = (self, cache.signature(self._cache_senses), tuple(slip_stack))
+        decision = cache.lookup(key)
+        if decision is None:
+            decision = self._decide()
+            if self._cacheable.has_key(decision):
+                cache.store(key, decision)
+        elif decision is not self and decision:
+            # update the time of last firing, as done by the selection
+            decision.isReadyTriggered(self._timer.time())
+        return decision
+
+    def setDecisionCache(self, cache):
+        """Sets the cache for the decisions of the drive collection.
+
+        The cache is only used if all senses of the goal and the triggers
+        of the drive collection are pure. Decisions are only cached if
+        none of the drive elements up to and including the selected one
+        has a maximum firing frequency, or is shed with an interval.
+
+        @param cache: The decision cache, or None to not cache decisions.
+        @type cache: L{SPOSH.decisioncache.DecisionCache} or None
+        """
+        self._cache = None
+        if not cache:
+            return
+        elements = []
+        for priority_element in self._elements:
+            elements.extend(priority_element.getElements())
+        triggers = [self._goal]
+        for element in elements:
+            triggers.append(element.getTrigger())
+        senses = cache.senseNames(triggers)
+        if senses == None:
+            self.debug("Decisions depend on impure senses, not cached")
+            return
+        cacheable = {self : 1}
+        for priority_element in self._elements:
+            # elements that are shed with an interval depend on the time
+            interval = priority_element.getShedInterval()
+            if interval != None and interval >= 0:
+                break
+            for element in priority_element.getElements():
+                if element.getMaxFreq() >= 0:
+                    break
+                cacheable[element] = 1
+            else:
+                continue
+            break
+        else:
+            cacheable[()] = 1
+        self._cache, self._cache_senses = cache, senses
+        self._cacheable, self._drive_elements = cacheable, elements
     
     def copy(self):
         """Is never supposed to be called and raises an error.
@@ -93,6 +214,15 @@ class DriveCollection(ElementCollection):
 class DrivePriorityElement(ElementCollection):
     """A drive priority element, containing drive elements.
     """
+    # the sense bits of compiled triggers, or None if the triggers
+    # are not compiled
+    _bits = None
+    # the minimum time between two selections while the element is shed
+    # under overload, or None if it is not shed
+    _shed_interval = None
+    # the predictor of trigger outcomes, or None
+    _predictor = None
+
     def __init__(self, agent, drive_name, elements):
         """Initialises the drive priority element.
         
@@ -106,7 +236,7 @@ class DrivePriorityElement(ElementCollection):
         @type elements: sequence of L{SPOSH.DriveElement}
         """
         ElementCollection.__init__(self, agent, "DP.%s" % drive_name)
-        self._name = drive_name
+        self._name = intern(drive_name)
         self._elements = elements
         self._timer = agent.getTimer()
         self.debug("Created")
@@ -117,6 +247,73 @@ class DrivePriorityElement(ElementCollection):
         self.debug("Reset")
         for element in self._elements:
             element.reset()
+
+    def setTimer(self, timer):
+        """Sets the timer that is used to check the firing frequency
+        of the drive elements.
+
+        @param timer: The agent's timer.
+        @type timer: L{SPOSH.TimerBase}
+        """
+        self._timer = timer
+
+    def setBitTriggers(self, bits, needed, compiled):
+        """Sets the compiled triggers of the drive elements.
+
+        If compiled triggers are set, the drive elements' triggers are
+        evaluated from a bitmask of sampled boolean senses, rather than
+        by firing the triggers. Giving None for C{bits} returns to
+        firing the triggers.
+
+        @param bits: The sense bits to sample, or None.
+        @type bits: L{SPOSH.bittrigger.SenseBits} or None
+        @param needed: The sense bits needed by the triggers, as returned
+            by L{SPOSH.bittrigger.SenseBits.neededBits}.
+        @type needed: sequence of (bit, method)
+        @param compiled: For each drive element, in order,
+            (element, true mask, false mask, remaining senses).
+        @type compiled: sequence of tuples
+        """
+        self._bits, self._needed, self._compiled = bits, needed, compiled
+
+    def setShedInterval(self, interval):
+        """Sheds the priority element, or stops shedding it.
+
+        A shed priority element selects its drive elements at most once
+        in the given interval, and returns None from L{select} in
+        between, without evaluating the triggers of its drive elements.
+        This is used by L{SPOSH.loadshed.OverloadController} to reduce the
+        work of lower-priority drives while the agent is overloaded.
+
+        @param interval: The minimum time in milliseconds between two
+            selections, a negative number to never select a drive
+            element, or None to stop shedding.
+        @type interval: long or None
+        """
+        self._shed_interval = interval
+        # the timestamp of the last selection while shed
+        self._shed_last = -100000l
+
+    def setPredictor(self, predictor):
+        """Sets the predictor that selects the drive elements.
+
+        A predictor skips the evaluation of triggers that are unlikely to
+        be satisfied, see L{SPOSH.prediction}. It is not used if the
+        triggers are compiled (see L{setBitTriggers}).
+
+        @param predictor: The predictor, or None to evaluate all triggers.
+        @type predictor: L{SPOSH.prediction.TriggerPredictor} or None
+        """
+        self._predictor = predictor
+
+    def getShedInterval(self):
+        """Returns the interval with which the priority element is shed.
+
+        @return: The interval, as given to L{setShedInterval}, or None if
+            the element is not shed.
+        @rtype: long or None
+        """
+        return self._shed_interval
     
     def fire(self):
         """Fires the drive prority element.
@@ -129,11 +326,42 @@ class DrivePriorityElement(ElementCollection):
         @rtype: L{SPOSH.FireResult} or None
         """
         self.debug("Fired")
+        element = self.select()
+        if element:
+            element.fire()
+            return FireResult(0, None)
+        return None
+
+    def select(self):
+        """Returns the first ready drive element.
+
+        As L{SPOSH.DriveElement.isReady} records the time of firing, the
+        returned element has to be fired.
+
+        @return: The first ready drive element, or None if no drive
+            element is ready.
+        @rtype: L{SPOSH.DriveElement} or None
+        """
         timestamp = self._timer.time()
+        if self._shed_interval != None:
+            if self._shed_interval < 0 or \
+               timestamp - self._shed_last < self._shed_interval:
+                return None
+            self._shed_last = timestamp
+        if self._bits:
+            mask = self._bits.sample(self._needed)
+            for element, true_mask, false_mask, senses in self._compiled:
+                if (mask & true_mask) == true_mask and \
+                   not (mask & false_mask) and \
+                   (not senses or fireSenses(senses)) and \
+                   element.isReadyTriggered(timestamp):
+                    return element
+            return None
+        if self._predictor:
+            return self._predictor.select(self._elements, timestamp)
         for element in self._elements:
             if element.isReady(timestamp):
-                element.fire()
-                return FireResult(0, None)
+                return element
         return None
 
     def copy(self):
@@ -147,6 +375,9 @@ class DrivePriorityElement(ElementCollection):
 class DriveElement(Element):
     """A drive element.
     """
+    # the number of times that a time limit ran out
+    _timeouts = 0
+
     def __init__(self, agent, element_name, trigger, root, max_freq):
         """Initialises the drive element.
         
@@ -167,12 +398,16 @@ class DriveElement(Element):
         @type max_freq: long
         """
         Element.__init__(self, agent, "DE.%s" % element_name)
-        self._name = element_name
+        self._name = intern(element_name)
         self._trigger = trigger
         self._root, self._element = root, root
         self._max_freq = max_freq
         # the timestamp when it was last fired
         self._last_fired = -100000l
+        # the competences and action patterns that the drive element is
+        # in, from the root down, as [element, deadline or None, if an
+        # action pattern that descended into a competence]
+        self._entered = []
         self.debug("Created")
     
     def reset(self):
@@ -182,6 +417,65 @@ class DriveElement(Element):
         self.debug("Reset")
         self._element = self._root
         self._last_fired = -100000l
+        self._entered = []
+
+    def getState(self):
+        """Returns the mutable execution state of the drive element.
+
+        @return: The element to fire next and the timestamp of when
+            the drive element was last fired.
+        @rtype: (L{SPOSH.Action}, L{SPOSH.Competence} or
+            L{SPOSH.ActionPattern}, long)
+        """
+        return self._element, self._last_fired
+
+    def setState(self, element, last_fired):
+        """Sets the mutable execution state of the drive element.
+
+        @param element: The element to fire next, or None to return
+            to the root element.
+        @type element: L{SPOSH.Action}, L{SPOSH.Competence},
+            L{SPOSH.ActionPattern} or None
+        @param last_fired: The timestamp of when the drive element was last
+            fired.
+        @type last_fired: long
+        """
+        if element:
+            self._element = element
+        else:
+            self._element = self._root
+        self._last_fired = last_fired
+        # the time that was spent in the element is not known, so its
+        # time limit starts with the last firing
+        self._entered = []
+        if self._element is not self._root:
+            self._enter(self._element, last_fired)
+
+    def getMaxFreq(self):
+        """Returns the minimum time between two firings of the element.
+
+        @return: The time in milliseconds, or a negative number if the
+            firing frequency is not limited.
+        @rtype: long
+        """
+        return self._max_freq
+
+    def getTimeouts(self):
+        """Returns how often the drive element returned to its root
+        because a competence or action pattern exceeded its time limit.
+
+        @rtype: int
+        """
+        return self._timeouts
+
+    def getRoot(self):
+        """Returns the root element of the drive element.
+
+        @return: The root element.
+        @rtype: L{SPOSH.Action}, L{SPOSH.Competence} or
+            L{SPOSH.ActionPattern}
+        """
+        return self._root
     
     def isReady(self, timestamp):
         """Returns if the element is ready to be fired.
@@ -198,13 +492,24 @@ class DriveElement(Element):
         @type timestamp: long.
         """
         if self._trigger.fire():
-            if self._max_freq < 0 or \
-               (timestamp - self._last_fired) >= self._max_freq:
-                self._last_fired = timestamp
-                return 1
-            else:
-                self.debug("Max. firing frequency exceeded")
+            return self.isReadyTriggered(timestamp)
         return 0 
+
+    def isReadyTriggered(self, timestamp):
+        """Returns if the element is ready to be fired, given that its
+        trigger is satisfied.
+
+        This only checks the firing frequency, as described in L{isReady}.
+
+        @param timestamp: The current timestamp in milliseconds
+        @type timestamp: long.
+        """
+        if self._max_freq < 0 or \
+           (timestamp - self._last_fired) >= self._max_freq:
+            self._last_fired = timestamp
+            return 1
+        self.debug("Max. firing frequency exceeded")
+        return 0
     
     def fire(self):
         """Fires the drive element.
@@ -212,6 +517,21 @@ class DriveElement(Element):
         This method fires the current drive element and always
         returns None. It uses the slip-stack architecture to determine
         the element to fire in the next step.
+
+        If the drive element has spent more than the time limit of a
+        competence or action pattern in that element, or in the elements
+        that it descended into, that element and the ones below it are
+        reset, and the drive element returns to its root element and fires
+        it instead. These timeouts are counted (see L{getTimeouts}). The
+        time is given by the agent's timer, at the selection of the drive
+        element.
+
+        The time in a competence starts when the drive element enters it,
+        and runs on while the drive element returns to its root after each
+        action of the competence and descends into it again. It ends when
+        the goal of the competence is reached or the competence fails, or
+        when the competence above it selects another element. The time in
+        an action pattern ends when the pattern completes or fails.
         
         @return: None.
         @rtype: None
@@ -228,21 +548,90 @@ class DriveElement(Element):
             element.fire()
             self._element = self._root
             return None
-        # the element is a competence or an action pattern
+        # the element is a competence or an action pattern. The time of
+        # the selection that preceded the firing is the current time.
+        now = self._last_fired
+        entered = self._entered
+        for index in range(len(entered)):
+            deadline = entered[index][1]
+            if deadline != None and now > deadline:
+                self.debug("Time limit exceeded")
+                self._timeouts += 1
+                for entry in entered[index:]:
+                    entry[0].reset()
+                del entered[index:]
+                element = self._root
+                self._element = element
+                if element.__class__ == Action:
+                    element.fire()
+                    return None
+                break
+        index = self._position(element)
+        if index < 0:
+            index = len(entered)
+            self._enter(element, now)
         result = element.fire()
         if result.continueExecution():
             # if we have a new next element, store it as the next
             # element to execute
             nextElement = result.nextElement()
             if nextElement:
+                if element.__class__ != Competence:
+                    # the action pattern is done, but its time limit
+                    # covers the competence
+                    entered[index][2] = 1
+                below = index + 1
+                if below >= len(entered) or \
+                   entered[below][0] is not nextElement or entered[below][2]:
+                    # descending into another element than before
+                    del entered[below:]
+                    self._enter(nextElement, now)
                 self._element = nextElement
         else:
             # we were told not to continue the execution -> back to root
             # We must not call reset() here, as that would also reset
             # the firing frequency of the element.
             self._element = self._root
+            if element.__class__ == Competence and not element.isFinished():
+                # an action of the competence was fired, and the drive
+                # element stays in the competence
+                del entered[index + 1:]
+            else:
+                del entered[index:]
+                # the action patterns that descended into the element
+                while entered and entered[-1][2]:
+                    del entered[-1]
         return None
 
+    def _position(self, element):
+        """Returns the position of an element in the entered elements, or
+        -1 if the drive element is not in that element.
+        """
+        entered = self._entered
+        index = len(entered) - 1
+        while index >= 0:
+            if entered[index][0] is element:
+                return index
+            index = index - 1
+        return -1
+
+    def _enter(self, element, now):
+        """Starts the time limit of the element that the drive element
+        descends into.
+
+        The time limit of an element also covers the elements that it
+        descends into.
+
+        @param element: The entered element.
+        @type element: L{SPOSH.Competence} or L{SPOSH.ActionPattern}
+        @param now: The current time in milliseconds.
+        @type now: long
+        """
+        limit = element.getTimeLimit()
+        if limit != None:
+            limit = now + limit
+        self._entered.append([element, limit, 0])
+
     def copy(self):
         """Is never supposed to be called and raises an error.
         
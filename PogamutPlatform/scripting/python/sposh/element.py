@@ -91,7 +91,16 @@ class ElementBase(LogBase):
     
     This element is not used directly, but is inherited
     by L{SPOSH.Sense}, L{SPOSH.Action}, and L{SPOSH.PlanElement}.
+
+    As many agents may be built from the same plan, the name and the log
+    domain of an element are interned, such that all elements with the
+    same name share the same string objects. Attributes that are the same
+    for most elements are given as class attributes rather than being
+    set for every instance.
     """
+    # the default name, for elements that do not have a name
+    _name = "NoName"
+
     def __init__(self, agent, log_domain):
         """Initialises the element, and assigns it a unique id.
         
@@ -100,9 +109,8 @@ class ElementBase(LogBase):
         @param log_domain: The logging domain for the element.
         @type log_domain: string
         """
-        LogBase.__init__(self, agent.getLog(), log_domain)
+        LogBase.__init__(self, agent.getLog(), intern(log_domain))
         self._id = _get_next_id()
-        self._name = "NoName"
                 
     def getName(self):
         """Returns the name of the element.
@@ -218,6 +226,16 @@ class Element(PlanElement):
         @type log_domain: string
         """
         PlanElement.__init__(self, agent, log_domain)
+
+    def getTrigger(self):
+        """Returns the trigger of the element.
+
+        Inheriting classes store their trigger in C{self._trigger}.
+
+        @return: The element's trigger.
+        @rtype: L{SPOSH.Trigger} or None
+        """
+        return self._trigger
     
     def isReady(self, timestamp):
         """Returns if the element is ready to be fired.
@@ -232,6 +250,27 @@ class Element(PlanElement):
         @raise NotImplementedError: always
         """
         raise NotImplementedError, "Element.isReady() needs to be overridden"
+
+    def isReadyTriggered(self, timestamp):
+        """Returns if the element is ready to be fired, given that its
+        trigger is satisfied.
+
+        This performs the checks of L{isReady} other than firing the
+        trigger, for callers that evaluated the trigger themselves. As
+        with L{isReady}, the element has to be fired every time that this
+        method returns 1.
+
+        This method needs to be overridden by inheriting classes.
+        In its default implementation it raises NotImplementedError.
+
+        @param timestamp: The current timestamp in milliseconds.
+        @type timestamp: long
+        @return: If the element can be fired.
+        @rtype: boolean
+        @raise NotImplementedError: always
+        """
+        raise NotImplementedError, \
+            "Element.isReadyTriggered() needs to be overridden"
     
 
 class ElementCollection(PlanElement):
@@ -248,3 +287,13 @@ class ElementCollection(PlanElement):
         @type log_domain: string
         """
         PlanElement.__init__(self, agent, log_domain)
+
+    def getElements(self):
+        """Returns the elements of the collection.
+
+        Inheriting classes store their elements in C{self._elements}.
+
+        @return: The elements of the collection.
+        @rtype: sequence of L{SPOSH.ElementBase}
+        """
+        return self._elements
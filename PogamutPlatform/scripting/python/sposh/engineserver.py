@@ -0,0 +1,495 @@
+"""A local server that runs agents for game connectors in other languages.
+
+An L{EngineServer} lets connectors that do not embed Jython, like the
+Java side of a bot, use POSH plans. The connector opens a group of agents
+for one of the server's plans, and then sends the sense readings of all
+agents of the group for every tick. The server runs the plan for the
+whole group with a L{SPOSH.batch.BatchEngine}, and returns the action
+that each agent selected. The connector performs these actions.
+
+The server listens on a TCP port of the local host. A connection can be
+used for any number of requests, and requests can be pipelined: the
+client can send further requests before reading the responses, which are
+returned in the order of the requests. The responses to all requests that
+have arrived are sent together.
+
+As the senses are read by the connector, sense-acts are treated like
+senses, i.e. the connector gives their values. Actions are assumed to
+succeed. Time advances by one step with every tick of a group.
+
+Protocol
+--------
+  All numbers are big-endian, and strings are given by their length (H)
+  followed by their characters. Every request and response is a frame::
+
+    length:i kind:B request_id:i body
+
+  where the length counts the bytes after the length field, and the
+  response carries the request id of its request. The requests are::
+
+    OPEN   (1): plan:string agents:i
+                senses:H ( sense:string )*
+                actions:H ( action:string )*
+    TICK   (2): group:i agents:i
+                senses * ( agents * value:d )
+    CLOSE  (3): group:i
+
+  OPEN creates a group of agents for the plan of the given name, whose
+  senses and actions are declared by the connector. TICK gives one column
+  of readings for each declared sense, in the declared order. The
+  responses are::
+
+    OPEN   (1): group:i
+    TICK   (2): group:i agents:i agents * action:h agents * result:b
+    CLOSE  (3): (empty)
+    ERROR  (0): message:string
+
+  where each action is the index of a declared action, or -1 if the agent
+  performs no action, and each result is the drive result of the agent
+  (see L{SPOSH.Agent.followDrive}). A request that fails is answered by
+  ERROR, and the connection stays open.
+
+L{EngineClient} implements the protocol as a stand-in for connectors.
+"""
+
+# Python modules
+import struct
+import thread
+
+# Java modules
+from java.io import BufferedInputStream, BufferedOutputStream, \
+     DataInputStream, DataOutputStream, EOFException, IOException
+from java.lang import String
+from java.net import InetAddress, ServerSocket, Socket
+from jarray import zeros
+
+# POSH modules
+from behaviour import Behaviour
+from batch import BatchEngine
+from lapparser import ParseError
+from zygote import Zygote
+
+# kinds of frames
+KIND_ERROR = 0
+KIND_OPEN = 1
+KIND_TICK = 2
+KIND_CLOSE = 3
+
+
+class ServerError(Exception):
+    """An error that the server returned for a request.
+    """
+    pass
+
+
+def _packString(string):
+    """Returns a string packed as its length and its characters.
+    """
+    return struct.pack('>H', len(string)) + string
+
+
+def _unpackString(data, offset):
+    """Returns the string packed at the given offset, and the offset
+    after it.
+    """
+    length = struct.unpack('>H', data[offset:offset + 2])[0]
+    offset = offset + 2
+    return data[offset:offset + length], offset + length
+
+
+def _unpackStrings(data, offset):
+    """Returns the strings packed as a count followed by the strings, and
+    the offset after them.
+    """
+    count = struct.unpack('>H', data[offset:offset + 2])[0]
+    offset = offset + 2
+    strings = []
+    for i in range(count):
+        string, offset = _unpackString(data, offset)
+        strings.append(string)
+    return strings, offset
+
+
+def readFrame(input):
+    """Reads a frame from a stream.
+
+    @param input: The stream.
+    @type input: java.io.DataInputStream
+    @return: The kind, request id and body of the frame, or None if the
+        stream ended.
+    @rtype: (int, int, string) or None
+    """
+    try:
+        length = input.readInt()
+    except EOFException:
+        return None
+    data = zeros(length, 'b')
+    input.readFully(data)
+    data = str(String(data, "ISO-8859-1"))
+    kind, request_id = struct.unpack('>Bi', data[:5])
+    return kind, request_id, data[5:]
+
+
+def writeFrame(output, kind, request_id, body):
+    """Writes a frame to a stream, without flushing the stream.
+
+    @param output: The stream.
+    @type output: java.io.DataOutputStream
+    @param kind: The kind of the frame.
+    @type kind: int
+    @param request_id: The id of the request.
+    @type request_id: int
+    @param body: The body of the frame.
+    @type body: string
+    """
+    output.writeInt(len(body) + 5)
+    output.writeBytes(struct.pack('>Bi', kind, request_id) + body)
+
+
+class _ConnectorBehaviour(Behaviour):
+    """A stub behaviour that declares the senses and actions of a
+    connector, which are evaluated and performed by the connector.
+    """
+    def __init__(self, log, senses, actions):
+        Behaviour.__init__(self, log)
+        self._senses = senses
+        self._actions = actions
+        for name in senses:
+            setattr(self, "sense_" + name, self._connector)
+        for name in actions:
+            setattr(self, "action_" + name, self._connector)
+
+    def _connector(self):
+        return 1
+
+
+class _Group:
+    """A group of agents of a connector.
+    """
+    def __init__(self, engine, n, senses, actions):
+        """Initialises the group.
+
+        @param engine: The engine that runs the agents.
+        @type engine: L{SPOSH.batch.BatchEngine}
+        @param n: The number of agents.
+        @type n: int
+        @param senses: The senses declared by the connector.
+        @type senses: list of strings
+        @param actions: The actions declared by the connector.
+        @type actions: list of strings
+        """
+        self.engine, self.n, self.senses = engine, n, senses
+        # the index of the declared action for the index of each action
+        # of the engine plus one, as -1 stands for no action
+        self.actions = [-1]
+        for name in engine.getActionNames():
+            self.actions.append(actions.index(name))
+        # serialises the ticks of the group from several connections
+        self.lock = thread.allocate_lock()
+
+
+class EngineServer:
+    """Runs groups of agents for connectors over TCP connections.
+    """
+    def __init__(self, plans, log, port = 0):
+        """Initialises the server, parses its plans and opens its port.
+
+        @param plans: The plans that connectors can use, as plan name ->
+            file name (complete path + file + extension).
+        @type plans: dictionary, string -> string
+        @param log: java.util.logging.Logger instance
+        @type log: java.util.logging.Logger
+        @param port: The port to listen on, or 0 for any free port.
+        @type port: int
+        @raise ParseError: If a plan could not be parsed.
+        """
+        self._plans = plans
+        self._log = log
+        self._zygote = Zygote(plans.values())
+        # group id -> group
+        self._groups = {}
+        self._next_group = 1
+        self._lock = thread.allocate_lock()
+        self._socket = ServerSocket(port, 50,
+                                    InetAddress.getByName("127.0.0.1"))
+        self._running = 0
+
+    def getPort(self):
+        """Returns the port that the server listens on.
+
+        @rtype: int
+        """
+        return self._socket.getLocalPort()
+
+    def start(self):
+        """Starts accepting connections in a separate thread.
+        """
+        self._running = 1
+        thread.start_new_thread(self._accept, ())
+
+    def stop(self):
+        """Stops accepting connections.
+        """
+        self._running = 0
+        self._socket.close()
+
+    def _accept(self):
+        """Accepts connections and serves each in its own thread.
+        """
+        while self._running:
+            try:
+                connection = self._socket.accept()
+            except IOException:
+                break
+            connection.setTcpNoDelay(1)
+            thread.start_new_thread(self._serve, (connection,))
+
+    def _serve(self, connection):
+        """Answers the requests of a connection until it is closed.
+
+        @param connection: The connection.
+        @type connection: java.net.Socket
+        """
+        input = DataInputStream(BufferedInputStream(
+            connection.getInputStream()))
+        output = DataOutputStream(BufferedOutputStream(
+            connection.getOutputStream()))
+        try:
+            try:
+                while 1:
+                    frame = readFrame(input)
+                    if frame == None:
+                        break
+                    kind, request_id, body = frame
+                    kind, body = self.handle(kind, body)
+                    writeFrame(output, kind, request_id, body)
+                    # the responses to pipelined requests are sent together
+                    if input.available() == 0:
+                        output.flush()
+            except IOException:
+                pass
+        finally:
+            connection.close()
+
+    def handle(self, kind, body):
+        """Answers a single request.
+
+        @param kind: The kind of the request.
+        @type kind: int
+        @param body: The body of the request.
+        @type body: string
+        @return: The kind and body of the response.
+        @rtype: (int, string)
+        """
+        try:
+            if kind == KIND_OPEN:
+                return KIND_OPEN, self._open(body)
+            elif kind == KIND_TICK:
+                return KIND_TICK, self._tick(body)
+            elif kind == KIND_CLOSE:
+                return KIND_CLOSE, self._close(body)
+            raise ValueError, "Unknown request kind %d" % kind
+        except (KeyError, NameError, ParseError, TypeError, ValueError,
+                AttributeError, struct.error), msg:
+            return KIND_ERROR, _packString(str(msg))
+
+    def _open(self, body):
+        """Creates a group of agents.
+        """
+        plan, offset = _unpackString(body, 0)
+        n = struct.unpack('>i', body[offset:offset + 4])[0]
+        senses, offset = _unpackStrings(body, offset + 4)
+        actions, offset = _unpackStrings(body, offset)
+        if not self._plans.has_key(plan):
+            raise KeyError, "Unknown plan '%s'" % plan
+        behaviour = _ConnectorBehaviour(self._log, senses, actions)
+        agent = self._zygote.spawn([behaviour], self._plans[plan], self._log)
+        agent.setSteppedTimer()
+        group = _Group(BatchEngine(agent, n), n, senses, actions)
+        self._lock.acquire()
+        group_id = self._next_group
+        self._next_group = group_id + 1
+        self._groups[group_id] = group
+        self._lock.release()
+        return struct.pack('>i', group_id)
+
+    def _getGroup(self, group_id):
+        """Returns the group of the given id.
+        """
+        group = self._groups.get(group_id)
+        if group == None:
+            raise KeyError, "Unknown group %d" % group_id
+        return group
+
+    def _tick(self, body):
+        """Performs a tick of a group of agents.
+        """
+        group_id, n = struct.unpack('>ii', body[:8])
+        group = self._getGroup(group_id)
+        if n != group.n or len(body) != 8 + 8 * n * len(group.senses):
+            raise ValueError, "Expected readings of %d senses of %d agents" \
+                  % (len(group.senses), group.n)
+        column_format = '>%dd' % n
+        columns = {}
+        offset = 8
+        for name in group.senses:
+            columns[name] = struct.unpack(column_format,
+                                          body[offset:offset + 8 * n])
+            offset = offset + 8 * n
+        group.lock.acquire()
+        try:
+            actions = group.engine.tick(columns)
+            results = tuple(group.engine.getResults())
+        finally:
+            group.lock.release()
+        lookup = group.actions
+        actions = tuple([lookup[action + 1] for action in actions])
+        return struct.pack('>ii', group_id, n) + \
+               apply(struct.pack, ('>%dh' % n,) + actions) + \
+               apply(struct.pack, ('>%db' % n,) + results)
+
+    def _close(self, body):
+        """Removes a group of agents.
+        """
+        group_id = struct.unpack('>i', body[:4])[0]
+        self._getGroup(group_id)
+        self._lock.acquire()
+        del self._groups[group_id]
+        self._lock.release()
+        return ''
+
+
+class EngineClient:
+    """A client of an L{EngineServer}, which stands in for a connector.
+
+    Ticks can be pipelined by sending several of them by L{sendTick}
+    before receiving their responses by L{receive}.
+    """
+    def __init__(self, port, host = "127.0.0.1"):
+        """Connects to a server.
+
+        @param port: The port of the server.
+        @type port: int
+        @param host: The host of the server.
+        @type host: string
+        """
+        self._socket = Socket(host, port)
+        self._socket.setTcpNoDelay(1)
+        self._input = DataInputStream(BufferedInputStream(
+            self._socket.getInputStream()))
+        self._output = DataOutputStream(BufferedOutputStream(
+            self._socket.getOutputStream()))
+        self._next_request = 0
+        # group id -> number of agents
+        self._groups = {}
+
+    def _send(self, kind, body):
+        """Sends a request and returns its id.
+        """
+        request_id = self._next_request
+        self._next_request = request_id + 1
+        writeFrame(self._output, kind, request_id, body)
+        return request_id
+
+    def flush(self):
+        """Sends all requests that were not sent yet.
+        """
+        self._output.flush()
+
+    def receive(self):
+        """Receives the response to the oldest request without response.
+
+        @return: The request id and the result of the request: the group
+            id for OPEN, a list of the indices of the actions of the agents
+            and a list of their drive results for TICK, and None for CLOSE.
+        @rtype: (int, any)
+        @raise ServerError: If the request failed.
+        @raise IOError: If the connection was closed.
+        """
+        self.flush()
+        frame = readFrame(self._input)
+        if frame == None:
+            raise IOError, "Connection closed by the server"
+        kind, request_id, body = frame
+        if kind == KIND_ERROR:
+            raise ServerError, _unpackString(body, 0)[0]
+        elif kind == KIND_OPEN:
+            return request_id, struct.unpack('>i', body)[0]
+        elif kind == KIND_TICK:
+            group_id, n = struct.unpack('>ii', body[:8])
+            actions = struct.unpack('>%dh' % n, body[8:8 + 2 * n])
+            results = struct.unpack('>%db' % n, body[8 + 2 * n:])
+            return request_id, (list(actions), list(results))
+        return request_id, None
+
+    def open(self, plan, n, senses, actions):
+        """Opens a group of agents.
+
+        @param plan: The name of the plan on the server.
+        @type plan: string
+        @param n: The number of agents.
+        @type n: int
+        @param senses: The names of the senses that are given for every
+            tick.
+        @type senses: sequence of strings
+        @param actions: The names of the actions that the agents perform.
+        @type actions: sequence of strings
+        @return: The id of the group.
+        @rtype: int
+        @raise ServerError: If the group could not be opened.
+        """
+        body = [_packString(plan), struct.pack('>iH', n, len(senses))]
+        body.extend(map(_packString, senses))
+        body.append(struct.pack('>H', len(actions)))
+        body.extend(map(_packString, actions))
+        self._send(KIND_OPEN, ''.join(body))
+        group_id = self.receive()[1]
+        self._groups[group_id] = n
+        return group_id
+
+    def sendTick(self, group_id, columns):
+        """Sends a tick of a group of agents, without waiting for its
+        response.
+
+        @param group_id: The id of the group.
+        @type group_id: int
+        @param columns: The readings of each declared sense, in the order
+            of their declaration, as a sequence of the readings of all
+            agents.
+        @type columns: sequence of sequences of numbers
+        @return: The request id.
+        @rtype: int
+        """
+        n = self._groups[group_id]
+        column_format = '>%dd' % n
+        body = [struct.pack('>ii', group_id, n)]
+        for column in columns:
+            body.append(apply(struct.pack, (column_format,) + tuple(column)))
+        return self._send(KIND_TICK, ''.join(body))
+
+    def tick(self, group_id, columns):
+        """Performs a tick of a group of agents.
+
+        See L{sendTick} and L{receive}.
+
+        @return: The index of the action of each agent, or -1 for none,
+            and the drive result of each agent.
+        @rtype: (list of int, list of int)
+        """
+        self.sendTick(group_id, columns)
+        return self.receive()[1]
+
+    def close(self, group_id):
+        """Closes a group of agents.
+
+        @param group_id: The id of the group.
+        @type group_id: int
+        """
+        self._send(KIND_CLOSE, struct.pack('>i', group_id))
+        self.receive()
+        del self._groups[group_id]
+
+    def disconnect(self):
+        """Closes the connection.
+        """
+        self._socket.close()
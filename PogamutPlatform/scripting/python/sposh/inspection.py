@@ -0,0 +1,437 @@
+"""Bulk snapshots of the inspectors of an agent's behaviours.
+
+The inspectors of a behaviour (see L{SPOSH.Behaviour.registerInspectors})
+are accessor methods for the state of the behaviour. Rather than calling
+each accessor whenever a monitor polls, an L{Inspection} collects the
+values of all inspectors of all behaviours of an agent at once, at the
+end of a tick, and only when a snapshot was requested since the last
+tick. The values are compared with the ones collected before, and each
+sample that changes any value gets a new version number. A snapshot
+returns the values that changed since a given version, such that a
+monitor that keeps the last version it received only gets the changes.
+
+The values are kept as strings, as given by C{str()}, which is also the
+form in which the mutators of the inspectors accept them.
+
+An L{InspectionServer} serves the snapshots of several agents over a TCP
+port of the local host, such that a dashboard can watch the agents from
+another process.
+
+Protocol
+--------
+  The protocol uses the frames of L{SPOSH.engineserver}. The requests
+  are::
+
+    LIST     (1): (empty)
+    SNAPSHOT (2): agents:H ( agent:string since:i )*
+
+  LIST returns the names of the agents. SNAPSHOT requests a snapshot of
+  each given agent, and waits for the end of the agents' current ticks,
+  at most for the server's timeout. The responses are::
+
+    LIST     (1): agents:H ( agent:string )*
+    SNAPSHOT (2): agents:H ( agent:string version:i
+                             values:H ( name:string value:string )* )*
+    ERROR    (0): message:string
+
+  where each name is 'Behaviour.Inspector'. Values are truncated to 65535
+  characters.
+"""
+
+# Python modules
+import struct
+import thread
+
+# Java modules
+from java.io import BufferedInputStream, BufferedOutputStream, \
+     DataInputStream, DataOutputStream, IOException
+from java.lang import System
+from java.net import InetAddress, ServerSocket, Socket
+from java.util.concurrent import CountDownLatch, TimeUnit
+
+# POSH modules
+from engineserver import readFrame, writeFrame, KIND_ERROR, ServerError, \
+     _packString, _unpackString, _unpackStrings
+
+# kinds of frames
+KIND_LIST = 1
+KIND_SNAPSHOT = 2
+
+
+class Inspection:
+    """Collects the values of the inspectors of an agent.
+
+    The inspection is a tick listener of the agent, which collects the
+    values at the end of a tick if a snapshot was requested.
+    """
+    def __init__(self, agent):
+        """Initialises the inspection of the given agent.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        """
+        self._agent = agent
+        # 'Behaviour.Inspector' -> (version, value)
+        self._values = {}
+        self._version = 0
+        # released after the next sample, or None if no sample is requested
+        self._latch = None
+        self._lock = thread.allocate_lock()
+        # the number of samples
+        self.samples = 0
+
+    def getVersion(self):
+        """Returns the version of the last sample.
+
+        @rtype: int
+        """
+        return self._version
+
+    def sample(self):
+        """Collects the values of all inspectors.
+
+        The values are read in the calling thread, which has to be the
+        thread that runs the agent, inbetween two ticks.
+
+        @return: The version of the values.
+        @rtype: int
+        """
+        version = self._version + 1
+        values = self._values
+        changed = 0
+        for behaviour in self._agent.getBehaviours():
+            prefix = behaviour.getName() + "."
+            for name, accessor, mutator in behaviour.getInspectors():
+                try:
+                    value = str(accessor())
+                except Exception, msg:
+                    value = "<error: %s>" % msg
+                key = prefix + name
+                old = values.get(key)
+                if old == None or old[1] != value:
+                    values[key] = (version, value)
+                    changed = 1
+        if changed:
+            self._version = version
+        self.samples += 1
+        return self._version
+
+    def getChanges(self, since = 0):
+        """Returns the values of the last sample that changed since the
+        given version.
+
+        @param since: The version that the values are compared to, or 0
+            for all values.
+        @type since: int
+        @return: The version of the last sample, and the changed values
+            as 'Behaviour.Inspector' -> value.
+        @rtype: (int, dictionary)
+        """
+        changes = {}
+        for key, (version, value) in self._values.items():
+            if version > since:
+                changes[key] = value
+        return self._version, changes
+
+    def request(self):
+        """Requests a sample at the end of the agent's next tick.
+
+        @return: The latch that is released after the sample.
+        @rtype: java.util.concurrent.CountDownLatch
+        """
+        self._lock.acquire()
+        try:
+            if self._latch == None:
+                self._latch = CountDownLatch(1)
+            return self._latch
+        finally:
+            self._lock.release()
+
+    def snapshot(self, since = 0, timeout = 100):
+        """Returns the values that changed since the given version, as
+        sampled at the end of the agent's next tick.
+
+        This method is called from threads other than the one that runs
+        the agent. If the agent does not end a tick within the timeout,
+        the values of the last sample are returned.
+
+        @param since: The version that the values are compared to, or 0
+            for all values.
+        @type since: int
+        @param timeout: The time in milliseconds to wait for the tick.
+        @type timeout: long
+        @return: See L{getChanges}.
+        @rtype: (int, dictionary)
+        """
+        self.request().await(timeout, TimeUnit.MILLISECONDS)
+        return self.getChanges(since)
+
+    def tickStart(self, agent):
+        """Does nothing.
+        """
+        pass
+
+    def tickEnd(self, agent, result):
+        """Collects the values if a snapshot was requested.
+        """
+        if self._latch == None:
+            return
+        self._lock.acquire()
+        latch, self._latch = self._latch, None
+        self._lock.release()
+        self.sample()
+        latch.countDown()
+
+
+class InspectionServer:
+    """Serves the snapshots of the inspectors of agents over TCP
+    connections.
+    """
+    def __init__(self, agents, port = 0, timeout = 100):
+        """Initialises the server and opens its port.
+
+        The inspection of the agents is enabled if it is not, which has to
+        be done before the agents run.
+
+        @param agents: The agents to serve, as name -> agent.
+        @type agents: dictionary, string -> L{SPOSH.Agent}
+        @param port: The port to listen on, or 0 for any free port.
+        @type port: int
+        @param timeout: The time in milliseconds that a snapshot waits for
+            the end of the ticks of all requested agents together.
+        @type timeout: long
+        """
+        self._inspections = {}
+        for name, agent in agents.items():
+            if not agent.getInspection():
+                agent.enableInspection()
+            self._inspections[name] = agent.getInspection()
+        self._timeout = timeout
+        self._socket = ServerSocket(port, 50,
+                                    InetAddress.getByName("127.0.0.1"))
+        self._running = 0
+
+    def getPort(self):
+        """Returns the port that the server listens on.
+
+        @rtype: int
+        """
+        return self._socket.getLocalPort()
+
+    def start(self):
+        """Starts accepting connections in a separate thread.
+        """
+        self._running = 1
+        thread.start_new_thread(self._accept, ())
+
+    def stop(self):
+        """Stops accepting connections.
+        """
+        self._running = 0
+        self._socket.close()
+
+    def _accept(self):
+        """Accepts connections and serves each in its own thread.
+        """
+        while self._running:
+            try:
+                connection = self._socket.accept()
+            except IOException:
+                break
+            connection.setTcpNoDelay(1)
+            thread.start_new_thread(self._serve, (connection,))
+
+    def _serve(self, connection):
+        """Answers the requests of a connection until it is closed.
+
+        @param connection: The connection.
+        @type connection: java.net.Socket
+        """
+        input = DataInputStream(BufferedInputStream(
+            connection.getInputStream()))
+        output = DataOutputStream(BufferedOutputStream(
+            connection.getOutputStream()))
+        try:
+            try:
+                while 1:
+                    frame = readFrame(input)
+                    if frame == None:
+                        break
+                    kind, request_id, body = frame
+                    kind, body = self.handle(kind, body)
+                    writeFrame(output, kind, request_id, body)
+                    output.flush()
+            except IOException:
+                pass
+        finally:
+            connection.close()
+
+    def handle(self, kind, body):
+        """Answers a single request.
+
+        @param kind: The kind of the request.
+        @type kind: int
+        @param body: The body of the request.
+        @type body: string
+        @return: The kind and body of the response.
+        @rtype: (int, string)
+        """
+        try:
+            if kind == KIND_LIST:
+                names = self._inspections.keys()
+                return KIND_LIST, struct.pack('>H', len(names)) + \
+                       ''.join(map(_packString, names))
+            elif kind == KIND_SNAPSHOT:
+                return KIND_SNAPSHOT, self._snapshot(body)
+            raise ValueError, "Unknown request kind %d" % kind
+        except (KeyError, ValueError, struct.error), msg:
+            return KIND_ERROR, _packString(str(msg))
+
+    def _snapshot(self, body):
+        """Takes snapshots of the requested agents.
+        """
+        count = struct.unpack('>H', body[:2])[0]
+        offset = 2
+        requests = []
+        for i in range(count):
+            name, offset = _unpackString(body, offset)
+            since = struct.unpack('>i', body[offset:offset + 4])[0]
+            offset = offset + 4
+            if not self._inspections.has_key(name):
+                raise KeyError, "Unknown agent '%s'" % name
+            requests.append((name, since))
+        # the samples are requested from all agents before waiting for any,
+        # and the timeout applies to all of them together
+        latches = [self._inspections[name].request() for name, since in \
+                   requests]
+        deadline = System.currentTimeMillis() + self._timeout
+        for latch in latches:
+            remaining = deadline - System.currentTimeMillis()
+            if remaining <= 0:
+                break
+            latch.await(remaining, TimeUnit.MILLISECONDS)
+        response = [struct.pack('>H', len(requests))]
+        for name, since in requests:
+            version, changes = self._inspections[name].getChanges(since)
+            response.append(_packString(name))
+            response.append(struct.pack('>iH', version, len(changes)))
+            for key, value in changes.items():
+                response.append(_packString(key))
+                response.append(_packString(value[:65535]))
+        return ''.join(response)
+
+
+class InspectionClient:
+    """A client of an L{InspectionServer}, as used by a dashboard.
+
+    The client keeps the last received version and values of each agent,
+    such that L{poll} only transfers the values that changed.
+    """
+    def __init__(self, port, host = "127.0.0.1"):
+        """Connects to a server.
+
+        @param port: The port of the server.
+        @type port: int
+        @param host: The host of the server.
+        @type host: string
+        """
+        self._socket = Socket(host, port)
+        self._socket.setTcpNoDelay(1)
+        self._input = DataInputStream(BufferedInputStream(
+            self._socket.getInputStream()))
+        self._output = DataOutputStream(BufferedOutputStream(
+            self._socket.getOutputStream()))
+        self._next_request = 0
+        # agent name -> (version, 'Behaviour.Inspector' -> value)
+        self._agents = {}
+
+    def _request(self, kind, body):
+        """Sends a request and returns the body of its response.
+        """
+        request_id = self._next_request
+        self._next_request = request_id + 1
+        writeFrame(self._output, kind, request_id, body)
+        self._output.flush()
+        frame = readFrame(self._input)
+        if frame == None:
+            raise IOError, "Connection closed by the server"
+        kind, request_id, body = frame
+        if kind == KIND_ERROR:
+            raise ServerError, _unpackString(body, 0)[0]
+        return body
+
+    def list(self):
+        """Returns the names of the agents of the server.
+
+        @rtype: list of strings
+        """
+        return _unpackStrings(self._request(KIND_LIST, ''), 0)[0]
+
+    def snapshot(self, requests):
+        """Requests snapshots of the given agents.
+
+        @param requests: The version that the values of each agent are
+            compared to, as agent name -> version, where 0 requests all
+            values.
+        @type requests: dictionary, string -> int
+        @return: The version and the changed values of each agent, as
+            agent name -> (version, 'Behaviour.Inspector' -> value).
+        @rtype: dictionary
+        @raise ServerError: If an agent is unknown.
+        """
+        body = [struct.pack('>H', len(requests))]
+        for name, since in requests.items():
+            body.append(_packString(name) + struct.pack('>i', since))
+        body = self._request(KIND_SNAPSHOT, ''.join(body))
+        count = struct.unpack('>H', body[:2])[0]
+        offset = 2
+        snapshots = {}
+        for i in range(count):
+            name, offset = _unpackString(body, offset)
+            version, n = struct.unpack('>iH', body[offset:offset + 6])
+            offset = offset + 6
+            changes = {}
+            for j in range(n):
+                key, offset = _unpackString(body, offset)
+                changes[key], offset = _unpackString(body, offset)
+            snapshots[name] = (version, changes)
+        return snapshots
+
+    def poll(self, names = None):
+        """Updates the values of the given agents.
+
+        @param names: The names of the agents, or None for all agents.
+        @type names: sequence of strings or None
+        @return: The values that changed, as agent name ->
+            ('Behaviour.Inspector' -> value). Agents without changes are
+            not included.
+        @rtype: dictionary
+        """
+        if names == None:
+            names = self.list()
+        requests = {}
+        for name in names:
+            requests[name] = self._agents.get(name, (0, {}))[0]
+        changed = {}
+        for name, (version, changes) in self.snapshot(requests).items():
+            values = self._agents.get(name, (0, {}))[1]
+            values.update(changes)
+            self._agents[name] = (version, values)
+            if changes:
+                changed[name] = changes
+        return changed
+
+    def getValues(self, name):
+        """Returns the last received values of an agent.
+
+        @param name: The name of the agent.
+        @type name: string
+        @return: The values, as 'Behaviour.Inspector' -> value.
+        @rtype: dictionary
+        """
+        return self._agents.get(name, (0, {}))[1].copy()
+
+    def disconnect(self):
+        """Closes the connection.
+        """
+        self._socket.close()
@@ -29,7 +29,7 @@ Terminal Symbols
     (?i)pm                   PM
     (?i)none                 NONE
     (?i)documentation        DOCUMENTATION
-    (==|=|!=|<|>|<=|>=)      PREDICATE
+    (==|!=|<=|>=|=|<|>)      PREDICATE
     \-?(\d*\.\d+|\d+\.)([eE][\+\-]?\d+)?  NUMFLOAT
     \-?[0-9]+                NUMINT
     (?i)[a-z][a-z0-9_\-]*    NAME
@@ -122,10 +122,13 @@ class LAPLexer:
     This lexer is used by L{LAPParser} to tokenise the input string.
     """
 
+    # All patterns are given as regular expressions, which are compiled
+    # when the first lexer is created (see _compilePatterns).
+
     # preprocessing pattern. Everything that they match is
     # substituted by the second string in the pair.
     subs_pattern = (
-        (re.compile(r'(\#|\;)[^\n]*'), ''),
+        (r'(\#|\;)[^\n]*', ''),
     )
 
     # tokens that match fully, independent of what follows after
@@ -134,7 +137,7 @@ class LAPLexer:
     # as they would match even if they only match the beginning
     # of a word.
     full_tokens = (
-        (re.compile(r'"[^"]*"'), 'COMMENT'),
+        (r'"[^"]*"', 'COMMENT'),
     )
 
     # separating characters are characters that split the input
@@ -154,34 +157,39 @@ class LAPLexer:
     # given in their order of priority. Hence, if several of those
     # tokens match, the first in the list is returned.
     tokens = (
-        (re.compile(r"AP"), 'AP'),
-        (re.compile(r"C"), 'C'),
-        (re.compile(r"DC"), 'DC'),
-        (re.compile(r"RDC"), 'RDC'),
-        (re.compile(r"SDC"), 'SDC'),
-        (re.compile(r"SRDC"), 'SRDC'),
-        (re.compile(r"nil"), 'NIL'),
-        (re.compile(r"(?i)drives"), 'DRIVES'),
-        (re.compile(r"(?i)elements"), 'ELEMENTS'),
-        (re.compile(r"(?i)trigger"), 'TRIGGER'),
-        (re.compile(r"(?i)goal"), 'GOAL'),
-        (re.compile(r"(?i)hours"), 'HOURS'),
-        (re.compile(r"(?i)minutes"), 'MINUTES'),
-        (re.compile(r"(?i)seconds"), 'SECONDS'),
-        (re.compile(r"(?i)hz"), 'HZ'),
-        (re.compile(r"(?i)pm"), 'PM'),
-        (re.compile(r"(?i)none"), 'NONE'),
-        (re.compile(r"(?i)documentation"), 'DOCUMENTATION'),
-        (re.compile(r"(==|=|!=|<|>|<=|>=)"), 'PREDICATE'),
-        (re.compile(r"\-?(\d*\.\d+|\d+\.)([eE][\+\-]?\d+)?"), 'NUMFLOAT'),
-        (re.compile(r"\-?[0-9]+"), 'NUMINT'),
-        (re.compile(r"(?i)[a-z][a-z0-9_\-]*"), 'NAME'),
-        (re.compile(r"(?i)'?[a-z][a-z0-9_\-]*"), 'STRINGVALUE'),
+        (r"AP", 'AP'),
+        (r"C", 'C'),
+        (r"DC", 'DC'),
+        (r"RDC", 'RDC'),
+        (r"SDC", 'SDC'),
+        (r"SRDC", 'SRDC'),
+        (r"nil", 'NIL'),
+        (r"(?i)drives", 'DRIVES'),
+        (r"(?i)elements", 'ELEMENTS'),
+        (r"(?i)trigger", 'TRIGGER'),
+        (r"(?i)goal", 'GOAL'),
+        (r"(?i)hours", 'HOURS'),
+        (r"(?i)minutes", 'MINUTES'),
+        (r"(?i)seconds", 'SECONDS'),
+        (r"(?i)hz", 'HZ'),
+        (r"(?i)pm", 'PM'),
+        (r"(?i)none", 'NONE'),
+        (r"(?i)documentation", 'DOCUMENTATION'),
+        (r"(==|!=|<=|>=|=|<|>)", 'PREDICATE'),
+        (r"\-?(\d*\.\d+|\d+\.)([eE][\+\-]?\d+)?", 'NUMFLOAT'),
+        (r"\-?[0-9]+", 'NUMINT'),
+        (r"(?i)[a-z][a-z0-9_\-]*", 'NAME'),
+        (r"(?i)'?[a-z][a-z0-9_\-]*", 'STRINGVALUE'),
     )
 
     # to count the number of newlines
     newline = '\n'
-    newlines = re.compile(r"\n")
+    newlines = r"\n"
+
+    # the compiled patterns of the regular expressions above, shared by
+    # all lexers
+    _compiled = 0
+    _subs_pattern = _full_tokens = _tokens = _newlines = None
 
     def __init__(self, inputStr = None):
         """Initialises the lexer with the given input string.
@@ -189,11 +197,29 @@ class LAPLexer:
         @param inputStr: An input string.
         @type inputStr: string
         """
+        if not LAPLexer._compiled:
+            self._compilePatterns()
         self._input = ''
         self._lineno = 1
         if inputStr:
             self.setInput(inputStr)
 
+    def _compilePatterns(self):
+        """Compiles the regular expressions of the lexer class.
+
+        Compiling the patterns on demand rather than when the module is
+        imported keeps the import short.
+        """
+        cls = LAPLexer
+        cls._subs_pattern = [(re.compile(pattern), subs)
+                             for pattern, subs in cls.subs_pattern]
+        cls._full_tokens = [(re.compile(pattern), token)
+                            for pattern, token in cls.full_tokens]
+        cls._tokens = [(re.compile(pattern), token)
+                       for pattern, token in cls.tokens]
+        cls._newlines = re.compile(cls.newlines)
+        cls._compiled = 1
+
     def setInput(self, inputStr):
         """Resets the lexer by giving it a new input string.
 
@@ -201,7 +227,7 @@ class LAPLexer:
         @type inputStr: string
         """
         # preprocessing
-        for subs in self.subs_pattern:
+        for subs in self._subs_pattern:
             inputStr = subs[0].sub(subs[1], inputStr)
         self._input = inputStr
         self._lineno = 1
@@ -216,14 +242,14 @@ class LAPLexer:
         """
         while self._input:
             # first check for full tokens
-            for tk in self.full_tokens:
+            for tk in self._full_tokens:
                 match = tk[0].match(self._input)
                 if match:
                     matched_str = match.group()
                     self._input = self._input[len(matched_str):]
                     # cound the number of newlines in the matched
                     # string to keep track of the line number
-                    self._lineno += len(self.newlines.findall(matched_str))
+                    self._lineno += len(self._newlines.findall(matched_str))
                     return Token(tk[1], matched_str)
                 
             # none of the full tokens matched
@@ -252,14 +278,14 @@ class LAPLexer:
             else:
                 sep_str = self._input[:sep_pos]
             # find the first fully matching token
-            for tk in self.tokens:
+            for tk in self._tokens:
                 match = tk[0].match(sep_str)
                 if match and len(match.group()) == len(sep_str):
                     matched_str = match.group()
                     self._input = self._input[len(matched_str):]
                     # cound the number of newlines in the matched
                     # string to keep track of the line number
-                    self._lineno += len(self.newlines.findall(matched_str))
+                    self._lineno += len(self._newlines.findall(matched_str))
                     return Token(tk[1], matched_str)
 
             # no token matched: give error over single character
@@ -0,0 +1,50 @@
+"""Deferred import of the optional modules of the package.
+
+Importing the package imports the modules that every agent needs. The
+classes of optional features, like trace recording or the batch engine,
+are given by L{LazyClass} stand-ins instead, which import their module
+when they are first used. This keeps the startup of agents that do not
+use these features short.
+"""
+
+
+class LazyClass:
+    """Stands in for a class of a module of the package that is
+    imported when the class is first used.
+
+    Calling the stand-in creates an instance of the class, and all other
+    attributes are taken from the class. As the stand-in is not the class
+    itself, it cannot be used with isinstance() or as a base class, for
+    which the class needs to be imported from its module.
+    """
+    def __init__(self, module, name):
+        """Initialises the stand-in.
+
+        @param module: The name of the module in the package.
+        @type module: string
+        @param name: The name of the class in the module.
+        @type name: string
+        """
+        self.__dict__['_module'] = module
+        self.__dict__['_name'] = name
+        self.__dict__['_class'] = None
+
+    def getClass(self):
+        """Imports the module and returns the class.
+
+        @rtype: class
+        """
+        if self._class == None:
+            module = __import__(self._module, globals(), locals(),
+                                [self._name])
+            self.__dict__['_class'] = getattr(module, self._name)
+        return self._class
+
+    def __call__(self, *args, **kwargs):
+        return apply(self.getClass(), args, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.getClass(), name)
+
+    def __repr__(self):
+        return "<lazy class %s.%s>" % (self._module, self._name)
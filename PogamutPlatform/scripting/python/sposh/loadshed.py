@@ -0,0 +1,211 @@
+"""Shedding of low-priority drives while the agent is overloaded.
+
+If ticks take longer than the loop period of the real-time timer, every
+tick still goes through the priority elements of the drive collection,
+and the agent falls further behind. If load shedding is enabled (see
+L{SPOSH.Agent.enableLoadShedding}), an L{OverloadController} watches the
+lateness of the ticks, as measured by the timer (see
+L{SPOSH.TimerBase.getLateness}). After a number of late ticks in a row,
+it sheds the lowest-priority element of the drive collection that is not
+yet shed, such that its drive elements are selected only once in a given
+interval, or not at all (see L{SPOSH.DrivePriorityElement.setShedInterval}).
+After a number of ticks in a row that are on time, it stops shedding the
+last shed element again. The top-priority elements are never shed.
+
+Stepped timers do not measure lateness. Agents that are stepped from
+the outside can give the lateness to L{OverloadController.observe}
+instead, by a controller that is created with C{external} set, such that
+it does not read the lateness from the timer at the start of each tick.
+A L{SPOSH.BatchEngine} follows the shedding of the priority elements of
+its plan, for all agents of its population.
+"""
+
+
+def _priorityName(priority_element):
+    """Returns the names of the drive elements of the priority element.
+    """
+    return ",".join([element.getName() for element in \
+                     priority_element.getElements()])
+
+
+class OverloadController:
+    """Sheds the lower-priority elements of the drive collection under
+    overload.
+
+    The controller is a tick listener of the agent. Its counters are
+    public attributes, and summarised by L{getStats}.
+    """
+    def __init__(self, agent, threshold = 5, patience = 10, recovery = 50,
+                 interval = 500, protect = 1, external = 0):
+        """Initialises the controller for the plan of the given agent.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        @param threshold: The lateness in milliseconds above which a tick
+            is late.
+        @type threshold: long
+        @param patience: The number of late ticks in a row after which
+            another priority element is shed.
+        @type patience: int
+        @param recovery: The number of ticks in a row that are not late
+            after which the last shed priority element is restored.
+        @type recovery: int
+        @param interval: The minimum time in milliseconds between two
+            selections of a shed priority element, or a negative number to
+            skip shed priority elements entirely.
+        @type interval: long
+        @param protect: The number of top-priority elements that are
+            never shed.
+        @type protect: int
+        @param external: If the lateness is only given by L{observe},
+            rather than read from the timer at the start of each tick.
+        @type external: boolean
+        """
+        self._agent = agent
+        self._threshold = threshold
+        self._patience = patience
+        self._recovery = recovery
+        self._interval = interval
+        self._protect = protect
+        self._external = external
+        # the priority elements that can be shed, lowest priority first,
+        # and their names
+        self._sheddable, self._names = [], []
+        # the number of shed priority elements
+        self._level = 0
+        # the number of late, or on-time, ticks in a row
+        self._late, self._on_time = 0, 0
+        # the lateness of the last tick, and the largest one
+        self.lateness, self.max_lateness = 0, 0
+        # late ticks, ticks with shed elements, and level changes
+        self.late_ticks, self.shed_ticks = 0, 0
+        self.escalations, self.recoveries = 0, 0
+        # priority element name -> number of ticks that it was shed
+        self._shed_counts = {}
+        self.prepare(agent.getDriveCollection())
+
+    def prepare(self, drive_collection):
+        """Selects the priority elements to shed from the given plan.
+
+        Elements of the previous plan are restored, and the current level
+        of shedding is applied to the new plan.
+
+        @param drive_collection: The root of the plan.
+        @type drive_collection: L{SPOSH.DriveCollection}
+        """
+        level = self._level
+        self._setLevel(0)
+        sheddable = list(drive_collection.getElements()[self._protect:])
+        sheddable.reverse()
+        self._sheddable = sheddable
+        self._names = [_priorityName(element) for element in sheddable]
+        self._setLevel(min(level, len(sheddable)))
+
+    def restore(self):
+        """Stops shedding all priority elements.
+        """
+        self._setLevel(0)
+
+    def getLevel(self):
+        """Returns the number of shed priority elements.
+
+        @rtype: int
+        """
+        return self._level
+
+    def getShed(self):
+        """Returns the names of the shed priority elements.
+
+        As all priority elements carry the name of the drive collection,
+        each is named by the names of its drive elements, separated by
+        commas.
+
+        @return: The names, lowest priority first.
+        @rtype: list of strings
+        """
+        return self._names[:self._level]
+
+    def getShedCounts(self):
+        """Returns the number of ticks that each priority element was shed.
+
+        @return: A dictionary of priority element name (as returned by
+            L{getShed}) -> ticks. Elements that were never shed are not
+            included.
+        @rtype: dictionary
+        """
+        return self._shed_counts.copy()
+
+    def observe(self, lateness):
+        """Takes the lateness of the current tick into account, and sheds
+        or restores a priority element if required.
+
+        Unless the controller is external, this is called at the start of
+        each tick with the lateness measured by the timer. An external
+        controller is to be called once per tick, before the tick.
+
+        @param lateness: The lateness of the tick in milliseconds.
+        @type lateness: long
+        """
+        self.lateness = lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        if lateness > self._threshold:
+            self.late_ticks += 1
+            self._late, self._on_time = self._late + 1, 0
+            if self._late >= self._patience and \
+               self._level < len(self._sheddable):
+                self._late = 0
+                self.escalations += 1
+                self._setLevel(self._level + 1)
+        else:
+            self._late, self._on_time = 0, self._on_time + 1
+            if self._on_time >= self._recovery and self._level > 0:
+                self._on_time = 0
+                self.recoveries += 1
+                self._setLevel(self._level - 1)
+
+    def _setLevel(self, level):
+        """Sheds the given number of the lowest-priority elements, and
+        restores all others.
+        """
+        if level == self._level:
+            return
+        for element in self._sheddable[level:self._level]:
+            element.setShedInterval(None)
+        for element in self._sheddable[self._level:level]:
+            element.setShedInterval(self._interval)
+        self._level = level
+        # cached decisions might select shed elements, or might depend
+        # on the time while elements are shed
+        cache = self._agent.getDecisionCache()
+        if cache:
+            self._agent.getDriveCollection().setDecisionCache(cache)
+            cache.clear()
+
+    def tickStart(self, agent):
+        """Observes the lateness of the tick, as measured by the timer,
+        unless the controller is external, and counts the tick if
+        priority elements are shed.
+        """
+        if not self._external:
+            self.observe(agent.getTimer().getLateness())
+        if self._level:
+            self.shed_ticks += 1
+            counts = self._shed_counts
+            for name in self._names[:self._level]:
+                counts[name] = counts.get(name, 0) + 1
+
+    def tickEnd(self, agent, result):
+        """Does nothing.
+        """
+        pass
+
+    def getStats(self):
+        """Returns a summary of the shedding.
+
+        @rtype: string
+        """
+        return "level: %d; late ticks: %d; shed ticks: %d; " \
+               "escalations: %d; recoveries: %d; max lateness: %d ms" % \
+               (self._level, self.late_ticks, self.shed_ticks,
+                self.escalations, self.recoveries, self.max_lateness)
@@ -0,0 +1,249 @@
+"""Reports on the number and memory footprint of plan elements.
+
+The functions in this module walk the object graph of a built plan,
+starting at its drive collection, and count the distinct plan elements
+(including triggers, senses and actions) by their class.
+
+As Jython does not provide the size of objects, the footprint of the
+elements is estimated from the number of their instance attributes and
+the strings that they hold alone, based on the constants below. The
+total footprint of an agent is measured by the JVM heap usage of building
+several agents.
+"""
+
+# Python modules
+import types
+
+# Java modules
+from java.lang import Runtime, System
+
+# POSH modules
+from agent import Agent
+from element import ElementBase
+from lapparser import LAPParser
+
+# estimated bytes of an instance without attributes, of each instance
+# attribute, and of a string without its characters
+INSTANCE_BYTES = 56
+ATTRIBUTE_BYTES = 24
+STRING_BYTES = 40
+
+
+def _children(element):
+    """Returns the plan elements that the given element refers to.
+
+    @param element: The element.
+    @type element: L{SPOSH.ElementBase}
+    @return: The elements that are referred to by the element's
+        attributes, directly or in a list or tuple.
+    @rtype: list of L{SPOSH.ElementBase}
+    """
+    children = []
+    for value in element.__dict__.values():
+        if isinstance(value, ElementBase):
+            children.append(value)
+        elif type(value) == types.ListType or type(value) == types.TupleType:
+            for item in value:
+                if isinstance(item, ElementBase):
+                    children.append(item)
+    return children
+
+
+def planElements(drive_collection):
+    """Returns all distinct elements of a built plan.
+
+    @param drive_collection: The root of the plan.
+    @type drive_collection: L{SPOSH.DriveCollection}
+    @return: The elements of the plan.
+    @rtype: list of L{SPOSH.ElementBase}
+    """
+    seen = {}
+    elements = []
+    stack = [drive_collection]
+    while stack:
+        element = stack.pop()
+        if seen.has_key(id(element)):
+            continue
+        seen[id(element)] = 1
+        elements.append(element)
+        stack.extend(_children(element))
+    return elements
+
+
+def countElements(drive_collection):
+    """Counts the distinct elements of a built plan by their class.
+
+    @param drive_collection: The root of the plan.
+    @type drive_collection: L{SPOSH.DriveCollection}
+    @return: The number of elements for each class name.
+    @rtype: dictionary, string -> int
+    """
+    counts = {}
+    for element in planElements(drive_collection):
+        name = element.__class__.__name__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def formatCounts(columns, counts):
+    """Formats element counts as a table.
+
+    @param columns: The column titles.
+    @type columns: sequence of strings
+    @param counts: The element counts of each column, as returned by
+        L{countElements}.
+    @type counts: sequence of dictionaries
+    @return: The table, with a row for each class and a total row.
+    @rtype: string
+    """
+    names = {}
+    for count in counts:
+        for name in count.keys():
+            names[name] = 1
+    names = names.keys()
+    names.sort()
+    header = "%-28s" % "element"
+    for column in columns:
+        header += "%12s" % column
+    lines = [header]
+    totals = [0] * len(counts)
+    for name in names:
+        line = "%-28s" % name
+        for i in range(len(counts)):
+            n = counts[i].get(name, 0)
+            totals[i] += n
+            line += "%12d" % n
+        lines.append(line)
+    line = "%-28s" % "total"
+    for total in totals:
+        line += "%12d" % total
+    lines.append(line)
+    return "\n".join(lines)
+
+
+def internReport(behaviours, plan, log):
+    """Returns a report of the plan elements with and without interning.
+
+    The plan is built twice for a new agent with the given behaviours:
+    once with interned actions and senses, as done by the agent, and
+    once with a separate action / sense object for every occurrence.
+
+    @param behaviours: list or sequence of Behaviours instances
+    @type behaviours: list or sequence of Behavours instances
+    @param plan: Name of the plan (complete path + file + extension).
+    @type plan: string
+    @param log: java.util.logging.Logger instance
+    @type log: java.util.logging.Logger
+    @return: The report.
+    @rtype: string
+    """
+    agent = Agent(behaviours, plan, log)
+    interned = countElements(agent.getDriveCollection())
+    plan_builder = LAPParser().parse(open(plan).read())
+    plan_builder.setInterning(0)
+    separate = countElements(plan_builder.build(agent))
+    return formatCounts(("separate", "interned"), (separate, interned))
+
+
+def _stringBytes(string, seen):
+    """Returns the estimated bytes of a string that is not shared.
+
+    A string is shared if it is interned, or if it has already been
+    counted for another element.
+    """
+    if seen.has_key(id(string)) or intern(string) is string:
+        return 0
+    seen[id(string)] = 1
+    return STRING_BYTES + 2 * len(string)
+
+
+def elementFootprint(drive_collection):
+    """Estimates the memory footprint of the elements of a built plan.
+
+    @param drive_collection: The root of the plan.
+    @type drive_collection: L{SPOSH.DriveCollection}
+    @return: The number of elements and their estimated bytes for each
+        class name.
+    @rtype: dictionary, string -> (int, int)
+    """
+    footprint = {}
+    strings = {}
+    for element in planElements(drive_collection):
+        attributes = element.__dict__
+        size = INSTANCE_BYTES + ATTRIBUTE_BYTES * len(attributes)
+        for value in attributes.values():
+            if type(value) == types.StringType:
+                size += _stringBytes(value, strings)
+            elif type(value) == types.ListType or \
+                 type(value) == types.TupleType:
+                size += INSTANCE_BYTES + 4 * len(value)
+        name = element.__class__.__name__
+        count, total = footprint.get(name, (0, 0))
+        footprint[name] = (count + 1, total + size)
+    return footprint
+
+
+def _usedHeap():
+    """Returns the used JVM heap after garbage collection.
+
+    @return: The used heap in bytes.
+    @rtype: long
+    """
+    runtime = Runtime.getRuntime()
+    for i in range(3):
+        System.gc()
+    return runtime.totalMemory() - runtime.freeMemory()
+
+
+def measureAgentBytes(create_agent, n = 100):
+    """Measures the heap bytes per agent by creating several agents.
+
+    @param create_agent: A function that creates a single agent, taking no
+        arguments.
+    @type create_agent: callable
+    @param n: The number of agents to create.
+    @type n: int
+    @return: The average number of heap bytes per agent.
+    @rtype: long
+    """
+    before = _usedHeap()
+    agents = []
+    for i in range(n):
+        agents.append(create_agent())
+    after = _usedHeap()
+    return (after - before) / n
+
+
+def footprintReport(agent, create_agent = None, n = 100):
+    """Returns a report of the memory footprint of an agent's plan.
+
+    The report gives the number of elements and their estimated bytes per
+    element class. If C{create_agent} is given, the measured heap bytes per
+    agent (including its behaviours) are reported as well.
+
+    @param agent: The agent of which the plan is reported.
+    @type agent: L{SPOSH.Agent}
+    @param create_agent: A function that creates a single agent, taking
+        no arguments, or None.
+    @type create_agent: callable or None
+    @param n: The number of agents to create for measuring.
+    @type n: int
+    @return: The report.
+    @rtype: string
+    """
+    footprint = elementFootprint(agent.getDriveCollection())
+    names = footprint.keys()
+    names.sort()
+    lines = ["%-28s%12s%12s%12s" % ("element", "count", "bytes", "per elem")]
+    total_count, total_bytes = 0, 0
+    for name in names:
+        count, size = footprint[name]
+        total_count += count
+        total_bytes += size
+        lines.append("%-28s%12d%12d%12d" % (name, count, size, size / count))
+    lines.append("%-28s%12d%12d" % ("total (estimated)", total_count,
+                                    total_bytes))
+    if create_agent:
+        lines.append("%-28s%24d" % ("measured per agent",
+                                    measureAgentBytes(create_agent, n)))
+    return "\n".join(lines)
@@ -0,0 +1,420 @@
+"""Counters of the engine, served in the Prometheus text format.
+
+If metrics are enabled (see L{SPOSH.Agent.enableMetrics}), an
+L{AgentMetrics} counts the ticks of the agent and their results (see
+L{SPOSH.Agent.followDrive}), the firings of each drive element and the
+calls of each sense of the plan, and keeps the duration of the last ticks.
+The counters are plain attributes that are only written by the thread that
+runs the agent, and are read by other threads without locking. Such a read
+might miss the updates of the current tick, but never blocks the agent.
+
+Nothing is computed on the tick path beyond the increments. The quantiles
+of the tick durations and the rates are computed when the metrics are
+scraped, by L{MetricsServer}, which serves the metrics of several agents
+over HTTP on a port of the local host (see L{SPOSH.Agent.serveMetrics})::
+
+    sposh_ticks_total{agent="bot"} 1520
+    sposh_ticks_per_second{agent="bot"} 9.98
+    sposh_tick_duration_seconds{agent="bot",quantile="0.99"} 0.000312
+    sposh_drive_results_total{agent="bot",result="followed"} 1498
+    sposh_drive_firings_total{agent="bot",drive="fighting"} 311
+    sposh_sense_calls_total{agent="bot",sense="can_see"} 1520
+    sposh_sense_calls_per_second{agent="bot",sense="can_see"} 9.98
+
+If load shedding is enabled (see L{SPOSH.Agent.enableLoadShedding}), the
+number of shed priority elements and the counters of the controller are
+served as well::
+
+    sposh_shed_level{agent="bot"} 1
+    sposh_shed_ticks_total{agent="bot"} 120
+    sposh_shed_priority_ticks_total{agent="bot",priority="strolling"} 120
+
+The rates are given for the time since the previous scrape, or since the
+metrics were enabled for the first scrape. Senses are counted by wrapping
+the sense methods of the plan's senses (see L{SPOSH.Sense.setMethod}). Sense
+calls that the threshold indices make on behalf of the plan are counted,
+while the calls of the thread pool of parallel senses are not.
+"""
+
+# Python modules
+import thread
+
+# Java modules
+from java.io import BufferedReader, DataOutputStream, InputStreamReader, \
+     IOException
+from java.lang import System
+from java.net import InetAddress, ServerSocket
+
+# POSH modules
+from agent import DRIVE_FOLLOWED, DRIVE_WON, DRIVE_LOST
+
+# the quantiles of the tick durations
+QUANTILES = (0.5, 0.9, 0.99)
+
+# drive result -> label
+_RESULTS = ((DRIVE_FOLLOWED, "followed"), (DRIVE_WON, "won"),
+            (DRIVE_LOST, "lost"))
+
+
+class _CountedSense:
+    """A callable that counts the calls of a sense method.
+    """
+    def __init__(self, method, counter):
+        self._method = method
+        # a list with the single count, shared by all senses of the name
+        self._counter = counter
+
+    def __call__(self):
+        counter = self._counter
+        counter[0] = counter[0] + 1
+        return self._method()
+
+
+class AgentMetrics:
+    """The counters of an agent.
+
+    The metrics are a tick listener of the agent.
+    """
+    def __init__(self, agent, samples = 1024):
+        """Initialises the counters for the plan of the given agent.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        @param samples: The number of the last ticks whose durations are
+            kept for the quantiles.
+        @type samples: int
+        """
+        self._agent = agent
+        self._durations = [None] * samples
+        self._start = 0L
+        self.created = System.nanoTime()
+        # ticks, and the total duration in nanoseconds
+        self.ticks, self.nanos = 0, 0L
+        # drive result -> count
+        self.results = {DRIVE_FOLLOWED: 0, DRIVE_WON: 0, DRIVE_LOST: 0}
+        # drive element name -> firings
+        self.firings = {}
+        # sense name -> [calls]
+        self._sense_counters = {}
+        # the senses whose methods are wrapped, and their methods
+        self._wrapped = []
+        self.prepare(agent.getDriveCollection())
+
+    def prepare(self, drive_collection):
+        """Wraps the senses of the current plan of the agent.
+
+        The senses of the previous plan are restored. The counts of senses
+        of the same name continue.
+
+        @param drive_collection: The root of the plan (not used, as the
+            senses are taken from the agent).
+        @type drive_collection: L{SPOSH.DriveCollection}
+        """
+        self.restore()
+        self.addSenses(self._agent.getPlanSenses())
+
+    def addSenses(self, senses):
+        """Wraps the given senses, like the senses of a lazily built plan
+        that were built after the plan was prepared.
+
+        @param senses: Senses of the plan that are not yet wrapped.
+        @type senses: sequence of L{SPOSH.Sense}
+        """
+        counters = self._sense_counters
+        for sense in senses:
+            name = sense.getSenseName()
+            counter = counters.get(name)
+            if counter == None:
+                counter = counters[name] = [0]
+            method = sense.getMethod()
+            self._wrapped.append((sense, method))
+            sense.setMethod(_CountedSense(method, counter))
+
+    def restore(self):
+        """Restores the sense methods that were wrapped.
+        """
+        for sense, method in self._wrapped:
+            sense.setMethod(method)
+        self._wrapped = []
+
+    def getSenseCalls(self):
+        """Returns the number of calls of each sense.
+
+        @return: A dictionary of sense name -> calls.
+        @rtype: dictionary
+        """
+        calls = {}
+        for name, counter in self._sense_counters.items():
+            calls[name] = counter[0]
+        return calls
+
+    def getDurations(self):
+        """Returns the durations of the last ticks.
+
+        @return: The durations in nanoseconds, in no particular order.
+        @rtype: list of long
+        """
+        durations = []
+        for duration in self._durations:
+            if duration != None:
+                durations.append(duration)
+        return durations
+
+    def tickStart(self, agent):
+        """Takes the start time of the tick.
+        """
+        self._start = System.nanoTime()
+
+    def tickEnd(self, agent, result):
+        """Counts the tick, its result and the fired drive element.
+        """
+        duration = System.nanoTime() - self._start
+        ticks = self.ticks
+        self._durations[ticks % len(self._durations)] = duration
+        self.nanos = self.nanos + duration
+        self.results[result] = self.results[result] + 1
+        fired = agent.getDriveCollection().getFired()
+        if fired:
+            firings = self.firings
+            name = fired.getName()
+            firings[name] = firings.get(name, 0) + 1
+        self.ticks = ticks + 1
+
+
+def _quantile(values, quantile):
+    """Returns the given quantile of the sorted values.
+    """
+    index = int(quantile * len(values))
+    if index >= len(values):
+        index = len(values) - 1
+    return values[index]
+
+
+def _add(samples, metric, labels, value):
+    """Adds a sample to the samples of a metric.
+    """
+    if type(value) == type(0.0):
+        value = "%.9g" % value
+    else:
+        value = "%d" % value
+    samples.setdefault(metric, []).append("%s{%s} %s" % (metric, labels,
+                                                          value))
+
+
+def _label(value):
+    """Escapes a label value of the text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"'). \
+           replace('\n', '\\n')
+
+
+class MetricsServer:
+    """Serves the metrics of agents over HTTP in the Prometheus text
+    format.
+
+    Any request for the path C{/metrics} is answered with the metrics,
+    all other paths with 404.
+    """
+    def __init__(self, agents, port = 0):
+        """Initialises the server and opens its port.
+
+        The metrics of the agents are enabled if they are not, which has
+        to be done before the agents run.
+
+        @param agents: The agents to serve, as name -> agent.
+        @type agents: dictionary, string -> L{SPOSH.Agent}
+        @param port: The port to listen on, or 0 for any free port.
+        @type port: int
+        """
+        self._metrics = {}
+        for name, agent in agents.items():
+            if not agent.getMetrics():
+                agent.enableMetrics()
+            self._metrics[name] = agent.getMetrics()
+        # agent name -> (time, ticks, sense calls) of the last scrape
+        self._scraped = {}
+        self._lock = thread.allocate_lock()
+        self._socket = ServerSocket(port, 50,
+                                    InetAddress.getByName("127.0.0.1"))
+        self._running = 0
+
+    def getPort(self):
+        """Returns the port that the server listens on.
+
+        @rtype: int
+        """
+        return self._socket.getLocalPort()
+
+    def start(self):
+        """Starts accepting connections in a separate thread.
+        """
+        self._running = 1
+        thread.start_new_thread(self._accept, ())
+
+    def stop(self):
+        """Stops accepting connections.
+        """
+        self._running = 0
+        self._socket.close()
+
+    def _accept(self):
+        """Accepts connections and serves each in its own thread.
+        """
+        while self._running:
+            try:
+                connection = self._socket.accept()
+            except IOException:
+                break
+            thread.start_new_thread(self._serve, (connection,))
+
+    def _serve(self, connection):
+        """Answers a single HTTP request and closes the connection.
+
+        @param connection: The connection.
+        @type connection: java.net.Socket
+        """
+        try:
+            try:
+                input = BufferedReader(InputStreamReader(
+                    connection.getInputStream(), "ISO-8859-1"))
+                request = input.readLine()
+                # skip the headers
+                line = request
+                while line:
+                    line = input.readLine()
+                parts = (request or "").split()
+                if len(parts) >= 2 and parts[1].split('?')[0] == "/metrics":
+                    status, body = "200 OK", self.render()
+                else:
+                    status, body = "404 Not Found", "Not found\n"
+                response = "HTTP/1.0 %s\r\n" \
+                           "Content-Type: text/plain; version=0.0.4\r\n" \
+                           "Content-Length: %d\r\n\r\n%s" % \
+                           (status, len(body), body)
+                output = DataOutputStream(connection.getOutputStream())
+                output.writeBytes(response)
+                output.flush()
+            except IOException:
+                pass
+        finally:
+            connection.close()
+
+    def render(self):
+        """Returns the metrics of all agents in the text format.
+
+        @rtype: string
+        """
+        self._lock.acquire()
+        try:
+            names = self._metrics.keys()
+            names.sort()
+            samples = {}
+            for name in names:
+                self._sample(name, samples)
+        finally:
+            self._lock.release()
+        lines = []
+        for metric, kind, help in _METRICS:
+            values = samples.get(metric)
+            if not values:
+                continue
+            if kind:
+                lines.append("# HELP %s %s" % (metric, help))
+                lines.append("# TYPE %s %s" % (metric, kind))
+            lines.extend(values)
+        return '\n'.join(lines) + '\n'
+
+    def _sample(self, name, samples):
+        """Adds the samples of an agent to the samples of each metric.
+        """
+        metrics = self._metrics[name]
+        now = System.nanoTime()
+        ticks = metrics.ticks
+        calls = metrics.getSenseCalls()
+        then, last_ticks, last_calls = self._scraped.get(
+            name, (metrics.created, 0, {}))
+        self._scraped[name] = (now, ticks, calls)
+        seconds = (now - then) / 1e9
+        agent = 'agent="%s"' % _label(name)
+        _add(samples, "sposh_ticks_total", agent, ticks)
+        if seconds > 0:
+            _add(samples, "sposh_ticks_per_second", agent,
+                (ticks - last_ticks) / seconds)
+        durations = metrics.getDurations()
+        durations.sort()
+        if durations:
+            for quantile in QUANTILES:
+                _add(samples, "sposh_tick_duration_seconds",
+                    '%s,quantile="%s"' % (agent, quantile),
+                    _quantile(durations, quantile) / 1e9)
+        _add(samples, "sposh_tick_duration_seconds_sum", agent,
+             metrics.nanos / 1e9)
+        _add(samples, "sposh_tick_duration_seconds_count", agent, ticks)
+        timer = metrics._agent.getTimer()
+        if timer:
+            _add(samples, "sposh_tick_lateness_milliseconds", agent,
+                timer.getLateness())
+        shedding = metrics._agent.getOverloadController()
+        if shedding:
+            _add(samples, "sposh_shed_level", agent, shedding.getLevel())
+            _add(samples, "sposh_late_ticks_total", agent,
+                 shedding.late_ticks)
+            _add(samples, "sposh_shed_ticks_total", agent,
+                 shedding.shed_ticks)
+            _add(samples, "sposh_shed_escalations_total", agent,
+                 shedding.escalations)
+            _add(samples, "sposh_shed_recoveries_total", agent,
+                 shedding.recoveries)
+            counts = shedding.getShedCounts().items()
+            counts.sort()
+            for priority, count in counts:
+                _add(samples, "sposh_shed_priority_ticks_total",
+                    '%s,priority="%s"' % (agent, _label(priority)), count)
+        for result, label in _RESULTS:
+            _add(samples, "sposh_drive_results_total",
+                '%s,result="%s"' % (agent, label), metrics.results[result])
+        firings = metrics.firings.items()
+        firings.sort()
+        for drive, count in firings:
+            _add(samples, "sposh_drive_firings_total",
+                '%s,drive="%s"' % (agent, _label(drive)), count)
+        senses = calls.keys()
+        senses.sort()
+        for sense in senses:
+            labels = '%s,sense="%s"' % (agent, _label(sense))
+            _add(samples, "sposh_sense_calls_total", labels, calls[sense])
+            if seconds > 0:
+                _add(samples, "sposh_sense_calls_per_second", labels,
+                    (calls[sense] - last_calls.get(sense, 0)) / seconds)
+
+
+# (metric, type, help) in the order of rendering. The sum and count of
+# the summary are rendered under its type.
+_METRICS = (
+    ("sposh_ticks_total", "counter", "Ticks of the agent."),
+    ("sposh_ticks_per_second", "gauge",
+     "Ticks per second since the previous scrape."),
+    ("sposh_tick_duration_seconds", "summary",
+     "Duration of the last ticks."),
+    ("sposh_tick_duration_seconds_sum", None, None),
+    ("sposh_tick_duration_seconds_count", None, None),
+    ("sposh_tick_lateness_milliseconds", "gauge",
+     "Lateness of the last tick, as measured by the timer."),
+    ("sposh_shed_level", "gauge", "Number of shed priority elements."),
+    ("sposh_late_ticks_total", "counter",
+     "Ticks that the load shedding found late."),
+    ("sposh_shed_ticks_total", "counter",
+     "Ticks with shed priority elements."),
+    ("sposh_shed_escalations_total", "counter",
+     "Priority elements that were shed."),
+    ("sposh_shed_recoveries_total", "counter",
+     "Shed priority elements that were restored."),
+    ("sposh_shed_priority_ticks_total", "counter",
+     "Ticks that each priority element was shed, by its drive elements."),
+    ("sposh_drive_results_total", "counter",
+     "Results of the ticks of the drive collection."),
+    ("sposh_drive_firings_total", "counter", "Firings of drive elements."),
+    ("sposh_sense_calls_total", "counter", "Calls of senses."),
+    ("sposh_sense_calls_per_second", "gauge",
+     "Calls of senses per second since the previous scrape."),
+)
@@ -0,0 +1,261 @@
+"""Concurrent evaluation of expensive senses on a thread pool.
+
+Some senses, like visibility raycasts or path queries, are expensive and
+independent of each other. Behaviours declare such senses by setting
+C{self._parallel_senses}, a dictionary of sense name -> (maximum
+concurrent calls, timeout in milliseconds), or (maximum concurrent calls,
+timeout, limit group). These senses are pure senses.
+
+If parallel senses are enabled (see L{SPOSH.Agent.enableParallelSenses}),
+then at the start of each tick, the parallel senses used by the triggers
+of the highest-priority drive elements are submitted to a thread pool. The
+triggers are then fired as usual, but their senses return the result of
+the pool, waiting for it if required. If the result is not available
+within the sense's timeout, or if the sense already has its maximum
+number of calls running in the pool, the sense is called as usual.
+
+A pool can be shared by several agents, in which case the concurrency
+limits apply to the calls of all of these agents. The calls are limited
+per limit group, which is the sense name unless a group is given, such
+that several senses that use the same resource can share their limit.
+"""
+
+# Java modules
+from java.lang import Thread
+from java.util.concurrent import Callable, Executors, ExecutionException, \
+     Semaphore, ThreadFactory, TimeoutException, TimeUnit
+
+
+class _DaemonThreadFactory(ThreadFactory):
+    """Creates the daemon threads of a sense pool, such that the pool
+    does not keep the JVM running.
+    """
+    def newThread(self, runnable):
+        thread = Thread(runnable)
+        thread.setDaemon(1)
+        return thread
+
+
+class _SenseCall(Callable):
+    """A call of a sense method in the pool.
+    """
+    def __init__(self, method, semaphore):
+        self._method, self._semaphore = method, semaphore
+
+    def call(self):
+        try:
+            return self._method()
+        finally:
+            self._semaphore.release()
+
+
+class SensePool:
+    """A bounded pool of threads evaluating senses, with a concurrency
+    limit per sense.
+    """
+    def __init__(self, threads = 4):
+        """Starts the threads of the pool.
+
+        @param threads: The number of threads.
+        @type threads: int
+        """
+        self._executor = Executors.newFixedThreadPool(threads,
+                                                      _DaemonThreadFactory())
+        # limit group -> semaphore
+        self._semaphores = {}
+
+    def getSemaphore(self, group, max_concurrent):
+        """Returns the semaphore that limits the concurrent calls of the
+        senses of a limit group.
+
+        The semaphore is created with the given maximum at the first call
+        for the group, and shared by all agents that use the pool.
+
+        @param group: The limit group, by default the name of the sense.
+        @type group: string
+        @param max_concurrent: The maximum number of concurrent calls.
+        @type max_concurrent: int
+        @rtype: java.util.concurrent.Semaphore
+        """
+        semaphore = self._semaphores.get(group)
+        if semaphore == None:
+            semaphore = self._semaphores[group] = Semaphore(max_concurrent)
+        return semaphore
+
+    def submit(self, method, semaphore):
+        """Submits a call of a sense method, if the concurrency limit of
+        the sense allows it.
+
+        @param method: The sense method.
+        @type method: callable
+        @param semaphore: The semaphore of the sense.
+        @type semaphore: java.util.concurrent.Semaphore
+        @return: The future result of the call, or None if the limit
+            was reached.
+        @rtype: java.util.concurrent.Future or None
+        """
+        if not semaphore.tryAcquire():
+            return None
+        return self._executor.submit(_SenseCall(method, semaphore))
+
+    def shutdown(self):
+        """Stops the threads of the pool once their calls are done.
+        """
+        self._executor.shutdown()
+
+
+class _PooledSense:
+    """Replaces a sense method and returns the result of the pool.
+    """
+    def __init__(self, parallel, method, semaphore, timeout):
+        self._parallel = parallel
+        self._method, self._semaphore = method, semaphore
+        self._timeout = timeout
+        # the future result of the current tick, or None
+        self._future = None
+
+    def submit(self, pool):
+        """Submits the sense to the pool for the current tick.
+        """
+        self._future = pool.submit(self._method, self._semaphore)
+        if self._future == None:
+            self._parallel.limited += 1
+
+    def clear(self):
+        """Forgets the result of the current tick.
+        """
+        self._future = None
+
+    def __call__(self):
+        future = self._future
+        if future == None:
+            return self._method()
+        try:
+            result = future.get(self._timeout, TimeUnit.MILLISECONDS)
+            self._parallel.used += 1
+            return result
+        except TimeoutException:
+            self._future = None
+            self._parallel.timeouts += 1
+        except ExecutionException:
+            # call the sense again, such that its error is raised here
+            self._future = None
+        return self._method()
+
+
+class ParallelSenses:
+    """Submits the parallel senses of the top drive elements to a pool
+    at the start of each tick.
+
+    The object is a tick listener of the agent.
+    """
+    def __init__(self, agent, pool, max_elements = None):
+        """Initialises the parallel senses for the plan of the agent.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        @param pool: The pool to evaluate the senses in.
+        @type pool: L{SensePool}
+        @param max_elements: The number of drive elements, in their order
+            of priority, whose triggers' senses are submitted, or None
+            for all.
+        @type max_elements: int or None
+        """
+        self._bdict = agent.getBehaviourDict()
+        self._pool = pool
+        self._max_elements = max_elements
+        # sense name -> pooled sense
+        self._pooled = {}
+        # (sense, original method) of the senses using pooled senses
+        self._replaced = []
+        # results used, calls not submitted due to the concurrency
+        # limit, and results that timed out
+        self.used, self.limited, self.timeouts = 0, 0, 0
+        self.prepare(agent.getDriveCollection(), agent.getPlanSenses())
+
+    def prepare(self, drive_collection, senses = ()):
+        """Selects the senses to submit from the given plan.
+
+        The senses to submit are taken from the triggers of the drive
+        elements. All given senses of the plan that have the same name
+        use the result of the pool as well.
+
+        @param drive_collection: The root of the plan.
+        @type drive_collection: L{SPOSH.DriveCollection}
+        @param senses: The senses of the plan.
+        @type senses: sequence of L{SPOSH.Sense}
+        """
+        self.restore()
+        drive_elements = []
+        for priority_element in drive_collection.getElements():
+            drive_elements.extend(priority_element.getElements())
+        if self._max_elements != None:
+            drive_elements = drive_elements[:self._max_elements]
+        for element in drive_elements:
+            trigger = element.getTrigger()
+            if not trigger:
+                continue
+            for sense in trigger.getSenses():
+                self._replace(sense)
+        self.addSenses(senses)
+
+    def addSenses(self, senses):
+        """Makes the given senses use the results of the pool, if a sense
+        of the same name is submitted to the pool.
+
+        @param senses: Senses of the plan, like the senses of a lazily
+            built plan that were built after the plan was prepared.
+        @type senses: sequence of L{SPOSH.Sense}
+        """
+        for sense in senses:
+            if self._pooled.has_key(sense.getSenseName()):
+                self._replace(sense)
+
+    def _replace(self, sense):
+        """Makes the given sense use the pool, if it is a parallel sense.
+
+        @param sense: The sense.
+        @type sense: L{SPOSH.Sense}
+        """
+        name = sense.getSenseName()
+        limits = self._bdict.getParallelSenseLimits(name)
+        if not limits:
+            return
+        pooled = self._pooled.get(name)
+        if not pooled:
+            max_concurrent, timeout, group = limits
+            semaphore = self._pool.getSemaphore(group, max_concurrent)
+            pooled = _PooledSense(self, self._bdict.getSense(name),
+                                  semaphore, timeout)
+            self._pooled[name] = pooled
+        if sense.getMethod() is not pooled:
+            self._replaced.append((sense, sense.getMethod()))
+            sense.setMethod(pooled)
+
+    def restore(self):
+        """Makes all senses call their methods again.
+        """
+        for sense, method in self._replaced:
+            sense.setMethod(method)
+        self._replaced = []
+        self._pooled = {}
+
+    def tickStart(self, agent):
+        """Submits all parallel senses to the pool.
+        """
+        for pooled in self._pooled.values():
+            pooled.submit(self._pool)
+
+    def tickEnd(self, agent, result):
+        """Forgets the results of the tick.
+        """
+        for pooled in self._pooled.values():
+            pooled.clear()
+
+    def getStats(self):
+        """Returns a summary of the use of the pool.
+
+        @rtype: string
+        """
+        return "used: %d; limited: %d; timeouts: %d" % \
+               (self.used, self.limited, self.timeouts)
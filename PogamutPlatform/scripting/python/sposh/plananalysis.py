@@ -0,0 +1,577 @@
+"""Static analysis of plans before they are run.
+
+The analysis works on the structure of a parsed plan (see
+L{SPOSH.PlanBuilder}) and does not need the behaviours of the agent. It
+finds:
+
+  - competences and action pattern that cannot be reached from the
+    drive collection (see L{SPOSH.PlanBuilder.getUnreachable}), which
+    the plan builder removes before building the plan,
+  - goals and triggers that can never hold, as they compare the same
+    sense in contradicting ways, like '(health 30 <) (health 70 >)',
+  - the cost of a tick of L{SPOSH.Agent.followDrive} for each drive
+    element, given the measured cost of each sense and action.
+
+The costs are read from a profile file with one line per sense or
+action, giving the mean time of a call in microseconds::
+
+    # comments and empty lines are ignored
+    sense can_see 12.5
+    action shoot 40
+
+Such a file is written by L{CostRecorder}. The cost of a tick in which a
+drive element fires consists of the drive collection's goal, the triggers
+of all drive elements up to and including the firing one, and firing the
+drive element's current element, which is its root or any competence or
+action pattern that it descends to. The worst case assumes that all
+senses of the goals and triggers are evaluated, and that the most
+expensive current element fires. The expected case assumes that each
+sense of a goal or trigger holds with probability 1/2, such that the
+i-th sense is evaluated with probability 1/2^(i-1), and that all
+current elements are equally likely.
+
+The module can be run as a script to check a plan::
+
+    jython plananalysis.py [-p profile] [-b budget] plan.lap
+
+which prints the report and exits with status 1 if the worst case of
+a drive element exceeds the budget in microseconds, or 2 if the plan
+cannot be read.
+"""
+
+# Python modules
+import sys
+import types
+
+# Java modules
+from java.lang import System
+
+# POSH modules
+from lapparser import LAPParser, ParseError
+from sense import convertValue
+
+# the probability that a sense of a goal or trigger holds in the
+# expected case
+SENSE_PROBABILITY = 0.5
+
+# the predicates that order numbers
+_ORDER_PREDICATES = {"<": 1, "<=": 1, ">": 1, ">=": 1}
+
+
+def _isNumber(value):
+    """Returns if the given sense value is an int, long or float.
+    """
+    return type(value) == type(0) or type(value) == type(0L) or \
+           type(value) == type(0.0)
+
+
+def _formatSense(sense):
+    """Returns the given sense structure in plan syntax.
+    """
+    if type(sense) == types.StringType:
+        return "(%s)" % sense
+    return "(%s)" % " ".join(filter(None, sense))
+
+
+def _contradiction(comparisons):
+    """Returns if the given comparisons of a single sense can never hold
+    at the same time.
+
+    @param comparisons: The comparisons, as (predicate, value), where
+        a value of None stands for the sense evaluating to true.
+    @type comparisons: sequence of (string, any)
+    @rtype: boolean
+    """
+    equal, unequal, truth = [], [], 0
+    # the bounds, as (value, inclusive), or None
+    lower, upper = None, None
+    for predicate, value in comparisons:
+        if value == None:
+            truth = 1
+        elif predicate == "==":
+            equal.append(value)
+        elif predicate == "!=":
+            unequal.append(value)
+        elif _ORDER_PREDICATES.has_key(predicate) and _isNumber(value):
+            inclusive = len(predicate) == 2
+            if predicate[0] == ">":
+                if lower == None or value > lower[0] or \
+                   (value == lower[0] and not inclusive):
+                    lower = (value, inclusive)
+            else:
+                if upper == None or value < upper[0] or \
+                   (value == upper[0] and not inclusive):
+                    upper = (value, inclusive)
+    if lower and upper:
+        if lower[0] > upper[0] or \
+           (lower[0] == upper[0] and not (lower[1] and upper[1])):
+            return 1
+        if lower[0] == upper[0]:
+            equal.append(lower[0])
+    for value in equal:
+        if value != equal[0] or value in unequal or (truth and not value):
+            return 1
+        if _isNumber(value):
+            if lower and (value < lower[0] or
+                          (value == lower[0] and not lower[1])):
+                return 1
+            if upper and (value > upper[0] or
+                          (value == upper[0] and not upper[1])):
+                return 1
+    return 0
+
+
+def findContradiction(trigger):
+    """Returns the senses of a goal or trigger that can never hold at the
+    same time.
+
+    @param trigger: The goal or trigger, as described in
+        L{SPOSH.PlanBuilder.setDriveCollection}.
+    @type trigger: sequence of sense structures, or None
+    @return: The contradicting senses of the first sense name that
+        is found, or an empty list if the trigger can hold.
+    @rtype: list of sense structures
+    """
+    by_name = {}
+    order = []
+    for sense in trigger or []:
+        if type(sense) == types.StringType:
+            continue
+        if not by_name.has_key(sense[0]):
+            by_name[sense[0]] = []
+            order.append(sense[0])
+        by_name[sense[0]].append(sense)
+    for name in order:
+        senses = by_name[name]
+        comparisons = []
+        for sense in senses:
+            value = convertValue(sense[1])
+            comparisons.append((sense[2] or "==", value))
+        if len(senses) > 1 and _contradiction(comparisons):
+            return senses
+    return []
+
+
+def findContradictions(builder):
+    """Returns the goals and triggers of the plan that can never hold.
+
+    @param builder: The plan.
+    @type builder: L{SPOSH.PlanBuilder}
+    @return: A description of each goal or trigger that can never hold.
+    @rtype: list of strings
+    """
+    dc = builder.getDriveCollection()
+    triggers = [("DC.%s goal" % dc[1], dc[2])]
+    for priority_element in dc[3]:
+        for element in priority_element:
+            triggers.append(("DE.%s trigger" % element[0], element[1]))
+    names = builder.getCompetences().keys()
+    names.sort()
+    for name in names:
+        competence = builder.getCompetences()[name]
+        triggers.append(("C.%s goal" % name, competence[2]))
+        for priority_element in competence[3]:
+            for element in priority_element:
+                triggers.append(("CE.%s.%s trigger" % (name, element[0]),
+                                 element[1]))
+    contradictions = []
+    for location, trigger in triggers:
+        senses = findContradiction(trigger)
+        if senses:
+            contradictions.append("%s can never hold: %s" % (
+                location, " ".join(map(_formatSense, senses))))
+    return contradictions
+
+
+def readProfile(filename):
+    """Reads the costs of senses and actions from a profile file.
+
+    @param filename: The name of the profile file.
+    @type filename: string
+    @return: The costs of the senses and of the actions, in microseconds.
+    @rtype: (dictionary, string -> float, dictionary, string -> float)
+    @raise ValueError: If a line of the file is not valid.
+    """
+    costs = {"sense": {}, "action": {}}
+    lines = open(filename).readlines()
+    for i in range(len(lines)):
+        fields = lines[i].split()
+        if not fields or fields[0][0] == "#":
+            continue
+        if len(fields) != 3 or not costs.has_key(fields[0]):
+            raise ValueError, "Invalid profile line %d: '%s'" % \
+                  (i + 1, lines[i].strip())
+        costs[fields[0]][fields[1]] = float(fields[2])
+    return costs["sense"], costs["action"]
+
+
+class TickCost:
+    """The estimated cost of a tick in which a drive element fires.
+    """
+    def __init__(self, name, worst, expected):
+        """Initialises the cost.
+
+        @param name: The name of the drive element.
+        @type name: string
+        @param worst: The worst-case cost, in microseconds.
+        @type worst: float
+        @param expected: The expected cost, in microseconds.
+        @type expected: float
+        """
+        self.name, self.worst, self.expected = name, worst, expected
+
+    def __str__(self):
+        return "%-24s%12.1f%12.1f" % (self.name, self.worst, self.expected)
+
+
+class CostModel:
+    """Estimates the cost of ticks from the costs of senses and actions.
+    """
+    def __init__(self, builder, sense_costs, action_costs):
+        """Initialises the model for the given plan.
+
+        @param builder: The plan.
+        @type builder: L{SPOSH.PlanBuilder}
+        @param sense_costs: The cost of each sense, in microseconds.
+        @type sense_costs: dictionary, string -> float
+        @param action_costs: The cost of each action, in microseconds.
+        @type action_costs: dictionary, string -> float
+        """
+        self._builder = builder
+        self._competences = builder.getCompetences()
+        self._actionpatterns = builder.getActionPatterns()
+        self._sense_costs = sense_costs
+        self._action_costs = action_costs
+        # the senses and actions without a cost
+        self._missing = {}
+        # element name -> (worst, expected) cost of firing it
+        self._element_costs = {}
+
+    def getMissing(self):
+        """Returns the senses and actions of the plan that have no cost
+        in the profile, and are assumed to cost nothing.
+
+        @return: The names, as "sense [name]" or "action [name]".
+        @rtype: list of strings
+        """
+        missing = self._missing.keys()
+        missing.sort()
+        return missing
+
+    def _senseCost(self, name):
+        """Returns the cost of a sense.
+        """
+        cost = self._sense_costs.get(name)
+        if cost == None:
+            self._missing["sense %s" % name] = 1
+            return 0.0
+        return cost
+
+    def _actionCost(self, name):
+        """Returns the cost of an action, or of a sense-act of an action
+        pattern.
+        """
+        cost = self._action_costs.get(name)
+        if cost == None:
+            cost = self._sense_costs.get(name)
+        if cost == None:
+            self._missing["action %s" % name] = 1
+            return 0.0
+        return cost
+
+    def triggerCost(self, trigger):
+        """Returns the cost of evaluating a goal or trigger.
+
+        @param trigger: The goal or trigger.
+        @type trigger: sequence of sense structures, or None
+        @return: The worst-case and expected cost.
+        @rtype: (float, float)
+        """
+        worst, expected, probability = 0.0, 0.0, 1.0
+        for sense in trigger or []:
+            if type(sense) != types.StringType:
+                sense = sense[0]
+            cost = self._senseCost(sense)
+            worst = worst + cost
+            expected = expected + probability * cost
+            probability = probability * SENSE_PROBABILITY
+        return worst, expected
+
+    def elementCost(self, name):
+        """Returns the cost of firing an action, action pattern or
+        competence once.
+
+        The cost of a competence includes its goal and the triggers of
+        its elements, and the action that is performed by the selected
+        element. Firing an element that is an action pattern or
+        competence only makes it the current element of the drive
+        element, and costs nothing.
+
+        @param name: The name of the element.
+        @type name: string
+        @return: The worst-case and expected cost.
+        @rtype: (float, float)
+        """
+        if self._element_costs.has_key(name):
+            return self._element_costs[name]
+        if self._competences.has_key(name):
+            cost = self._competenceCost(self._competences[name])
+        elif self._actionpatterns.has_key(name):
+            worst, total = 0.0, 0.0
+            elements = self._actionpatterns[name][2]
+            for element in elements:
+                if type(element) != types.StringType:
+                    element_cost = self._senseCost(element[0])
+                elif self._competences.has_key(element):
+                    element_cost = 0.0
+                else:
+                    element_cost = self._actionCost(element)
+                worst = max(worst, element_cost)
+                total = total + element_cost
+            cost = (worst, total / max(len(elements), 1))
+        else:
+            action_cost = self._actionCost(name)
+            cost = (action_cost, action_cost)
+        self._element_costs[name] = cost
+        return cost
+
+    def _competenceCost(self, competence):
+        """Returns the cost of firing a competence once.
+        """
+        goal_worst, goal_expected = self.triggerCost(competence[2])
+        worst, fire_worst, total = goal_worst, 0.0, 0.0
+        # the expected cost of the triggers before the selected element
+        prefix = goal_expected
+        elements = []
+        for priority_element in competence[3]:
+            elements.extend(priority_element)
+        for element in elements:
+            trigger_worst, trigger_expected = self.triggerCost(element[1])
+            worst = worst + trigger_worst
+            prefix = prefix + trigger_expected
+            if self._competences.has_key(element[2]) or \
+               self._actionpatterns.has_key(element[2]):
+                action = 0.0
+            else:
+                action = self._actionCost(element[2])
+            fire_worst = max(fire_worst, action)
+            total = total + prefix + action
+        return worst + fire_worst, total / max(len(elements), 1)
+
+    def currentElements(self, root):
+        """Returns the elements that can be the current element of a drive
+        element with the given root.
+
+        @param root: The name of the root element.
+        @type root: string
+        @return: The names of the root and of the competences and action
+            pattern that the drive element can descend to.
+        @rtype: list of strings
+        """
+        found, names = {}, [root]
+        while names:
+            name = names.pop()
+            if found.has_key(name):
+                continue
+            found[name] = 1
+            if self._competences.has_key(name):
+                for priority_element in self._competences[name][3]:
+                    for element in priority_element:
+                        if self._competences.has_key(element[2]) or \
+                           self._actionpatterns.has_key(element[2]):
+                            names.append(element[2])
+            elif self._actionpatterns.has_key(name):
+                last = self._actionpatterns[name][2][-1]
+                if self._competences.has_key(last):
+                    names.append(last)
+        return found.keys()
+
+    def tickCosts(self):
+        """Returns the cost of a tick for each drive element.
+
+        @return: The costs, in the order of priority of the drive
+            elements.
+        @rtype: list of L{TickCost}
+        """
+        dc = self._builder.getDriveCollection()
+        prefix_worst, prefix_expected = self.triggerCost(dc[2])
+        costs = []
+        for priority_element in dc[3]:
+            for element in priority_element:
+                trigger_worst, trigger_expected = self.triggerCost(element[1])
+                prefix_worst = prefix_worst + trigger_worst
+                prefix_expected = prefix_expected + trigger_expected
+                current = self.currentElements(element[2])
+                worst, total = 0.0, 0.0
+                for name in current:
+                    element_worst, element_expected = self.elementCost(name)
+                    worst = max(worst, element_worst)
+                    total = total + element_expected
+                costs.append(TickCost(element[0], prefix_worst + worst,
+                                      prefix_expected + total / len(current)))
+        return costs
+
+
+class _TimedMethod:
+    """A callable that wraps a sense or action method and measures the
+    time of its calls.
+    """
+    def __init__(self, method):
+        self._method = method
+        self.calls, self.nanos = 0, 0L
+
+    def __call__(self):
+        start = System.nanoTime()
+        result = self._method()
+        self.nanos = self.nanos + System.nanoTime() - start
+        self.calls = self.calls + 1
+        return result
+
+
+class CostRecorder:
+    """Measures the cost of the senses and actions of an agent and writes
+    them to a profile file.
+
+    The recorder is given to the L{SPOSH.Agent} on construction, which
+    attaches it to its behaviour dictionary and adds it as a tick
+    listener.
+    """
+    def __init__(self):
+        """Initialises the recorder.
+        """
+        # (kind, name) -> timed method
+        self._timed = {}
+
+    def attach(self, beh_dict):
+        """Wraps all senses and actions of the given behaviour dictionary.
+
+        This needs to happen before the plan is built.
+
+        @param beh_dict: The behaviour dictionary to measure.
+        @type beh_dict: L{SPOSH.BehaviourDict}
+        """
+        for name in beh_dict.getSenseNames():
+            timed = _TimedMethod(beh_dict.getSense(name))
+            beh_dict.replaceSense(name, timed)
+            self._timed[("sense", name)] = timed
+        for name in beh_dict.getActionNames():
+            timed = _TimedMethod(beh_dict.getAction(name))
+            beh_dict.replaceAction(name, timed)
+            self._timed[("action", name)] = timed
+
+    def tickStart(self, agent):
+        """Does nothing.
+        """
+        pass
+
+    def tickEnd(self, agent, result):
+        """Does nothing.
+        """
+        pass
+
+    def write(self, filename):
+        """Writes the mean cost of the senses and actions that were
+        called to a profile file.
+
+        @param filename: The name of the profile file.
+        @type filename: string
+        """
+        keys = self._timed.keys()
+        keys.sort()
+        lines = ["# mean cost of a call in microseconds\n"]
+        for kind, name in keys:
+            timed = self._timed[(kind, name)]
+            if timed.calls:
+                lines.append("%s %s %.3f\n" % (kind, name,
+                             timed.nanos / 1000.0 / timed.calls))
+        output = open(filename, "w")
+        output.write("".join(lines))
+        output.close()
+
+
+def report(builder, sense_costs = {}, action_costs = {}, budget = None):
+    """Returns the report of the analysis of a plan.
+
+    @param builder: The plan.
+    @type builder: L{SPOSH.PlanBuilder}
+    @param sense_costs: The cost of each sense, in microseconds.
+    @type sense_costs: dictionary, string -> float
+    @param action_costs: The cost of each action, in microseconds.
+    @type action_costs: dictionary, string -> float
+    @param budget: The maximum worst-case cost of a tick, in
+        microseconds, or None.
+    @type budget: float or None
+    @return: The report, and the drive elements whose worst-case cost
+        exceeds the budget.
+    @rtype: (string, list of L{TickCost})
+    """
+    lines = []
+    unreachable = builder.getUnreachable()
+    lines.append("Unreachable: %s" % (", ".join(unreachable) or "none"))
+    contradictions = findContradictions(builder)
+    lines.append("Goals and triggers that can never hold: %d" %
+                 len(contradictions))
+    for contradiction in contradictions:
+        lines.append("  %s" % contradiction)
+    model = CostModel(builder, sense_costs, action_costs)
+    costs = model.tickCosts()
+    lines.append("%-24s%12s%12s" % ("drive element", "worst us",
+                                    "expected us"))
+    over = []
+    for cost in costs:
+        lines.append(str(cost))
+        if budget != None and cost.worst > budget:
+            over.append(cost)
+    missing = model.getMissing()
+    if missing:
+        lines.append("Not in profile (cost 0): %s" % ", ".join(missing))
+    if over:
+        lines.append("Over budget of %.1f us: %s" % (budget,
+                     ", ".join([cost.name for cost in over])))
+    return "\n".join(lines), over
+
+
+def main(args):
+    """Analyses the plan given by the command line arguments.
+
+    @param args: The arguments, "[-p profile] [-b budget] plan".
+    @type args: list of strings
+    @return: The exit status: 0 if the plan is within the budget, 1 if
+        it is not, and 2 if the plan cannot be read.
+    @rtype: int
+    """
+    profile, budget, plan = None, None, None
+    i = 0
+    while i < len(args):
+        if args[i] in ("-p", "-b") and i + 1 < len(args):
+            if args[i] == "-p":
+                profile = args[i + 1]
+            else:
+                budget = float(args[i + 1])
+            i = i + 2
+        elif plan == None:
+            plan = args[i]
+            i = i + 1
+        else:
+            plan = None
+            break
+    if plan == None:
+        print "Usage: plananalysis.py [-p profile] [-b budget] plan.lap"
+        return 2
+    try:
+        builder = LAPParser().parse(open(plan).read())
+        sense_costs, action_costs = {}, {}
+        if profile:
+            sense_costs, action_costs = readProfile(profile)
+    except (IOError, ParseError, ValueError), msg:
+        print "Error: %s" % msg
+        return 2
+    text, over = report(builder, sense_costs, action_costs, budget)
+    print text
+    if over:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
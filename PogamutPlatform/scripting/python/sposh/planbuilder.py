@@ -15,6 +15,69 @@ from action_pattern import ActionPattern
 from competence import Competence, CompetencePriorityElement, CompetenceElement
 from drive import DriveCollection, DrivePriorityElement, DriveElement
 from timer import SteppedTimer, RealTimeTimer
+from threshold import buildThresholdIndices
+
+
+class PlanDiff:
+    """The differences between a running plan and a rebuilt plan.
+
+    The elements are given by their paths, i.e. C.[name] for
+    competences, AP.[name] for action pattern, and DE.[name] for drive
+    elements.
+    """
+    def __init__(self):
+        """Initialises an empty list of differences.
+        """
+        # elements that were taken over from the running plan
+        self.kept = []
+        # elements that were built from scratch
+        self.rebuilt = []
+        # competences / action pattern that are not part of the new plan
+        self.removed = []
+
+    def __str__(self):
+        return "kept: %s; rebuilt: %s; removed: %s" % \
+            (', '.join(self.kept), ', '.join(self.rebuilt),
+             ', '.join(self.removed))
+
+
+class _LazyBuild:
+    """Completes a competence or action pattern stub when it is fired
+    for the first time.
+    """
+    def __init__(self, builder, agent, competences, actionpatterns):
+        """Initialises the lazy build of the stubs of a plan.
+
+        @param builder: The plan builder that built the stubs.
+        @type builder: L{PlanBuilder}
+        @param agent: The agent that uses the plan.
+        @type agent: L{SPOSH.Agent}
+        @param competences: The competence stubs of the plan.
+        @type competences: Dictionary, string -> L{SPOSH.Competence}
+        @param actionpatterns: The action pattern stubs of the plan.
+        @type actionpatterns: Dictionary, string -> L{SPOSH.ActionPattern}
+        """
+        self._builder, self._agent = builder, agent
+        self._competences = competences
+        self._actionpatterns = actionpatterns
+
+    def complete(self, element):
+        """Completes the given stub, and notifies the agent.
+
+        @param element: The stub.
+        @type element: L{SPOSH.Competence} or L{SPOSH.ActionPattern}
+        """
+        element.setLazyBuild(None)
+        if element.__class__ == Competence:
+            self._builder._completeCompetence(self._agent, element.getName(),
+                                              self._competences,
+                                              self._actionpatterns)
+        else:
+            self._builder._buildActionPatterns(self._agent,
+                                               self._competences,
+                                               self._actionpatterns,
+                                               [element.getName()])
+        self._agent.planExtended(element)
 
 
 class PlanBuilder:
@@ -28,6 +91,25 @@ class PlanBuilder:
         self._drivecollection = None
         self._actionpatterns = {}
         self._competences = {}
+        # the objects created by the last call to build() or rebuild():
+        # competences, action patterns and drive elements by name
+        self._built_competences = {}
+        self._built_actionpatterns = {}
+        self._built_drive_elements = {}
+        # if identical actions / senses are shared by all their occurrences
+        self._intern = 1
+        # the shared actions and senses, by their signature
+        self._leaves = {}
+        # all senses and sense-acts of the built plan, shared or not
+        self._senses = []
+        # the threshold indices of the senses of the built plan
+        self._threshold_indices = []
+        # if competences and action pattern are built when first fired
+        self._lazy = 0
+        # if unreachable competences and action pattern are not built,
+        # and the names of those that were removed from the plan
+        self._prune = 1
+        self._pruned = []
 
     def setDocstring(self, docstring):
         """Sets the docstring of the plan.
@@ -73,6 +155,15 @@ class PlanBuilder:
         """
         self._drivecollection = drivecollection
 
+    def getDriveCollection(self):
+        """Returns the structure of the drive collection of the plan.
+
+        @return: The drive collection, as described in L{setDriveCollection},
+            or None if not set.
+        @rtype: described in L{setDriveCollection}
+        """
+        return self._drivecollection
+
     def addActionPattern(self, actionpattern):
         """Adds the given action pattern to the plan.
 
@@ -137,6 +228,169 @@ class PlanBuilder:
                 "action pattern of same name" % name        
         self._competences[name] = competence
 
+    def getActionPatterns(self):
+        """Returns the structures of the action pattern of the plan.
+
+        @return: The action pattern, as described in L{addActionPattern}.
+        @rtype: Dictionary, string -> described in L{addActionPattern}
+        """
+        return self._actionpatterns
+
+    def getCompetences(self):
+        """Returns the structures of the competences of the plan.
+
+        @return: The competences, as described in L{addCompetence}.
+        @rtype: Dictionary, string -> described in L{addCompetence}
+        """
+        return self._competences
+
+    def copy(self):
+        """Returns a builder of the same plan that has not built it yet.
+
+        The structure of the plan is shared with this builder, as it is
+        not modified by building the plan. This allows parsing a plan once
+        and building it for several agents.
+
+        @return: The new plan builder, with the same settings.
+        @rtype: L{PlanBuilder}
+        """
+        builder = PlanBuilder()
+        builder._docstring = self._docstring
+        builder._drivecollection = self._drivecollection
+        builder._actionpatterns = self._actionpatterns.copy()
+        builder._competences = self._competences.copy()
+        builder._intern = self._intern
+        builder._lazy = self._lazy
+        builder._prune = self._prune
+        return builder
+
+    def setInterning(self, intern):
+        """Sets if identical plan leaves are shared.
+
+        If interning is enabled (the default), all references to the same
+        action create a single L{SPOSH.Action} object, and all occurrences
+        of a sense with the same (name, value, predicate) create a single
+        L{SPOSH.Sense} object. As actions and senses do not hold any
+        execution state, sharing them does not change the behaviour of the
+        plan. Each shared leaf still has its own element id, so that it
+        can serve as the key for caching and profiling its results.
+
+        @param intern: If leaves are to be shared.
+        @type intern: boolean
+        """
+        self._intern = intern
+
+    def setLazy(self, lazy):
+        """Sets if competences and action pattern are built lazily.
+
+        If built lazily, L{build} only checks that all names used by the
+        plan are known, and creates the drive collection and stubs of
+        all competences and action pattern. Each stub is completed when
+        it is fired for the first time, such that the time to build the
+        plan and its memory only scale with the parts of the plan that are
+        used. By default, the plan is built completely.
+
+        @param lazy: If competences and action pattern are built lazily.
+        @type lazy: boolean
+        """
+        self._lazy = lazy
+
+    def setPruning(self, prune):
+        """Sets if unreachable competences and action pattern are removed.
+
+        If pruning is enabled (the default), then competences and action
+        pattern that cannot be reached from the drive collection are
+        removed from the plan after its names have been checked, and
+        before it is built. They are not built, and are given by
+        L{getPruned}. An unreachable element that uses an unknown name
+        still fails the build.
+
+        @param prune: If unreachable elements are removed.
+        @type prune: boolean
+        """
+        self._prune = prune
+
+    def getUnreachable(self):
+        """Returns the competences and action pattern that cannot be
+        reached from the drive collection.
+
+        @return: The names of the elements, as "C.[name]" for competences
+            and "AP.[name]" for action pattern, in alphabetical order.
+        @rtype: list of strings
+        """
+        reached = {}
+        names = [element[2] for element in
+                 self._flatten(self._drivecollection[3])]
+        while names:
+            name = names.pop()
+            if reached.has_key(name):
+                continue
+            reached[name] = 1
+            if self._competences.has_key(name):
+                for element in self._flatten(self._competences[name][3]):
+                    names.append(element[2])
+            elif self._actionpatterns.has_key(name):
+                for element in self._actionpatterns[name][2]:
+                    if type(element) == types.StringType:
+                        names.append(element)
+        unreachable = []
+        for name in self._competences.keys():
+            if not reached.has_key(name):
+                unreachable.append("C.%s" % name)
+        for name in self._actionpatterns.keys():
+            if not reached.has_key(name):
+                unreachable.append("AP.%s" % name)
+        unreachable.sort()
+        return unreachable
+
+    def getPruned(self):
+        """Returns the competences and action pattern that were removed
+        from the plan by the last build, if pruning is enabled.
+
+        @return: The names of the removed elements, as given by
+            L{getUnreachable}.
+        @rtype: list of strings
+        """
+        return self._pruned
+
+    def _pruneUnreachable(self):
+        """Removes the unreachable competences and action pattern from
+        the plan, if pruning is enabled.
+        """
+        if not self._prune:
+            return
+        self._pruned = self.getUnreachable()
+        for name in self._pruned:
+            if name[:2] == "C.":
+                del self._competences[name[2:]]
+            else:
+                del self._actionpatterns[name[3:]]
+
+    def getLeaves(self):
+        """Returns the actions and senses that were created by the last
+        build, by their signature.
+
+        The signature of an action is ('A', name), and the signature of
+        a sense is ('S', name, value, predicate). If interning is disabled,
+        only the last created leaf of each signature is given.
+
+        @return: The actions and senses of the plan.
+        @rtype: Dictionary, signature -> L{SPOSH.Action} or L{SPOSH.Sense}
+        """
+        return self._leaves
+
+    def getSenses(self):
+        """Returns the senses and sense-acts that were created by the last
+        build.
+
+        Unlike L{getLeaves}, all created senses are given if interning is
+        disabled, including those of the same signature.
+
+        @return: The senses of the plan, each given once.
+        @rtype: list of L{SPOSH.Sense}
+        """
+        return self._senses
+
     def build(self, agent):
         """Builds the plan and returns the drive collection.
 
@@ -145,7 +399,9 @@ class PlanBuilder:
           1. It is checked if none of the action pattern or competence
              names are already taken by an action or sense/sense-act
              in the behaviour library. If a conflict
-             is found, then NameError is raised.
+             is found, then NameError is raised. Unreachable competences
+             and action pattern are then removed from the plan, unless
+             disabled by L{setPruning}.
 
           2. All competence / action pattern objects are created, together
              with goals and triggers, but their elements are left empty.
@@ -154,6 +410,11 @@ class PlanBuilder:
 
           4. The drive collection is built and returned.
 
+        If the plan is built lazily (see L{setLazy}) or pruned, then
+        stage 1 also checks that all names used by the plan are known,
+        before anything is removed. If it is built lazily, stage 3
+        is left to the first firing of each competence / action pattern.
+
         @param agent: The agent that uses the plan.
         @type agent: L{SPOSH.Agent}
         @return: The drive collection as the root of the plan.
@@ -162,12 +423,220 @@ class PlanBuilder:
             competences were found, or if a sense / action / sense-act was
             not found.
         """
-        self._checkNameClashes(agent)
+        agent.setTimer(self._createTimer())
+        return self._build(agent)
+
+    def buildAside(self, agent):
+        """Builds the plan without putting it in place.
+
+        The plan is built as by L{build}, but the agent's timer is left
+        as it is. The timer that the plan requires is returned instead,
+        and has to be given to the agent when the plan is put in place.
+
+        @param agent: The agent that uses the plan.
+        @type agent: L{SPOSH.Agent}
+        @return: The drive collection and its timer.
+        @rtype: (L{SPOSH.DriveCollection}, L{SPOSH.TimerBase})
+        @raise NameError: See L{build}.
+        """
+        timer = self._createTimer()
+        dc = self._build(agent)
+        dc.setTimer(timer)
+        return dc, timer
+
+    def _build(self, agent):
+        """Builds the plan with the agent's current timer.
+
+        See L{build} for the stages.
+        """
+        self._checkPlan(agent)
+        self._leaves = {}
+        self._senses = []
         competences = self._buildCompetenceStubs(agent)
         actionpatterns = self._buildActionPatternStubs(agent)
-        self._buildCompetences(agent, competences, actionpatterns)
-        self._buildActionPatterns(agent, competences, actionpatterns)
-        return self._buildDriveCollection(agent, competences, actionpatterns)
+        if self._lazy:
+            self._setLazyBuild(agent, competences, actionpatterns)
+        else:
+            self._buildCompetences(agent, competences, actionpatterns)
+            self._buildActionPatterns(agent, competences, actionpatterns)
+        self._built_competences = competences
+        self._built_actionpatterns = actionpatterns
+        dc = self._buildDriveCollection(agent, competences, actionpatterns)
+        self._buildThresholdIndices(agent)
+        return dc
+
+    def rebuild(self, agent, running):
+        """Builds the plan, re-using the unchanged parts of a running plan.
+
+        The structure of this plan is compared to the one of the plan
+        builder that built the running plan. Competences and action pattern
+        are re-used if neither their structure nor that of any competence or
+        action pattern that they refer to has changed. Drive elements are
+        re-used if their structure is unchanged and their root element was
+        re-used. Re-used elements keep their execution state (slip-stack
+        position, firing frequency, retries), and everything else is built
+        from scratch.
+
+        The running plan is not modified. The agent's timer is only kept
+        if the type of the drive collection has not changed. Otherwise, a
+        new timer is returned that has to be given to the agent when the
+        new plan is put in place.
+
+        @param agent: The agent that uses the plan.
+        @type agent: L{SPOSH.Agent}
+        @param running: The plan builder that built the running plan.
+        @type running: L{SPOSH.PlanBuilder}
+        @return: The drive collection, the new timer (or None if the
+            agent's timer is kept), and the differences between the plans.
+        @rtype: (L{SPOSH.DriveCollection}, L{SPOSH.TimerBase} or None,
+            L{PlanDiff})
+        @raise NameError: If clashes in naming of actions / action pattern /
+            competences were found, or if a sense / action / sense-act was
+            not found.
+        """
+        self._checkPlan(agent)
+        # the leaves of the running plan can be shared with the new plan
+        self._leaves = running._leaves.copy()
+        self._senses = running._senses[:]
+        diff = PlanDiff()
+        changed = self._changedNames(running, diff)
+        # the competences / action pattern to build
+        c_names, ap_names = [], []
+        competences, actionpatterns = {}, {}
+        for name in self._competences.keys():
+            if changed.has_key(name):
+                c_names.append(name)
+            else:
+                competences[name] = running._built_competences[name]
+                diff.kept.append("C.%s" % name)
+        for name in self._actionpatterns.keys():
+            if changed.has_key(name):
+                ap_names.append(name)
+            else:
+                actionpatterns[name] = running._built_actionpatterns[name]
+                diff.kept.append("AP.%s" % name)
+        competences.update(self._buildCompetenceStubs(agent, c_names))
+        actionpatterns.update(self._buildActionPatternStubs(agent, ap_names))
+        if self._lazy:
+            # kept stubs that were not yet completed are completed with
+            # the elements of this plan
+            self._setLazyBuild(agent, competences, actionpatterns)
+        else:
+            self._buildCompetences(agent, competences, actionpatterns,
+                                   c_names)
+            self._buildActionPatterns(agent, competences, actionpatterns,
+                                      ap_names)
+        self._built_competences = competences
+        self._built_actionpatterns = actionpatterns
+        for name in c_names:
+            diff.rebuilt.append("C.%s" % name)
+        for name in ap_names:
+            diff.rebuilt.append("AP.%s" % name)
+        # re-usable drive elements
+        reuse = {}
+        for name, (structure, element) in \
+                running._built_drive_elements.items():
+            if not changed.has_key(structure[2]):
+                reuse[name] = (structure, element)
+        timer = None
+        if self._drivecollection[0] != running._drivecollection[0]:
+            timer = self._createTimer()
+        dc = self._buildDriveCollection(agent, competences, actionpatterns,
+                                        reuse, diff)
+        self._buildThresholdIndices(agent)
+        return dc, timer, diff
+
+    def getThresholdIndices(self):
+        """Returns the threshold indices of the built plan.
+
+        The indices are not yet attached to their senses. This is done by
+        the agent when the plan is put in place.
+
+        @return: The threshold indices.
+        @rtype: list of L{SPOSH.threshold.ThresholdIndex}
+        """
+        return self._threshold_indices
+
+    def _buildThresholdIndices(self, agent):
+        """Builds the threshold indices for the senses of the plan.
+
+        @param agent: The agent that uses the plan.
+        @type agent: L{SPOSH.Agent}
+        """
+        self._threshold_indices = \
+            buildThresholdIndices(agent.getBehaviourDict(), self._senses)
+
+    def _changedNames(self, running, diff):
+        """Returns the names of the competences and action pattern that
+        need to be rebuilt, compared to the given running plan.
+
+        A competence / action pattern needs to be rebuilt if it is new,
+        if its structure changed, or if it refers to a competence / action
+        pattern that is rebuilt or was removed.
+
+        @param running: The plan builder that built the running plan.
+        @type running: L{SPOSH.PlanBuilder}
+        @param diff: The plan differences, to which removed elements
+            are added.
+        @type diff: L{PlanDiff}
+        @return: The changed names.
+        @rtype: dictionary, name -> 1
+        """
+        changed = {}
+        for old, new, prefix in \
+                ((running._competences, self._competences, "C"),
+                 (running._actionpatterns, self._actionpatterns, "AP")):
+            for name in old.keys():
+                if not new.has_key(name):
+                    changed[name] = 1
+                    diff.removed.append("%s.%s" % (prefix, name))
+            for name in new.keys():
+                if new[name] != old.get(name) or \
+                   not running._built_competences.has_key(name) and \
+                   not running._built_actionpatterns.has_key(name):
+                    changed[name] = 1
+        # propagate changes to the referring competences / action pattern
+        references = {}
+        for name, competence in self._competences.items():
+            refs = []
+            for priority_element in competence[3]:
+                for element in priority_element:
+                    refs.append(element[2])
+            references[name] = refs
+        for name, pattern in self._actionpatterns.items():
+            refs = []
+            for element in pattern[2]:
+                if type(element) == types.StringType:
+                    refs.append(element)
+            references[name] = refs
+        propagated = 1
+        while propagated:
+            propagated = 0
+            for name, refs in references.items():
+                if changed.has_key(name):
+                    continue
+                for ref in refs:
+                    if changed.has_key(ref):
+                        changed[name] = 1
+                        propagated = 1
+                        break
+        return changed
+
+    def _checkPlan(self, agent):
+        """Checks the names of the whole plan, and then removes its
+        unreachable parts, if pruning is enabled.
+
+        Names are resolved before pruning, such that the validity of a
+        plan does not depend on which of its parts are reachable.
+
+        @param agent: The agent that uses the plan.
+        @type agent: L{SPOSH.Agent}
+        @raise NameError: See L{build}.
+        """
+        self._checkNameClashes(agent)
+        if self._lazy or self._prune:
+            self._checkNames(agent)
+        self._pruneUnreachable()
 
     def _checkNameClashes(self, agent):
         """Checks for naming clashes in actions / senses / action pattern /
@@ -195,55 +664,189 @@ class PlanBuilder:
                 raise NameError, "Action pattern name '%s' clashes with " \
                      "sense of same name" % actionpattern
             
-    def _buildDriveCollection(self, agent, competences, actionpatterns):
-        """Builds the drive collection and returns it.
+    def _checkNames(self, agent):
+        """Checks that all names used in the plan are known, without
+        building any of its elements.
 
-        This method builds the drive collection, of which the structure has
-        been set by L{setDriveCollection}. Additionally, its
-        assigns the agent a timer, as specified by the drive collection
-        (i.e. a stepped timer, in the case of an SDC drive, and a
-        real-time timer in the case of an SRDC drive). If the timer is
+        @param agent: The agent to check the names for (as the agent
+            provides the behaviour dictionary).
+        @type agent: L{SPOSH.Agent}
+        @raise NameError: If a sense, action, competence or action pattern
+            is not known.
+        """
+        beh_dict = agent.getBehaviourDict()
+        senses = {}
+        for name in beh_dict.getSenseNames():
+            senses[name] = 1
+        actions = {}
+        for name in beh_dict.getActionNames():
+            actions[name] = 1
+        triggerables = actions.copy()
+        triggerables.update(self._competences)
+        triggerables.update(self._actionpatterns)
+        ap_last = actions.copy()
+        ap_last.update(self._competences)
+        triggers = [self._drivecollection[2]]
+        for element in self._flatten(self._drivecollection[3]):
+            triggers.append(element[1])
+            self._checkName(element[2], triggerables, "Drive element '%s'" %
+                            element[0])
+        for name, competence in self._competences.items():
+            triggers.append(competence[2])
+            for element in self._flatten(competence[3]):
+                triggers.append(element[1])
+                self._checkName(element[2], triggerables,
+                                "Competence '%s'" % name)
+        for trigger in triggers:
+            for sense in trigger or []:
+                if type(sense) != types.StringType:
+                    sense = sense[0]
+                self._checkName(sense, senses, "Trigger")
+        for name, pattern in self._actionpatterns.items():
+            elements = pattern[2]
+            for i in range(len(elements)):
+                element = elements[i]
+                if type(element) != types.StringType:
+                    self._checkName(element[0], senses,
+                                    "Action pattern '%s'" % name)
+                elif not senses.has_key(element):
+                    if i == len(elements) - 1:
+                        self._checkName(element, ap_last,
+                                        "Action pattern '%s'" % name)
+                    else:
+                        self._checkName(element, actions,
+                                        "Action pattern '%s'" % name)
+
+    def _checkName(self, name, known, user):
+        """Raises a NameError if the given name is not known.
+        """
+        if not known.has_key(name):
+            raise NameError, "%s uses unknown name '%s'" % (user, name)
+
+    def _flatten(self, priority_elements):
+        """Returns the elements of the given priority element structures.
+        """
+        elements = []
+        for priority_element in priority_elements:
+            elements.extend(priority_element)
+        return elements
+
+    def _setLazyBuild(self, agent, competences, actionpatterns):
+        """Makes all competence / action pattern stubs that were not yet
+        completed complete themselves when fired.
+
+        @param agent: The agent that uses the plan.
+        @type agent: L{SPOSH.Agent}
+        @param competences: The competence stubs.
+        @type competences: Dictionary, string -> L{SPOSH.Competence}
+        @param actionpatterns: The action pattern stubs.
+        @type actionpatterns: Dictionary, string -> L{SPOSH.ActionPattern}
+        """
+        lazy = _LazyBuild(self, agent, competences, actionpatterns)
+        for element in competences.values() + actionpatterns.values():
+            if element.getLazyBuild() or not element.getElements():
+                element.setLazyBuild(lazy)
+
+    def _completeCompetence(self, agent, name, competences, actionpatterns):
+        """Completes a competence stub that was built lazily.
+
+        @param agent: The agent that uses the plan.
+        @type agent: L{SPOSH.Agent}
+        @param name: The name of the competence.
+        @type name: string
+        @param competences: The competence stubs.
+        @type competences: Dictionary, string -> L{SPOSH.Competence}
+        @param actionpatterns: The action pattern stubs.
+        @type actionpatterns: Dictionary, string -> L{SPOSH.ActionPattern}
+        """
+        competences[name].setGoal(
+            self._buildGoal(agent, self._competences[name][2]))
+        self._buildCompetences(agent, competences, actionpatterns, [name])
+
+    def _createTimer(self):
+        """Creates the agent timer, as specified by the drive collection.
+
+        A stepped timer is created in the case of an SDC drive, and a
+        real-time timer in the case of an SRDC drive. If the timer is
         a real-time timer, then it is initialised with a loop frequency of
         50Hz.
 
         Only drives of type 'SDC' and 'SRDC' are accepted. In any other case
         a TypeError is raised.
 
-        @param agent: The agent that the drive collection is built for.
-        @type agent: L{SPOSH.Agent}
-        @param competences: A competence object dictionary.
-        @type competences: Dictionary, string -> L{SPOSH.Competence}
-        @param actionpatterns: An action pattern dictionary.
-        @type actionpatterns: Dictionary, string -> L{SPOSH.ActionPattern}
-        @return: The drive collection.
-        @rtype: L{SPOSH.DriveCollection}
+        @return: The timer for the agent.
+        @rtype: L{SPOSH.TimerBase}
         @raise TypeError: For drives of types other than SDC or SRDC.
         """
-        dctype, dcname = self._drivecollection[0], self._drivecollection[1]
-        # create the agent timer
+        dctype = self._drivecollection[0]
         if dctype == 'SDC':
-            agent.setTimer(SteppedTimer())
+            return SteppedTimer()
         elif dctype == 'SRDC':
-            agent.setTimer(RealTimeTimer(long(1000.0 / 50.0)))
+            return RealTimeTimer(long(1000.0 / 50.0))
         elif dctype == 'DC':
-            agent.setTimer(SteppedTimer())
             print "Warning: using StrictPOSH with POSH Drive Collection."
+            return SteppedTimer()
         elif dctype == 'RDC':
-            agent.setTimer(RealTimeTimer(long(1000.0 / 50.0)))
             print "Warning: using StrictPOSH with POSH Real time Drive Collection."
+            return RealTimeTimer(long(1000.0 / 50.0))
         else:
             raise TypeError, "Drive collection of type '%s' not " \
                 "supported (only supporting SDC and SRDC, DC and RDC)." % dctype
+
+    def _buildDriveCollection(self, agent, competences, actionpatterns,
+                              reuse = {}, diff = None):
+        """Builds the drive collection and returns it.
+
+        This method builds the drive collection, of which the structure has
+        been set by L{setDriveCollection}. The drive priority elements use
+        the agent's current timer.
+
+        Drive elements that are given in C{reuse} with the same structure
+        are taken from there rather than being built.
+
+        @param agent: The agent that the drive collection is built for.
+        @type agent: L{SPOSH.Agent}
+        @param competences: A competence object dictionary.
+        @type competences: Dictionary, string -> L{SPOSH.Competence}
+        @param actionpatterns: An action pattern dictionary.
+        @type actionpatterns: Dictionary, string -> L{SPOSH.ActionPattern}
+        @param reuse: Drive elements that can be re-used.
+        @type reuse: Dictionary, string -> (structure, L{SPOSH.DriveElement})
+        @param diff: The plan differences, to which re-used and built
+            drive elements are added, or None.
+        @type diff: L{PlanDiff} or None
+        @return: The drive collection.
+        @rtype: L{SPOSH.DriveCollection}
+        """
+        dcname = self._drivecollection[1]
         goal = self._buildGoal(agent, self._drivecollection[2])
+        built = {}
         priority_elements = []
         for priority_element in self._drivecollection[3]:
             element_list = []
             for element in priority_element:
-                element_list.append(
-                    self._buildDriveElement(element, agent,
-                                            competences, actionpatterns))
+                name = element[0]
+                if built.has_key(name):
+                    # drive elements of the same name are never re-used
+                    n = 2
+                    while built.has_key("%s#%d" % (name, n)):
+                        n += 1
+                    name = "%s#%d" % (name, n)
+                old = reuse.get(name)
+                if old and old[0] == element:
+                    drive_element = old[1]
+                    if diff:
+                        diff.kept.append("DE.%s" % name)
+                else:
+                    drive_element = self._buildDriveElement(
+                        element, agent, competences, actionpatterns)
+                    if diff:
+                        diff.rebuilt.append("DE.%s" % name)
+                built[name] = (element, drive_element)
+                element_list.append(drive_element)
             priority_elements.append(
                 DrivePriorityElement(agent, dcname, element_list))
+        self._built_drive_elements = built
         return DriveCollection(agent, dcname, priority_elements, goal)
 
     def _buildDriveElement(self, element, agent,
@@ -271,44 +874,63 @@ class PlanBuilder:
                             element[3])
         
 
-    def _buildCompetenceStubs(self, agent):
+    def _buildCompetenceStubs(self, agent, names = None):
         """Builds stub objects for the plan competences.
 
-        The stub competences are competences without elements.
+        The stub competences are competences without elements, but with
+        their time limits.
 
         @param agent: The agent to build the competences for.
         @type agent: L{SPOSH.Agent}
+        @param names: The names of the competences to build, or None
+            to build all competences.
+        @type names: sequence of strings or None
         @return: A dictionary with competence stubs.
         @rtype: Dictionary, string -> L{SPOSH.Competence}
         """
+        if names == None:
+            names = self._competences.keys()
         stub_dict = {}
-        for competence in self._competences.values():
-            name = competence[0]
-            goal = self._buildGoal(agent, competence[2])
-            # we're just ignoring the time qs we use the simple slip-stack
+        for name in names:
+            competence = self._competences[name]
+            # the goal of a lazily built competence is built on completion
+            if self._lazy:
+                goal = None
+            else:
+                goal = self._buildGoal(agent, competence[2])
             stub = Competence(agent, name, [], goal)
+            if competence[1] != None:
+                stub.setTimeLimit(competence[1])
             stub_dict[name] = stub
         return stub_dict
 
-    def _buildActionPatternStubs(self, agent):
+    def _buildActionPatternStubs(self, agent, names = None):
         """Build stub objects fopr the plan action pattern.
 
-        The stub action pattern are action pattern without actions.
+        The stub action pattern are action pattern without actions, but
+        with their time limits.
 
         @param agent: The action to build the action pattern for.
         @type agent: L{SPOSH.Agent}
+        @param names: The names of the action pattern to build, or None
+            to build all action pattern.
+        @type names: sequence of strings or None
         @return: A dictionary with action pattern stubs.
         @rtype: Dictionary, string -> L{SPOSH.ActionPattern}
         """
+        if names == None:
+            names = self._actionpatterns.keys()
         stub_dict = {}
-        for pattern in self._actionpatterns.values():
-            name = pattern[0]
-            # we're just ignoring the time, as we use the simple slip-stack
+        for name in names:
+            pattern = self._actionpatterns[name]
             stub = ActionPattern(agent, name, [])
+            if pattern[1] != None:
+                stub.setTimeLimit(pattern[1])
             stub_dict[name] = stub
         return stub_dict
 
-    def _buildCompetences(self, agent, competences, actionpatterns):
+    def _buildCompetences(self, agent, competences, actionpatterns,
+                          names = None):
         """Completes the competences based on the given competence stubs.
 
         This method modifies the given competence stubs and creates
@@ -325,8 +947,13 @@ class PlanBuilder:
         @param actionpatterns: The action pattern stubs, as returned by
             L{_buildActionPatternStubs}
         @type actionpatterns: Dictionary, string -> L{SPOSH.ActionPattern}
+        @param names: The names of the competences to complete, or None
+            to complete all competences.
+        @type names: sequence of strings or None
         """
-        for competence in self._competences.keys():
+        if names == None:
+            names = self._competences.keys()
+        for competence in names:
             # start with priority elements
             priority_elements = []
             for priority_element in self._competences[competence][3]:
@@ -340,7 +967,8 @@ class PlanBuilder:
                     CompetencePriorityElement(agent, competence, element_list))
             competences[competence].setElements(priority_elements)
             
-    def _buildActionPatterns(self, agent, competences, actionpatterns):
+    def _buildActionPatterns(self, agent, competences, actionpatterns,
+                             names = None):
         """Completes the action pattern based on the given
         action pattern stubs.
 
@@ -360,9 +988,14 @@ class PlanBuilder:
         @param actionpatterns: The action pattern stubs, as returned by
             L{_buildActionPatternStubs}
         @type actionpatterns: Dictionary, string -> L{SPOSH.ActionPattern}
+        @param names: The names of the action pattern to complete, or None
+            to complete all action pattern.
+        @type names: sequence of strings or None
         """
+        if names == None:
+            names = self._actionpatterns.keys()
         senses = agent.getBehaviourDict().getSenseNames()
-        for actionpattern in self._actionpatterns.keys():
+        for actionpattern in names:
             # create the elements of the action pattern
             element_list = []
             element_names = self._actionpatterns[actionpattern][2]
@@ -477,7 +1110,7 @@ class PlanBuilder:
         @return: The created sense-act object
         @rtype: L{SPOSH.Sense}
         """
-        return Sense(agent, sense_name)
+        return self._buildSense(agent, (sense_name, None, None))
 
     def _buildSense(self, agent, sense_struct):
         """Returns a sense object for the given structure.
@@ -495,7 +1128,19 @@ class PlanBuilder:
         @raise NameError: If the sense could not be found in the
             behaviour dictionary.
         """
-        return Sense(agent, sense_struct[0], sense_struct[1], sense_struct[2])
+        name, value, predicate = sense_struct
+        # without a value, the predicate is ignored by the sense
+        if not value:
+            value, predicate = None, None
+        elif not predicate:
+            predicate = "=="
+        signature = ('S', name, value, predicate)
+        sense = self._leaves.get(signature)
+        if sense is None or not self._intern:
+            sense = Sense(agent, name, value, predicate)
+            self._leaves[signature] = sense
+            self._senses.append(sense)
+        return sense
 
     def _getTriggerable(self, agent, name,
                         competences = {}, actionpatterns = {}):
@@ -527,8 +1172,12 @@ class PlanBuilder:
         # according behaviour in the behaviour dictionary. Hence, if no
         # behaviour provides that action, we need to check competences and
         # action pattern
+        signature = ('A', name)
         try:
-            element = Action(agent, name)
+            element = self._leaves.get(signature)
+            if element is None or not self._intern:
+                element = Action(agent, name)
+                self._leaves[signature] = element
         except NameError:
             # action not found, try competences and action patterns
             if competences.has_key(name):
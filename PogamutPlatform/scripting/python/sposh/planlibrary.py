@@ -0,0 +1,178 @@
+"""A library of built plans that an agent switches between.
+
+An agent that switches between plans at runtime, like between an
+'Accommodating' and a 'Consolidating' plan, would otherwise have to read,
+parse and build a plan on every switch. A L{PlanLibrary} keeps the plans
+that were built for an agent, for the agent's behaviour dictionary, such
+that switching to a plan of the library only replaces the drive
+collection and, if the plan requires another type of timer, the timer
+(see L{SPOSH.Agent.switchPlan}). The plans keep their execution state
+while they are not active.
+
+The library can be limited by the estimated memory footprint of its
+plans (see L{SPOSH.memreport.elementFootprint}). If the plans exceed the
+limit, the least recently used plans are dropped, other than the active
+one, and are built again when they are switched to next.
+"""
+
+# memreport is imported by _estimateBytes(), as it imports the agent module
+
+
+class _Entry:
+    """A built plan of the library.
+    """
+    def __init__(self, plan_builder, dc, timer, size):
+        self.plan_builder, self.dc, self.timer = plan_builder, dc, timer
+        self.size = size
+
+
+class PlanLibrary:
+    """Built plans of an agent, by name, with least recently used
+    eviction.
+    """
+    def __init__(self, max_bytes = None):
+        """Initialises an empty library.
+
+        @param max_bytes: The maximum estimated bytes of the built plans,
+            or None to not limit them.
+        @type max_bytes: long or None
+        """
+        self._max_bytes = max_bytes
+        # plan name -> plan file
+        self._files = {}
+        # plan name -> entry
+        self._entries = {}
+        # the names of the built plans, the most recently used last
+        self._order = []
+        self._bytes = 0
+        # switches to built plans, plans that had to be built, and plans
+        # that were dropped
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def addPlan(self, name, plan):
+        """Adds a plan to the library, without building it.
+
+        @param name: The name of the plan.
+        @type name: string
+        @param plan: Name of the plan (complete path + file + extension).
+        @type plan: string
+        """
+        self._files[name] = plan
+
+    def getPlanFile(self, name):
+        """Returns the plan file of the plan of the given name.
+
+        @param name: The name of the plan.
+        @type name: string
+        @return: Name of the plan (complete path + file + extension).
+        @rtype: string
+        @raise KeyError: If the plan is not in the library.
+        """
+        try:
+            return self._files[name]
+        except KeyError:
+            raise KeyError, "Plan '%s' not in the plan library" % name
+
+    def getPlanNames(self):
+        """Returns the names of all plans of the library.
+
+        @rtype: list of strings
+        """
+        return self._files.keys()
+
+    def getBuiltNames(self):
+        """Returns the names of the built plans.
+
+        @return: The names, the least recently used first.
+        @rtype: list of strings
+        """
+        return self._order[:]
+
+    def getBytes(self):
+        """Returns the estimated bytes of the built plans.
+
+        @rtype: long
+        """
+        return self._bytes
+
+    def lookup(self, name):
+        """Returns a built plan, and marks it as the most recently used.
+
+        @param name: The name of the plan.
+        @type name: string
+        @return: The plan builder, the drive collection and the timer of
+            the plan, or None if the plan is not built.
+        @rtype: (L{SPOSH.PlanBuilder}, L{SPOSH.DriveCollection},
+            L{SPOSH.TimerBase}) or None
+        """
+        entry = self._entries.get(name)
+        if entry == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._order.remove(name)
+        self._order.append(name)
+        return entry.plan_builder, entry.dc, entry.timer
+
+    def store(self, name, plan_builder, dc, timer, keep = None):
+        """Stores a built plan as the most recently used one, and drops
+        the least recently used plans if the library exceeds its size.
+
+        Neither the stored plan nor the plan to keep are dropped.
+
+        @param name: The name of the plan, which has to be in the library.
+        @type name: string
+        @param plan_builder: The builder that built the plan.
+        @type plan_builder: L{SPOSH.PlanBuilder}
+        @param dc: The drive collection of the plan.
+        @type dc: L{SPOSH.DriveCollection}
+        @param timer: The timer that the plan uses.
+        @type timer: L{SPOSH.TimerBase}
+        @param keep: The name of another plan that must not be dropped,
+            like the one that the agent runs, or None.
+        @type keep: string or None
+        """
+        entry = self._entries.get(name)
+        if entry and entry.dc is dc:
+            # only the timer changed
+            entry.timer = timer
+            return
+        if entry:
+            self._drop(name)
+        size = self._estimateBytes(dc)
+        self._entries[name] = _Entry(plan_builder, dc, timer, size)
+        self._order.append(name)
+        self._bytes = self._bytes + size
+        if self._max_bytes == None:
+            return
+        for old in self._order[:-1]:
+            if self._bytes <= self._max_bytes:
+                break
+            if old != keep:
+                self._drop(old)
+                self.evictions += 1
+
+    def _drop(self, name):
+        """Removes a built plan.
+        """
+        self._bytes = self._bytes - self._entries[name].size
+        del self._entries[name]
+        self._order.remove(name)
+
+    def _estimateBytes(self, dc):
+        """Returns the estimated bytes of a built plan.
+        """
+        from memreport import elementFootprint
+        size = 0
+        for count, total in elementFootprint(dc).values():
+            size = size + total
+        return size
+
+    def getStats(self):
+        """Returns a summary of the use of the library.
+
+        @rtype: string
+        """
+        return "built: %d; bytes: %d; hits: %d; misses: %d; " \
+               "evictions: %d" % (len(self._order), self._bytes, self.hits,
+                                  self.misses, self.evictions)
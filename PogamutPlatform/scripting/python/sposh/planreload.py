@@ -0,0 +1,91 @@
+"""Reloading of the plan of a running agent when its plan file changes.
+
+A L{PlanWatcher} is added to an agent as a tick listener. Every few ticks
+it checks the modification time of the agent's plan file and, if the file
+changed, calls L{SPOSH.Agent.reloadPlan}. This re-parses the plan and
+rebuilds only the parts of it that changed, keeping the execution state
+of everything else. The new plan replaces the running one between two
+calls of L{SPOSH.Agent.followDrive}.
+
+The watcher is used as follows::
+
+    agent = Agent(behaviours, plan, log)
+    agent.addTickListener(PlanWatcher())
+"""
+
+# Python modules
+import thread
+
+# Java modules
+from java.io import File
+
+
+class PlanWatcher:
+    """Reloads the plan of an agent whenever its plan file changes.
+
+    If the changed plan cannot be parsed or built, the running plan
+    stays in place and the error is logged. The plan is then only
+    reloaded again after the next change to the file.
+    """
+    def __init__(self, check_ticks = 50, background = 0):
+        """Initialises the watcher.
+
+        @param check_ticks: Every how many ticks the plan file is checked.
+        @type check_ticks: int
+        @param background: If the plan is re-parsed and rebuilt in a
+            separate thread rather than in the agent's tick.
+        @type background: boolean
+        """
+        self._check_ticks = check_ticks
+        self._background = background
+        self._ticks = 0
+        self._modified = None
+        self._reloading = 0
+        # the differences of the last reload, or None
+        self.last_diff = None
+        # the number of reloads, and of failed reloads
+        self.reloads, self.failures = 0, 0
+
+    def tickStart(self, agent):
+        """Checks the plan file every C{check_ticks} ticks.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        """
+        self._ticks += 1
+        if self._modified != None and self._ticks < self._check_ticks:
+            return
+        self._ticks = 0
+        modified = File(agent.getPlan()).lastModified()
+        if self._modified == None:
+            # first check: the agent was built from the current file
+            self._modified = modified
+        elif modified != self._modified and not self._reloading:
+            self._modified = modified
+            self._reloading = 1
+            if self._background:
+                thread.start_new_thread(self._reload, (agent, ))
+            else:
+                self._reload(agent)
+
+    def tickEnd(self, agent, result):
+        """Does nothing.
+        """
+        pass
+
+    def _reload(self, agent):
+        """Reloads the agent's plan and logs failures.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        """
+        try:
+            try:
+                self.last_diff = agent.reloadPlan()
+                self.reloads += 1
+            except Exception, e:
+                self.failures += 1
+                agent.debug("Reloading plan failed, keeping running " \
+                            "plan: %s" % e)
+        finally:
+            self._reloading = 0
@@ -0,0 +1,316 @@
+"""Prediction of trigger outcomes, to skip unlikely trigger evaluations.
+
+While a high-priority drive is active, the triggers of lower-priority drive
+elements are evaluated every tick in which the higher-priority ones fail,
+even if they hardly ever succeed in that situation. If trigger prediction
+is enabled (see L{SPOSH.Agent.enableTriggerPrediction}), a
+L{TriggerPredictor} selects the drive elements of the priority elements
+of the drive collection instead (see L{SPOSH.DrivePriorityElement.setPredictor}).
+
+The predictor counts, for each drive element, how often its trigger was
+evaluated and how often it succeeded, given the drive element that was
+selected in the previous tick (the active drive). If the trigger of an
+element was evaluated at least C{min_samples} times in the current
+context and its success rate is at most C{min_rate}, it is not evaluated
+but taken to fail. After C{recheck} such skips in a row, the trigger is
+evaluated again, such that the statistics do not become stale. The counts
+are halved every C{window} evaluations, such that the predictor adapts to
+changing behaviour.
+
+Only the triggers whose senses are all pure (see
+L{SPOSH.Behaviour.getPureSenses}) are skipped, as skipping any other sense
+would change the behaviour of the agent beyond the selection of drives.
+Triggers that are compiled to sense bits are not predicted.
+
+Skipping triggers can change the decisions of the agent, whenever a
+skipped trigger would have succeeded. In shadow mode, the predictor
+evaluates the triggers that it would skip nevertheless, and records the
+ticks in which skipping them would have changed the selected drive
+element. L{predictionReport} replays a recorded trace (see
+L{SPOSH.sensetrace}) with a predictor in shadow mode, and reports the
+sense calls that the predictor saves and the decisions that it changes.
+"""
+
+# POSH modules
+from sensetrace import TraceReplayer
+
+
+class TriggerPredictor:
+    """Selects drive elements, and skips the triggers that are unlikely to
+    be satisfied.
+
+    The predictor is a tick listener of the agent. Its counters are public
+    attributes, and summarised by L{getStats}.
+    """
+    def __init__(self, agent, min_rate = 0.02, min_samples = 20,
+                 recheck = 50, window = 1000, shadow = 0,
+                 max_mispredictions = 100):
+        """Initialises the predictor for the plan of the given agent.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        @param min_rate: The success rate at or below which a trigger is
+            skipped.
+        @type min_rate: float
+        @param min_samples: The number of evaluations of a trigger in a
+            context before it can be skipped.
+        @type min_samples: int
+        @param recheck: The number of skips in a row after which the
+            trigger is evaluated again.
+        @type recheck: int
+        @param window: The number of evaluations after which the counts
+            of a trigger in a context are halved.
+        @type window: int
+        @param shadow: If the triggers that are predicted to fail are
+            evaluated nevertheless, to record the mispredictions.
+        @type shadow: boolean
+        @param max_mispredictions: The maximum number of mispredictions
+            that are recorded in shadow mode.
+        @type max_mispredictions: int
+        """
+        self._agent = agent
+        self._min_rate = min_rate
+        self._min_samples = min_samples
+        self._recheck = recheck
+        self._window = window
+        self._shadow = shadow
+        self._max_mispredictions = max_mispredictions
+        self._priority_elements = []
+        # drive element -> number of senses of its trigger, for the
+        # elements whose trigger can be skipped
+        self._predictable = {}
+        # (previously selected element, element) ->
+        #     [evaluations, successes, skips in a row]
+        self._stats = {}
+        # the drive element selected in the previous, and current, tick
+        self._previous, self._selected = None, None
+        # the number of the current tick, and the (tick, element name) of
+        # the recorded mispredictions
+        self._tick, self._mispredicted = -1, []
+        # evaluated and skipped triggers, the senses of the skipped
+        # triggers, forced evaluations after skips, and skipped triggers
+        # that would have selected their element. As a trigger stops at
+        # its first failing sense, the senses of the skipped triggers are
+        # an upper bound of the sense calls that skipping saves. The
+        # sense calls that are actually saved are only known in shadow
+        # mode, which makes them.
+        self.evaluations, self.skips = 0, 0
+        self.skipped_senses, self.rechecks = 0, 0
+        self.mispredictions, self.saved_calls = 0, 0
+        self.prepare(agent.getDriveCollection())
+
+    def prepare(self, drive_collection):
+        """Selects the drive elements of the given plan for prediction.
+
+        The elements of the previous plan are restored, and the statistics
+        are discarded.
+
+        @param drive_collection: The root of the plan.
+        @type drive_collection: L{SPOSH.DriveCollection}
+        """
+        self.restore()
+        bdict = self._agent.getBehaviourDict()
+        predictable = {}
+        for priority_element in drive_collection.getElements():
+            for element in priority_element.getElements():
+                senses = element.getTrigger().getSenses()
+                for sense in senses:
+                    if not bdict.isPureSense(sense.getSenseName()):
+                        break
+                else:
+                    predictable[element] = len(senses)
+            priority_element.setPredictor(self)
+        self._priority_elements = list(drive_collection.getElements())
+        self._predictable = predictable
+        self._stats = {}
+        self._previous, self._selected = None, None
+
+    def restore(self):
+        """Stops selecting the drive elements of the plan.
+        """
+        for priority_element in self._priority_elements:
+            priority_element.setPredictor(None)
+        self._priority_elements = []
+
+    def getPredictable(self):
+        """Returns the names of the drive elements whose triggers can be
+        skipped.
+
+        @rtype: list of strings
+        """
+        names = [element.getName() for element in self._predictable.keys()]
+        names.sort()
+        return names
+
+    def getSuccessRate(self, element, previous = None):
+        """Returns the observed success rate of the trigger of a drive
+        element.
+
+        @param element: The drive element.
+        @type element: L{SPOSH.DriveElement}
+        @param previous: The drive element that was selected in the tick
+            before, or None for no element.
+        @type previous: L{SPOSH.DriveElement} or None
+        @return: The success rate, or None if the trigger was not
+            evaluated in that context.
+        @rtype: float or None
+        """
+        stats = self._stats.get((previous, element))
+        if not stats or not stats[0]:
+            return None
+        return float(stats[1]) / stats[0]
+
+    def getMispredictions(self):
+        """Returns the recorded mispredictions of shadow mode.
+
+        @return: The number of the tick (counted from the creation of the
+            predictor) and the name of the drive element that would have
+            been skipped, although it was selected, for the first
+            mispredictions.
+        @rtype: list of (int, string)
+        """
+        return self._mispredicted[:]
+
+    def select(self, elements, timestamp):
+        """Returns the first drive element of the given ones that is ready,
+        skipping the triggers that are predicted to fail.
+
+        @param elements: The drive elements of a priority element.
+        @type elements: sequence of L{SPOSH.DriveElement}
+        @param timestamp: The current timestamp in milliseconds.
+        @type timestamp: long
+        @return: The element to fire, or None if none is ready.
+        @rtype: L{SPOSH.DriveElement} or None
+        """
+        predictable, all_stats = self._predictable, self._stats
+        for element in elements:
+            if not predictable.has_key(element):
+                if element.isReady(timestamp):
+                    self._selected = element
+                    return element
+                continue
+            key = (self._previous, element)
+            stats = all_stats.get(key)
+            if stats == None:
+                stats = all_stats[key] = [0, 0, 0]
+            evaluations = stats[0]
+            if evaluations >= self._min_samples and \
+               stats[1] <= evaluations * self._min_rate:
+                if stats[2] < self._recheck:
+                    stats[2] += 1
+                    self.skips += 1
+                    self.skipped_senses += predictable[element]
+                    if not self._shadow:
+                        continue
+                    if self._shadowFire(element) and \
+                       element.isReadyTriggered(timestamp):
+                        self._mispredict(element)
+                        self._selected = element
+                        return element
+                    continue
+                self.rechecks += 1
+            stats[2] = 0
+            self.evaluations += 1
+            triggered = element.getTrigger().fire()
+            stats[0] = evaluations + 1
+            if triggered:
+                stats[1] += 1
+            if stats[0] >= self._window:
+                stats[0], stats[1] = stats[0] / 2, stats[1] / 2
+            if triggered and element.isReadyTriggered(timestamp):
+                self._selected = element
+                return element
+        return None
+
+    def _shadowFire(self, element):
+        """Fires the trigger of an element that is predicted to fail, and
+        counts the sense calls that skipping it would have saved.
+        """
+        for sense in element.getTrigger().getSenses():
+            self.saved_calls += 1
+            if not sense.fire():
+                return 0
+        return 1
+
+    def _mispredict(self, element):
+        """Records that a skipped element would have been selected.
+        """
+        self.mispredictions += 1
+        if len(self._mispredicted) < self._max_mispredictions:
+            self._mispredicted.append((self._tick, element.getName()))
+
+    def tickStart(self, agent):
+        """Makes the element selected in the last tick the context of the
+        predictions.
+        """
+        self._previous, self._selected = self._selected, None
+        self._tick += 1
+
+    def tickEnd(self, agent, result):
+        """Does nothing.
+        """
+        pass
+
+    def getStats(self):
+        """Returns a summary of the predictions.
+
+        @rtype: string
+        """
+        return "evaluations: %d; skips: %d; skipped senses: %d; " \
+               "saved calls: %d; rechecks: %d; mispredictions: %d; " \
+               "contexts: %d" % \
+               (self.evaluations, self.skips, self.skipped_senses,
+                self.saved_calls, self.rechecks, self.mispredictions,
+                len(self._stats))
+
+
+def predictionReport(filename, plan, log, min_rate = 0.02, min_samples = 20,
+                     recheck = 50, window = 1000, max_ticks = 10):
+    """Returns a report of the effect of trigger prediction on a trace.
+
+    The trace is replayed on the plan (see L{SPOSH.sensetrace.TraceReplayer})
+    with a L{TriggerPredictor} in shadow mode, such that all triggers are
+    evaluated as without the predictor. The report gives the sense calls
+    of the replay, the sense calls that the predictor would have saved,
+    and the ticks in which the predictor would have skipped the drive
+    element that was selected. The replay continues with the selected
+    element, such that the later consequences of a misprediction are not
+    covered. All senses of the trace are taken to be pure.
+
+    @param filename: The name of the trace file.
+    @type filename: string
+    @param plan: Name of the plan (complete path + file + extension).
+    @type plan: string
+    @param log: java.util.logging.Logger instance
+    @type log: java.util.logging.Logger
+    @param max_ticks: The maximum number of mispredictions that are
+        listed in the report.
+    @type max_ticks: int
+    @return: The report.
+    @rtype: string
+    """
+    replayer = TraceReplayer(filename, plan, log, 1)
+    agent = replayer.getAgent()
+    predictor = TriggerPredictor(agent, min_rate, min_samples, recheck,
+                                 window, 1, max_ticks)
+    agent.addTickListener(predictor)
+    try:
+        replay = replayer.run()
+    finally:
+        agent.removeTickListener(predictor)
+        predictor.restore()
+    calls = replayer.getSenseCalls()
+    saved = predictor.saved_calls
+    if calls:
+        percent = saved * 100.0 / calls
+    else:
+        percent = 0.0
+    lines = ["Replayed %d ticks, %d diverged from the trace" % \
+             (replay.ticks, replay.diverged_ticks),
+             "Sense calls: %d, saved by prediction: %d (%.1f%%)" % \
+             (calls, saved, percent),
+             "Predictor: %s" % predictor.getStats()]
+    for tick, name in predictor.getMispredictions():
+        lines.append("  tick %d: skipped '%s', which was selected" % \
+                     (tick, name))
+    return '\n'.join(lines)
@@ -0,0 +1,601 @@
+"""A performance regression gate for the engine.
+
+The benchmark runs a fixed set of workloads on generated plans and a
+behaviour whose senses and actions cost next to nothing, such that it
+measures the engine alone:
+
+  - C{parse}: L{SPOSH.LAPParser.parse} of a large plan,
+  - C{build}: L{SPOSH.PlanBuilder.buildAside} of that plan,
+  - C{follow-shallow}, C{follow-deep}, C{follow-wide}:
+    L{SPOSH.Agent.followDrive} on a plan with drives that fire action
+    patterns right away, on a plan with long chains of competences, and
+    on a plan with many drives and competence elements whose triggers
+    fail.
+
+Each workload is run several times after a warm-up run. The throughput
+of a run is the number of operations (parses, builds or ticks) per
+second, summarised by the median and the median absolute deviation of the
+runs. The memory of a workload is the estimated footprint of its built
+plan (see L{SPOSH.memreport.elementFootprint}), which does not depend on
+the run. The results are compared with a baseline file, and a workload
+regresses if its median throughput falls below the baseline by more than
+a threshold, or if its memory grows by more than another threshold. It is
+run as a script::
+
+    jython regressbench.py [-r runs] [-t threshold] [-m threshold] [-w]
+                           baseline.json
+
+which prints the report and exits with status 1 if any workload
+regresses, or 2 if the baseline cannot be read. With C{-w}, the results
+are written to the baseline file instead, which is meant to be done on
+the reference machine and committed.
+
+The baseline is a JSON file, which is read and written by this module as
+Jython does not provide the json module::
+
+    {"version": 1,
+     "workloads": {"parse": {"median": 35.2, "mad": 0.4, "bytes": 0,
+                             "unit": "parses/s"}, ...}}
+"""
+
+# Python modules
+import sys
+import time
+
+# POSH modules
+from agent import Agent
+from behaviour import Behaviour
+from lapparser import LAPParser
+from memreport import elementFootprint
+
+BASELINE_VERSION = 1
+# the relative loss of throughput, and growth of memory, that regresses
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_MEMORY_THRESHOLD = 0.05
+DEFAULT_RUNS = 5
+
+# name -> (drives, depth of the competence chains, width of the
+#          competences, operations per run)
+WORKLOADS = (
+    ("parse", (40, 6, 6, 3)),
+    ("build", (40, 6, 6, 10)),
+    ("follow-shallow", (8, 0, 1, 5000)),
+    ("follow-deep", (4, 16, 2, 5000)),
+    ("follow-wide", (64, 2, 16, 2000)),
+)
+
+
+class BenchBehaviour(Behaviour):
+    """A behaviour with senses and actions that do no work.
+
+    C{yes} and C{no} return 1 and 0, C{level} counts up from 0 to 99 with
+    every call, and C{done} returns 0. The actions return 1.
+    """
+    def __init__(self, log):
+        Behaviour.__init__(self, log)
+        self._senses = ["yes", "no", "level", "done"]
+        self._actions = ["act0", "act1", "act2"]
+        self._level = 0
+
+    def yes(self):
+        return 1
+
+    def no(self):
+        return 0
+
+    def level(self):
+        self._level = (self._level + 1) % 100
+        return self._level
+
+    def done(self):
+        return 0
+
+    def act0(self):
+        return 1
+
+    def act1(self):
+        return 1
+
+    def act2(self):
+        return 1
+
+
+def planText(drives, depth, width):
+    """Returns the text of a generated plan.
+
+    Each drive element but the last has a trigger that fails. Its root
+    is a chain of C{depth} competences, the last one of which descends
+    into an action pattern, or the action pattern itself if the depth is
+    0. Each competence has C{width} elements, all but the last of which
+    have triggers that fail.
+
+    @param drives: The number of drive elements, one per priority.
+    @type drives: int
+    @param depth: The length of the competence chains.
+    @type depth: int
+    @param width: The number of elements of each competence.
+    @type width: int
+    @return: The plan, in the LAP format.
+    @rtype: string
+    """
+    lines = ["(", '  (documentation "bench" "regressbench" "generated")']
+    roots = []
+    for i in range(drives):
+        lines.append("  (AP ap%d (act0 act1 (level 50 <) act2))" % i)
+        for k in range(depth):
+            if k + 1 < depth:
+                target = "c%d_%d" % (i, k + 1)
+            else:
+                target = "ap%d" % i
+            elements = []
+            for j in range(width - 1):
+                elements.append("     ((e%d_%d_%d (trigger ((level %d >) " \
+                                "(no))) ap%d))" % (i, k, j, j, i))
+            elements.append("     ((e%d_%d_%d (trigger ((yes) (level 100 <)))" \
+                            " %s))" % (i, k, width - 1, target))
+            lines.append("  (C c%d_%d nil (goal ((done))) (elements" % (i, k))
+            lines.extend(elements)
+            lines.append("  ))")
+        if depth:
+            roots.append("c%d_0" % i)
+        else:
+            roots.append("ap%d" % i)
+    lines.append("  (SDC life (goal ((done))) (drives")
+    for i in range(drives):
+        if i + 1 < drives:
+            trigger = "((level %d >) (no))" % i
+        else:
+            trigger = "((yes))"
+        lines.append("     ((d%d (trigger %s) %s))" % (i, trigger, roots[i]))
+    lines.append("  ))")
+    lines.append(")")
+    return "\n".join(lines)
+
+
+def _median(values):
+    """Returns the median of the values.
+    """
+    values = list(values)
+    values.sort()
+    middle = len(values) / 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def robustStats(values):
+    """Returns the median and the median absolute deviation of the values.
+
+    @param values: The values, at least one.
+    @type values: sequence of float
+    @rtype: (float, float)
+    """
+    median = _median(values)
+    return median, _median([abs(value - median) for value in values])
+
+
+def _footprint(drive_collection):
+    """Returns the estimated bytes of a built plan.
+    """
+    size = 0
+    for count, total in elementFootprint(drive_collection).values():
+        size = size + total
+    return size
+
+
+def _runParse(text, agent, operations):
+    """Parses the plan the given number of times.
+
+    @return: The seconds of the run and the bytes of the workload.
+    """
+    parser = LAPParser()
+    start = time.time()
+    for i in xrange(operations):
+        parser.parse(text)
+    return time.time() - start, 0
+
+
+def _runBuild(text, agent, operations):
+    """Builds the plan the given number of times, each time from a fresh
+    parse, which is not timed.
+    """
+    parser = LAPParser()
+    seconds, size = 0.0, 0
+    for i in xrange(operations):
+        plan_builder = parser.parse(text)
+        start = time.time()
+        dc, timer = plan_builder.buildAside(agent)
+        seconds = seconds + time.time() - start
+    return seconds, _footprint(dc)
+
+
+def _runFollow(text, agent, operations):
+    """Runs the given number of ticks of the agent.
+    """
+    follow = agent.followDrive
+    start = time.time()
+    for i in xrange(operations):
+        follow()
+    return time.time() - start, _footprint(agent.getDriveCollection())
+
+
+_RUNNERS = {"parse": (_runParse, "parses/s"),
+            "build": (_runBuild, "builds/s")}
+
+
+def runWorkload(name, log, runs = DEFAULT_RUNS):
+    """Runs a workload several times after a warm-up run.
+
+    @param name: The name of the workload, as given in L{WORKLOADS}.
+    @type name: string
+    @param log: java.util.logging.Logger instance
+    @type log: java.util.logging.Logger
+    @param runs: The number of measured runs.
+    @type runs: int
+    @return: The median and median absolute deviation of the throughput,
+        the bytes of the workload, and the unit of the throughput.
+    @rtype: dictionary, string -> float, long or string
+    @raise KeyError: If the workload is not known.
+    """
+    for workload, config in WORKLOADS:
+        if workload == name:
+            break
+    else:
+        raise KeyError, "Unknown workload '%s'" % name
+    drives, depth, width, operations = config
+    text = planText(drives, depth, width)
+    runner, unit = _RUNNERS.get(name, (_runFollow, "ticks/s"))
+    agent = Agent([BenchBehaviour(log)], "<%s>" % name, log,
+                  plan_builder = LAPParser().parse(text))
+    agent.setSteppedTimer()
+    agent.reset()
+    runner(text, agent, operations)
+    throughputs = []
+    for i in range(runs):
+        seconds, size = runner(text, agent, operations)
+        throughputs.append(operations / max(seconds, 1e-9))
+    median, mad = robustStats(throughputs)
+    return {"median": median, "mad": mad, "bytes": size, "unit": unit}
+
+
+def compare(results, baseline, threshold = DEFAULT_THRESHOLD,
+            memory_threshold = DEFAULT_MEMORY_THRESHOLD):
+    """Compares the results of the workloads with the baseline.
+
+    @param results: The results, by workload name, as returned by
+        L{runWorkload}.
+    @type results: dictionary
+    @param baseline: The baseline results, in the same form.
+    @type baseline: dictionary
+    @param threshold: The relative loss of median throughput that
+        regresses.
+    @type threshold: float
+    @param memory_threshold: The relative growth of memory that regresses.
+    @type memory_threshold: float
+    @return: The report, and the names of the regressed workloads.
+    @rtype: (string, list of strings)
+    """
+    lines = ["%-16s%-10s%14s%14s%8s%8s%12s%12s  %s" % (
+        "workload", "unit", "baseline", "median", "mad %", "change",
+        "base bytes", "bytes", "status")]
+    regressed = []
+    for name, config in WORKLOADS:
+        result = results.get(name)
+        if result == None:
+            continue
+        median, mad = result["median"], result["mad"]
+        expected = baseline.get(name)
+        if expected == None:
+            lines.append("%-16s%-10s%14s%14.1f%8.1f%8s%12s%12d  new" % (
+                name, result["unit"], "-", median, 100.0 * mad / median, "-",
+                "-", result["bytes"]))
+            continue
+        base = expected["median"]
+        change = (median - base) / base
+        status = []
+        if change < -threshold:
+            status.append("SLOWER")
+        base_bytes = expected.get("bytes", 0)
+        if base_bytes and \
+           result["bytes"] > base_bytes * (1.0 + memory_threshold):
+            status.append("LARGER")
+        if status:
+            regressed.append(name)
+        lines.append("%-16s%-10s%14.1f%14.1f%8.1f%+7.1f%%%12d%12d  %s" % (
+            name, result["unit"], base, median, 100.0 * mad / median,
+            100.0 * change, base_bytes, result["bytes"],
+            " ".join(status) or "ok"))
+    lines.append("Regression thresholds: %.0f%% throughput, %.0f%% memory" % \
+                 (100.0 * threshold, 100.0 * memory_threshold))
+    if regressed:
+        lines.append("Regressed: %s" % ", ".join(regressed))
+    return "\n".join(lines), regressed
+
+
+def _jsonString(string):
+    """Returns a string as a JSON string.
+    """
+    string = string.replace('\\', '\\\\').replace('"', '\\"')
+    return '"%s"' % string.replace('\n', '\\n').replace('\t', '\\t')
+
+
+def writeJson(value, indent = ""):
+    """Returns the JSON text of a value.
+
+    Only dictionaries with string keys, lists, tuples, strings, numbers
+    and None are supported. The keys of dictionaries are sorted.
+
+    @param value: The value.
+    @type value: dictionary, list, tuple, string, int, long, float or None
+    @param indent: The indentation of the value's lines after the first.
+    @type indent: string
+    @return: The JSON text.
+    @rtype: string
+    @raise ValueError: If a value cannot be written.
+    """
+    if value == None:
+        return "null"
+    kind = type(value)
+    if kind == type(""):
+        return _jsonString(value)
+    elif kind == type(0) or kind == type(0L):
+        return "%d" % value
+    elif kind == type(0.0):
+        return repr(value)
+    elif kind == type({}):
+        keys = value.keys()
+        keys.sort()
+        inner = indent + "  "
+        items = ["%s%s: %s" % (inner, _jsonString(key),
+                               writeJson(value[key], inner)) for key in keys]
+        if not items:
+            return "{}"
+        return "{\n%s\n%s}" % (",\n".join(items), indent)
+    elif kind == type([]) or kind == type(()):
+        return "[%s]" % ", ".join([writeJson(item, indent) \
+                                   for item in value])
+    raise ValueError, "Cannot write %s as JSON" % kind
+
+
+class _JsonReader:
+    """A reader of JSON text, by recursive descent.
+    """
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f',
+                'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, text):
+        self._text = text
+        self._pos = 0
+
+    def error(self, message):
+        raise ValueError, "%s at position %d of the JSON text" % \
+              (message, self._pos)
+
+    def _skip(self):
+        """Skips whitespace and returns the next character, or ''.
+        """
+        text, pos = self._text, self._pos
+        while pos < len(text) and text[pos] in " \t\r\n":
+            pos = pos + 1
+        self._pos = pos
+        return text[pos:pos + 1]
+
+    def _expect(self, char):
+        if self._skip() != char:
+            self.error("Expected '%s'" % char)
+        self._pos = self._pos + 1
+
+    def read(self):
+        """Reads the whole text as a single value.
+        """
+        value = self.value()
+        if self._skip():
+            self.error("Unexpected text")
+        return value
+
+    def value(self):
+        """Reads the next value.
+        """
+        char = self._skip()
+        if char == '{':
+            return self._object()
+        elif char == '[':
+            return self._array()
+        elif char == '"':
+            return self._string()
+        for word, value in (("null", None), ("true", 1), ("false", 0)):
+            if self._text[self._pos:self._pos + len(word)] == word:
+                self._pos = self._pos + len(word)
+                return value
+        return self._number()
+
+    def _object(self):
+        self._pos = self._pos + 1
+        result = {}
+        if self._skip() == '}':
+            self._pos = self._pos + 1
+            return result
+        while 1:
+            if self._skip() != '"':
+                self.error("Expected a string key")
+            key = self._string()
+            self._expect(':')
+            result[key] = self.value()
+            char = self._skip()
+            self._pos = self._pos + 1
+            if char == '}':
+                return result
+            elif char != ',':
+                self.error("Expected ',' or '}'")
+
+    def _array(self):
+        self._pos = self._pos + 1
+        result = []
+        if self._skip() == ']':
+            self._pos = self._pos + 1
+            return result
+        while 1:
+            result.append(self.value())
+            char = self._skip()
+            self._pos = self._pos + 1
+            if char == ']':
+                return result
+            elif char != ',':
+                self.error("Expected ',' or ']'")
+
+    def _string(self):
+        text = self._text
+        pos = self._pos + 1
+        chars = []
+        while 1:
+            if pos >= len(text):
+                self.error("Unterminated string")
+            char = text[pos]
+            if char == '"':
+                break
+            elif char == '\\':
+                escape = text[pos + 1:pos + 2]
+                if escape == 'u':
+                    chars.append(unichr(int(text[pos + 2:pos + 6], 16)))
+                    pos = pos + 6
+                    continue
+                if not self._ESCAPES.has_key(escape):
+                    self._pos = pos
+                    self.error("Invalid escape")
+                chars.append(self._ESCAPES[escape])
+                pos = pos + 2
+                continue
+            chars.append(char)
+            pos = pos + 1
+        self._pos = pos + 1
+        return str("".join(chars))
+
+    def _number(self):
+        text = self._text
+        start = pos = self._pos
+        while pos < len(text) and text[pos] in "+-0123456789.eE":
+            pos = pos + 1
+        number = text[start:pos]
+        if not number:
+            self.error("Expected a value")
+        self._pos = pos
+        try:
+            if "." in number or "e" in number or "E" in number:
+                return float(number)
+            return int(number)
+        except ValueError:
+            self.error("Invalid number '%s'" % number)
+
+
+def readJson(text):
+    """Returns the value of a JSON text.
+
+    Strings are returned as plain strings, and true and false as 1 and 0.
+
+    @param text: The JSON text.
+    @type text: string
+    @rtype: dictionary, list, string, int, float or None
+    @raise ValueError: If the text is not valid JSON.
+    """
+    return _JsonReader(text).read()
+
+
+def readBaseline(filename):
+    """Reads the results of a baseline file.
+
+    @param filename: The name of the baseline file.
+    @type filename: string
+    @return: The results by workload name.
+    @rtype: dictionary
+    @raise IOError: If the file cannot be read.
+    @raise ValueError: If the file is not a baseline of this version.
+    """
+    baseline = readJson(open(filename).read())
+    if type(baseline) != type({}) or \
+       baseline.get("version") != BASELINE_VERSION or \
+       type(baseline.get("workloads")) != type({}):
+        raise ValueError, "'%s' is not a version %d baseline" % \
+              (filename, BASELINE_VERSION)
+    return baseline["workloads"]
+
+
+def writeBaseline(filename, results):
+    """Writes the results to a baseline file.
+
+    @param filename: The name of the baseline file.
+    @type filename: string
+    @param results: The results by workload name.
+    @type results: dictionary
+    """
+    output = open(filename, "w")
+    output.write(writeJson({"version": BASELINE_VERSION,
+                            "workloads": results}) + "\n")
+    output.close()
+
+
+def main(args):
+    """Runs the workloads and compares them with the baseline given by
+    the command line arguments.
+
+    @param args: The arguments, "[-r runs] [-t threshold] [-m threshold]
+        [-w] baseline".
+    @type args: list of strings
+    @return: The exit status: 0 if no workload regressed, 1 if any did,
+        and 2 on wrong arguments or if the baseline cannot be read.
+    @rtype: int
+    """
+    runs, threshold = DEFAULT_RUNS, DEFAULT_THRESHOLD
+    memory_threshold, write, filename = DEFAULT_MEMORY_THRESHOLD, 0, None
+    i = 0
+    try:
+        while i < len(args):
+            if args[i] in ("-r", "-t", "-m") and i + 1 < len(args):
+                if args[i] == "-r":
+                    runs = int(args[i + 1])
+                elif args[i] == "-t":
+                    threshold = float(args[i + 1])
+                else:
+                    memory_threshold = float(args[i + 1])
+                i = i + 2
+            elif args[i] == "-w":
+                write = 1
+                i = i + 1
+            elif filename == None:
+                filename = args[i]
+                i = i + 1
+            else:
+                filename = None
+                break
+    except ValueError:
+        filename = None
+    if filename == None or runs < 1:
+        print "Usage: regressbench.py [-r runs] [-t threshold] " \
+              "[-m threshold] [-w] baseline.json"
+        return 2
+    baseline = {}
+    if not write:
+        try:
+            baseline = readBaseline(filename)
+        except (IOError, ValueError), msg:
+            print "Error: %s" % msg
+            return 2
+    # Java modules
+    from java.util.logging import Logger
+    log = Logger.getLogger("regressbench")
+    results = {}
+    for name, config in WORKLOADS:
+        results[name] = runWorkload(name, log, runs)
+    text, regressed = compare(results, baseline, threshold,
+                              memory_threshold)
+    print text
+    if write:
+        writeBaseline(filename, results)
+        print "Baseline written to '%s'" % filename
+        return 0
+    if regressed:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
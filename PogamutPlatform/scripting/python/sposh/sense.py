@@ -7,15 +7,64 @@ from org.python.modules import re
 # POSH modules
 from element import ElementBase
 
-_intMatcher = re.compile(r'^(0|\-?[1-9]\d*|0[0-7]+|0[xX][0-9a-fA-F]+)[lL]?$')
-_floatMatcher = re.compile(r'^\-?(\d*\.\d+|\d+\.)([eE][\+\-]?\d+)?$')
-_boolMatcher = re.compile(r'^[Tt]rue|[Ff]alse$')
+# the patterns of int, float and bool values, compiled on first use
+_valuePatterns = (r'^(0|\-?[1-9]\d*|0[0-7]+|0[xX][0-9a-fA-F]+)[lL]?$',
+                  r'^\-?(\d*\.\d+|\d+\.)([eE][\+\-]?\d+)?$',
+                  r'^[Tt]rue|[Ff]alse$')
+_valueMatchers = None
+
+def convertValue(value):
+    """Converts the given string to whatever is possible.
+
+    @param value: The value to convert.
+    @type value: string
+    @return: The same value, only converted.
+    @rtype: int, float, bool, string or None
+    """
+    global _valueMatchers
+    if not value:
+        return None
+    if not _valueMatchers:
+        _valueMatchers = map(re.compile, _valuePatterns)
+    intMatcher, floatMatcher, boolMatcher = _valueMatchers
+    if intMatcher.match(value):
+        return int(value)
+    elif floatMatcher.match(value):
+        return float(value)
+    elif boolMatcher.match(value):
+        if value[0] in 'Tt':
+            return 1
+        else:
+            return 0
+    else:
+        return value
+
+def fireSenses(senses):
+    """Fires the given senses until one of them fails.
+
+    @param senses: The senses to fire.
+    @type senses: sequence of L{SPOSH.Sense}
+    @return: If all senses evaluated to 1.
+    @rtype: boolean
+    """
+    for sense in senses:
+        if not sense.fire():
+            return 0
+    return 1
+
 
 class Sense(ElementBase):
     """A sense / sense-act as a thin wrapper around a behaviour's
     sense / sense-act method.
 
     """
+    # the threshold index that answers the comparison, if any
+    _thresholds = None
+    _position = 0
+    # the readings of the current tick, by sense name, if the sense
+    # method is called at most once per tick
+    _readings = None
+
     def __init__(self, agent, sense_name, value = None, predicate = None):
         """Picks the given sense or sense-act from the given agent.
 
@@ -43,12 +92,12 @@ class Sense(ElementBase):
         beh_dict = agent.getBehaviourDict()
         self._sense = beh_dict.getSense(sense_name)
         behaviour = beh_dict.getSenseBehaviour(sense_name)
-        self._name = "%s.%s" % (behaviour.getName(), sense_name)
+        self._name = intern("%s.%s" % (behaviour.getName(), sense_name))
         self._value = self._convertValue(value)
         if not predicate:
             self._pred = "=="
         else:
-            self._pred = predicate
+            self._pred = intern(predicate)
         self.debug("Created")
     
     def fire(self):
@@ -58,7 +107,39 @@ class Sense(ElementBase):
         @rtype: boolean
         """
         self.debug("Firing")
-        pred, value, result = self._pred, self._value, self._sense()
+        if self._thresholds:
+            return self._thresholds.holds(self._position, self._pred)
+        if self._readings is not None:
+            return self.compare(self.read())
+        return self.compare(self._sense())
+
+    def read(self):
+        """Returns the result of the sense method.
+
+        If the sense has readings (see L{setReadings}), the method is only
+        called if they do not hold a result of the sense yet.
+
+        @return: The result of the sense method.
+        @rtype: any
+        """
+        readings = self._readings
+        if readings is None:
+            return self._sense()
+        name = self._reading_name
+        if readings.has_key(name):
+            return readings[name]
+        result = readings[name] = self._sense()
+        return result
+
+    def compare(self, result):
+        """Compares the given result of the sense method to the value.
+
+        @param result: The result of the sense method.
+        @type result: any
+        @return: If the result compares to the value by the predicate.
+        @rtype: boolean
+        """
+        pred, value = self._pred, self._value
         if value == None:
             if result:
                 return 1
@@ -81,33 +162,89 @@ class Sense(ElementBase):
                 return 1
             else:
                 return 0
-    
+
+    def setThresholdIndex(self, thresholds, position):
+        """Sets the threshold index that answers the comparison.
+
+        @param thresholds: The index, or None to compare the result of
+            the sense whenever fired.
+        @type thresholds: L{SPOSH.threshold.ThresholdIndex} or None
+        @param position: The position of the sense's value in the index.
+        @type position: int
+        """
+        self._thresholds, self._position = thresholds, position
+
+    def setReadings(self, readings):
+        """Sets the readings of the current tick, which the sense shares
+        with the decision cache (see L{SPOSH.decisioncache}).
+
+        If set, the sense reads its result from them by L{read}.
+        Whoever sets the readings empties them at the start of each tick.
+
+        @param readings: The readings, or None to call the sense method
+            whenever fired.
+        @type readings: dictionary, sense name -> result, or None
+        """
+        self._readings = readings
+        self._reading_name = self.getSenseName()
+
+    def getMethod(self):
+        """Returns the method that the sense calls.
+
+        @rtype: callable
+        """
+        return self._sense
+
+    def setMethod(self, method):
+        """Replaces the method that the sense calls, like by a wrapper
+        of the sense method.
+
+        @param method: The method, taking no arguments.
+        @type method: callable
+        """
+        self._sense = method
+
+    def getSenseName(self):
+        """Returns the name of the sense in the behaviour dictionary.
+
+        The name is taken from the log domain, "Sense.[sense_name]".
+
+        @return: The sense name.
+        @rtype: string
+        """
+        return self._domain[6:]
+
+    def getValue(self):
+        """Returns the value that the sense result is compared to.
+
+        @return: The converted value, or None if the result of the sense
+            only needs to evaluate to 1.
+        @rtype: int, float, string or None
+        """
+        return self._value
+
+    def getPredicate(self):
+        """Returns the predicate used to compare the sense result.
+
+        @return: "==", "!=", "<", ">", "<=" or ">=".
+        @rtype: string
+        """
+        return self._pred
+
     def _convertValue(self, value):
         """Converts the given string to whatever is possible.
 
-        @param value: The value to convert.
-        @type value: string
-        @return: The same value, only converted.
-        @rtype: int, float, bool, string or None
-        """
-        if not value:
-            return None
-        elif _intMatcher.match(value):
-            return int(value)
-        elif _floatMatcher.match(value):
-            return float(value)
-        elif _boolMatcher.match(value):
-            if value:
-                return 1
-            else:
-                return 0
-        else:
-            return value
+        See L{convertValue}.
+        """
+        return convertValue(value)
         
 
 class Trigger(ElementBase):
     """A conjunction of senses and sense-acts, acting as a trigger.
     """
+    # the result evaluated ahead of firing, or None
+    _speculated = None
+
     def __init__(self, agent, senses):
         """Initialises the trigger.
 
@@ -123,6 +260,35 @@ class Trigger(ElementBase):
         self._senses = senses
         self.debug("Created")
 
+    def getSenses(self):
+        """Returns the senses / sense-acts of the trigger.
+
+        @return: The senses / sense-acts, in their order of evaluation.
+        @rtype: Sequence of L{SPOSH.Sense}
+        """
+        return self._senses
+
+    def setSpeculated(self, result):
+        """Sets the result of the trigger, evaluated ahead of firing.
+
+        The result is returned by the next call to L{fire}, instead of
+        evaluating the senses.
+
+        @param result: The result of the trigger.
+        @type result: boolean
+        """
+        self._speculated = result
+
+    def clearSpeculated(self):
+        """Discards the speculated result of the trigger.
+
+        @return: If a speculated result had not yet been used.
+        @rtype: boolean
+        """
+        unused = self._speculated != None
+        self._speculated = None
+        return unused
+
     def fire(self):
         """Fires the trigger.
 
@@ -133,6 +299,10 @@ class Trigger(ElementBase):
         @rtype: boolean
         """
         self.debug("Firing")
+        speculated = self._speculated
+        if speculated != None:
+            self._speculated = None
+            return speculated
         for sense in self._senses:
             if not sense.fire():
                 self.debug("Sense '%s' failed" % sense.getName())
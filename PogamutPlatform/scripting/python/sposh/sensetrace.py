@@ -0,0 +1,607 @@
+"""Recording of sense / action traces and their offline replay.
+
+A L{TraceRecorder} wraps all senses and actions of a behaviour dictionary
+and records, for every tick of the agent, the timer time, the values
+returned by the senses, and the actions that were performed together with
+their results. The recorded data is buffered in plain lists on the tick
+path and written to a compact columnar file every few ticks.
+
+A L{TraceReplayer} reads such a file and drives an agent with stub
+behaviours that return the recorded sense values, as fast as possible
+and without the game. It compares the stream of actions that the (possibly
+changed) plan performs with the recorded one and returns a
+L{ReplayReport} that tells where the two diverge.
+
+File format
+-----------
+  All numbers are big-endian. The file starts with a header::
+
+    'SPTR' version:H
+    senses:H  ( name behaviour )*
+    actions:H ( name behaviour )*
+
+  where every string is given by its length (H) followed by its
+  characters. The header is followed by any number of blocks::
+
+    ticks:i sense_events:i action_events:i new_strings:i
+    new_strings * string
+    ticks * time:d
+    ticks * sense_count:i
+    ticks * action_count:i
+    sense_events * sense_id:H
+    sense_events * kind:B
+    sense_events * value:d
+    action_events * action_id:H
+    action_events * result:B
+
+  The kind of a sense value is one of C{KIND_NONE}, C{KIND_INT},
+  C{KIND_FLOAT} or C{KIND_STRING}. Booleans, including
+  C{java.lang.Boolean}, are stored as C{KIND_INT} 1 or 0. Strings are
+  stored as indices into a string table that grows by the new strings
+  given in every block.
+"""
+
+# Python modules
+import struct
+import types
+
+# Java modules
+from java.lang import Boolean
+
+# POSH modules
+from agent import Agent
+from behaviour import Behaviour
+from timer import TimerBase
+
+TRACE_MAGIC = 'SPTR'
+TRACE_VERSION = 1
+
+# the kinds of recorded sense values
+KIND_NONE = 0
+KIND_INT = 1
+KIND_FLOAT = 2
+KIND_STRING = 3
+
+# the type of booleans, if the Python runtime has one
+_BOOLEAN_TYPE = getattr(types, 'BooleanType', None)
+
+
+def _packString(string):
+    """Returns the given string, packed as length + characters.
+
+    @param string: The string to pack.
+    @type string: string
+    @return: The packed string.
+    @rtype: string
+    """
+    return struct.pack('>H', len(string)) + string
+
+
+class _RecordedSense:
+    """A callable that wraps a sense method and records its results.
+
+    The results are encoded when they are recorded, such that mutable
+    results are recorded as they were returned.
+    """
+    def __init__(self, recorder, sense_id, method):
+        self._ids = recorder._sense_ids
+        self._kinds = recorder._sense_kinds
+        self._numbers = recorder._sense_numbers
+        self._encode = recorder._encodeValue
+        self._id = sense_id
+        self._method = method
+
+    def __call__(self):
+        value = self._method()
+        self._ids.append(self._id)
+        kind, number = self._encode(value)
+        self._kinds.append(kind)
+        self._numbers.append(number)
+        return value
+
+
+class _RecordedAction:
+    """A callable that wraps an action method and records its results.
+    """
+    def __init__(self, recorder, action_id, method):
+        self._ids = recorder._action_ids
+        self._results = recorder._action_results
+        self._id = action_id
+        self._method = method
+
+    def __call__(self):
+        result = self._method()
+        self._ids.append(self._id)
+        self._results.append(result)
+        return result
+
+
+class TraceRecorder:
+    """Records the senses and actions of an agent to a trace file.
+
+    The recorder is given to the L{SPOSH.Agent} on construction, which
+    attaches it to its behaviour dictionary and adds it as a tick
+    listener. Recording stops when L{close} is called.
+    """
+    def __init__(self, filename, flush_ticks = 256):
+        """Initialises the recorder.
+
+        @param filename: The name of the trace file to write.
+        @type filename: string
+        @param flush_ticks: The number of ticks that are buffered before
+            they are written to the file.
+        @type flush_ticks: int
+        """
+        self._filename = filename
+        self._flush_ticks = flush_ticks
+        self._file = None
+        # string -> index, for string sense values
+        self._strings = {}
+        self._new_strings = []
+        # the column buffers. The wrappers of senses and actions hold
+        # references to the lists, so they are only ever emptied in place.
+        self._tick_times, self._sense_counts, self._action_counts = [], [], []
+        self._sense_ids, self._sense_kinds, self._sense_numbers = [], [], []
+        self._action_ids, self._action_results = [], []
+        # the number of events that belong to completed ticks
+        self._senses_done, self._actions_done = 0, 0
+
+    def attach(self, beh_dict):
+        """Wraps all senses and actions of the given behaviour dictionary
+        and writes the trace file header.
+
+        This needs to happen before the plan is built.
+
+        @param beh_dict: The behaviour dictionary to record.
+        @type beh_dict: L{SPOSH.BehaviourDict}
+        """
+        senses = beh_dict.getSenseNames()
+        actions = beh_dict.getActionNames()
+        senses.sort()
+        actions.sort()
+        header = [TRACE_MAGIC, struct.pack('>H', TRACE_VERSION),
+                  struct.pack('>H', len(senses))]
+        for sense_id in range(len(senses)):
+            name = senses[sense_id]
+            header.append(_packString(name))
+            header.append(_packString(
+                beh_dict.getSenseBehaviour(name).getName()))
+            beh_dict.replaceSense(name, _RecordedSense(
+                self, sense_id, beh_dict.getSense(name)))
+        header.append(struct.pack('>H', len(actions)))
+        for action_id in range(len(actions)):
+            name = actions[action_id]
+            header.append(_packString(name))
+            header.append(_packString(
+                beh_dict.getActionBehaviour(name).getName()))
+            beh_dict.replaceAction(name, _RecordedAction(
+                self, action_id, beh_dict.getAction(name)))
+        self._file = open(self._filename, 'wb')
+        self._file.write(''.join(header))
+
+    def tickStart(self, agent):
+        """Records the timer time at the start of a tick.
+
+        @param agent: The recorded agent.
+        @type agent: L{SPOSH.Agent}
+        """
+        self._tick_times.append(agent.getTimer().time())
+
+    def tickEnd(self, agent, result):
+        """Closes the record of the current tick.
+
+        @param agent: The recorded agent.
+        @type agent: L{SPOSH.Agent}
+        @param result: The result of the tick (ignored).
+        @type result: int
+        """
+        senses, actions = len(self._sense_ids), len(self._action_ids)
+        self._sense_counts.append(senses - self._senses_done)
+        self._action_counts.append(actions - self._actions_done)
+        self._senses_done, self._actions_done = senses, actions
+        if len(self._tick_times) >= self._flush_ticks:
+            self.flush()
+
+    def _encodeValue(self, value):
+        """Returns the kind and the numeric encoding of a sense value.
+
+        @param value: The value returned by a sense.
+        @type value: anything
+        @return: (kind, number)
+        @rtype: (int, float)
+        """
+        value_type = type(value)
+        if value_type == types.IntType or value_type == types.LongType:
+            return KIND_INT, float(value)
+        elif value_type == types.FloatType:
+            return KIND_FLOAT, value
+        elif value == None:
+            return KIND_NONE, 0.0
+        elif value_type == _BOOLEAN_TYPE:
+            return KIND_INT, float(int(value))
+        elif isinstance(value, Boolean):
+            return KIND_INT, float(value.booleanValue() and 1 or 0)
+        # anything else is stored as its string representation
+        value = str(value)
+        index = self._strings.get(value)
+        if index == None:
+            index = len(self._strings)
+            self._strings[value] = index
+            self._new_strings.append(value)
+        return KIND_STRING, float(index)
+
+    def flush(self):
+        """Writes all buffered and completed ticks to the trace file.
+        """
+        ticks = len(self._sense_counts)
+        if not ticks or not self._file:
+            return
+        n_senses, n_actions = self._senses_done, self._actions_done
+        results = []
+        for result in self._action_results[:n_actions]:
+            if result:
+                results.append(1)
+            else:
+                results.append(0)
+        block = [struct.pack('>4i', ticks, n_senses, n_actions,
+                             len(self._new_strings))]
+        for string in self._new_strings:
+            block.append(_packString(string))
+        block.append(struct.pack('>%dd' % ticks, *self._tick_times[:ticks]))
+        block.append(struct.pack('>%di' % ticks, *self._sense_counts))
+        block.append(struct.pack('>%di' % ticks, *self._action_counts))
+        block.append(struct.pack('>%dH' % n_senses,
+                                 *self._sense_ids[:n_senses]))
+        block.append(struct.pack('>%dB' % n_senses,
+                                 *self._sense_kinds[:n_senses]))
+        block.append(struct.pack('>%dd' % n_senses,
+                                 *self._sense_numbers[:n_senses]))
+        block.append(struct.pack('>%dH' % n_actions,
+                                 *self._action_ids[:n_actions]))
+        block.append(struct.pack('>%dB' % n_actions, *results))
+        self._file.write(''.join(block))
+        # keep the events of a tick that is still in progress
+        self._new_strings = []
+        del self._tick_times[:ticks]
+        del self._sense_counts[:], self._action_counts[:]
+        del self._sense_ids[:n_senses], self._sense_kinds[:n_senses]
+        del self._sense_numbers[:n_senses]
+        del self._action_ids[:n_actions], self._action_results[:n_actions]
+        self._senses_done, self._actions_done = 0, 0
+
+    def close(self):
+        """Writes the remaining ticks and closes the trace file.
+        """
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class TraceReader:
+    """Reads a trace file as written by L{TraceRecorder}.
+    """
+    def __init__(self, filename):
+        """Reads the given trace file.
+
+        @param filename: The name of the trace file.
+        @type filename: string
+        @raise IOError: If the file is not a trace file.
+        """
+        self._data = open(filename, 'rb').read()
+        self._pos = 0
+        if self._read(4) != TRACE_MAGIC:
+            raise IOError, "'%s' is not a sense trace file" % filename
+        version = self._unpack('>H')[0]
+        if version != TRACE_VERSION:
+            raise IOError, "Unsupported trace version %d in '%s'" % \
+                (version, filename)
+        # (name, behaviour name)
+        self.senses = self._readNames()
+        self.actions = self._readNames()
+        # [(time, [(sense, value), ...], [(action, result), ...]), ...]
+        self.ticks = []
+        strings = []
+        while self._pos < len(self._data):
+            self._readBlock(strings)
+
+    def _read(self, length):
+        data = self._data[self._pos:self._pos + length]
+        self._pos += length
+        return data
+
+    def _unpack(self, fmt):
+        return struct.unpack(fmt, self._read(struct.calcsize(fmt)))
+
+    def _readString(self):
+        return self._read(self._unpack('>H')[0])
+
+    def _readNames(self):
+        names = []
+        for i in range(self._unpack('>H')[0]):
+            name = self._readString()
+            names.append((name, self._readString()))
+        return names
+
+    def _readBlock(self, strings):
+        """Reads a single block and appends its ticks to L{ticks}.
+
+        @param strings: The string table, which is extended by the
+            strings of the block.
+        @type strings: list of strings
+        """
+        ticks, n_senses, n_actions, n_strings = self._unpack('>4i')
+        for i in range(n_strings):
+            strings.append(self._readString())
+        times = self._unpack('>%dd' % ticks)
+        sense_counts = self._unpack('>%di' % ticks)
+        action_counts = self._unpack('>%di' % ticks)
+        sense_ids = self._unpack('>%dH' % n_senses)
+        kinds = self._unpack('>%dB' % n_senses)
+        numbers = self._unpack('>%dd' % n_senses)
+        action_ids = self._unpack('>%dH' % n_actions)
+        results = self._unpack('>%dB' % n_actions)
+        sense_idx, action_idx = 0, 0
+        for tick in range(ticks):
+            senses = []
+            for i in range(sense_idx, sense_idx + sense_counts[tick]):
+                kind = kinds[i]
+                if kind == KIND_INT:
+                    value = int(numbers[i])
+                elif kind == KIND_FLOAT:
+                    value = numbers[i]
+                elif kind == KIND_STRING:
+                    value = strings[int(numbers[i])]
+                else:
+                    value = None
+                senses.append((self.senses[sense_ids[i]][0], value))
+            sense_idx += sense_counts[tick]
+            actions = []
+            for i in range(action_idx, action_idx + action_counts[tick]):
+                actions.append((self.actions[action_ids[i]][0], results[i]))
+            action_idx += action_counts[tick]
+            self.ticks.append((long(times[tick]), senses, actions))
+
+
+class ReplayTimer(TimerBase):
+    """A timer that returns the recorded tick times and never waits.
+    """
+    def __init__(self, times):
+        """Initialises the timer with the recorded tick times.
+
+        @param times: The time of each recorded tick.
+        @type times: sequence of long
+        """
+        self._times = times
+        TimerBase.__init__(self)
+
+    def reset(self):
+        self._tick = 0
+
+    def time(self):
+        if self._tick < len(self._times):
+            return self._times[self._tick]
+        return self._times[-1]
+
+    def loopEnd(self):
+        self._tick += 1
+
+    def loopWait(self):
+        pass
+
+    def setLoopFreq(self, loop_freq):
+        pass
+
+
+class _ReplayBehaviour(Behaviour):
+    """A stub behaviour that stands in for a recorded behaviour.
+    """
+    def __init__(self, log, name, pure = 0):
+        Behaviour.__init__(self, log)
+        self._name = name
+        self._actions = []
+        self._senses = []
+        if pure:
+            self._pure_senses = self._senses
+
+    def getName(self):
+        return self._name
+
+
+class _ReplaySense:
+    """A callable that returns the recorded values of a sense.
+    """
+    def __init__(self, replayer, name):
+        self._replayer = replayer
+        self._name = name
+
+    def __call__(self):
+        return self._replayer.senseValue(self._name)
+
+
+class _ReplayAction:
+    """A callable that logs an action and returns its recorded result.
+    """
+    def __init__(self, replayer, name):
+        self._replayer = replayer
+        self._name = name
+
+    def __call__(self):
+        return self._replayer.actionCalled(self._name)
+
+
+class ReplayReport:
+    """The result of replaying a trace.
+    """
+    def __init__(self, ticks, diverged_ticks, divergences, unmatched_senses):
+        """Initialises the report.
+
+        @param ticks: The number of replayed ticks.
+        @type ticks: int
+        @param diverged_ticks: The number of ticks in which the action
+            streams differ.
+        @type diverged_ticks: int
+        @param divergences: A list of (tick, recorded actions,
+            replayed actions) for the (first) ticks in which the action
+            streams differ.
+        @type divergences: list
+        @param unmatched_senses: The number of sense calls for which
+            no recorded value was available in that tick.
+        @type unmatched_senses: int
+        """
+        self.ticks = ticks
+        self.diverged_ticks = diverged_ticks
+        self.divergences = divergences
+        self.unmatched_senses = unmatched_senses
+
+    def diverged(self):
+        """Returns if the replayed action stream differs from the recorded.
+
+        @rtype: boolean
+        """
+        return self.diverged_ticks > 0
+
+    def firstDivergence(self):
+        """Returns the first tick in which the action streams differ.
+
+        @return: (tick, recorded actions, replayed actions) or None.
+        @rtype: tuple or None
+        """
+        if self.divergences:
+            return self.divergences[0]
+        return None
+
+    def __str__(self):
+        lines = ["Replayed %d ticks, %d diverged, %d unmatched sense calls" % \
+                 (self.ticks, self.diverged_ticks, self.unmatched_senses)]
+        if self.divergences:
+            tick, recorded, replayed = self.divergences[0]
+            lines.append("First divergence at tick %d: recorded %s, " \
+                         "replayed %s" % (tick, recorded, replayed))
+        return '\n'.join(lines)
+
+
+class TraceReplayer:
+    """Replays a recorded trace on a plan with stub behaviours.
+
+    Within a tick, a sense returns its recorded values of that tick in
+    order. If the plan calls a sense more often than recorded (or a sense
+    that was not called in that tick), the last value returned for that
+    sense is used again. Actions return their recorded result, or 1 if
+    they were not performed in that tick when recording.
+    """
+    def __init__(self, filename, plan, log, pure = 0):
+        """Reads the trace and builds an agent for the given plan.
+
+        @param filename: The name of the trace file.
+        @type filename: string
+        @param plan: Name of the plan (complete path + file + extension).
+        @type plan: string
+        @param log: java.util.logging.Logger instance
+        @type log: java.util.logging.Logger
+        @param pure: If all senses are declared pure (see
+            L{SPOSH.Behaviour.getPureSenses}), as the recorded values
+            have no side effects. This enables the optimisations for pure
+            senses, which might call the senses differently than when the
+            trace was recorded.
+        @type pure: boolean
+        """
+        self._trace = TraceReader(filename)
+        self._pure = pure
+        behaviours = {}
+        for name, behav_name in self._trace.senses:
+            self._stub(behaviours, log, behav_name)._senses.append(name)
+            setattr(behaviours[behav_name], name, _ReplaySense(self, name))
+        for name, behav_name in self._trace.actions:
+            self._stub(behaviours, log, behav_name)._actions.append(name)
+            setattr(behaviours[behav_name], name, _ReplayAction(self, name))
+        self._agent = Agent(behaviours.values(), plan, log)
+        times = []
+        for tick in self._trace.ticks:
+            times.append(tick[0])
+        if times:
+            self._agent.setTimer(ReplayTimer(times))
+        # sense name -> values; and last value returned
+        self._senses, self._last = {}, {}
+        self._results = {}
+        self._performed = []
+        self._unmatched = 0
+        self._sense_calls = 0
+
+    def _stub(self, behaviours, log, behav_name):
+        if not behaviours.has_key(behav_name):
+            behaviours[behav_name] = _ReplayBehaviour(log, behav_name,
+                                                      self._pure)
+        return behaviours[behav_name]
+
+    def getAgent(self):
+        """Returns the agent that the trace is replayed on.
+
+        @rtype: L{SPOSH.Agent}
+        """
+        return self._agent
+
+    def senseValue(self, name):
+        """Returns the next recorded value of the given sense.
+
+        @param name: The name of the sense.
+        @type name: string
+        """
+        self._sense_calls += 1
+        values = self._senses.get(name)
+        if values:
+            value = values.pop(0)
+            self._last[name] = value
+            return value
+        self._unmatched += 1
+        return self._last.get(name)
+
+    def actionCalled(self, name):
+        """Logs the given action and returns its recorded result.
+
+        @param name: The name of the action.
+        @type name: string
+        """
+        self._performed.append(name)
+        results = self._results.get(name)
+        if results:
+            return results.pop(0)
+        return 1
+
+    def getSenseCalls(self):
+        """Returns the number of sense calls of the replay.
+
+        @rtype: int
+        """
+        return self._sense_calls
+
+    def run(self, max_divergences = 100):
+        """Replays all ticks of the trace and compares the actions.
+
+        @param max_divergences: The maximum number of diverging ticks that
+            are listed in the report.
+        @type max_divergences: int
+        @return: The replay report.
+        @rtype: L{ReplayReport}
+        """
+        self._agent.reset()
+        divergences = []
+        diverged = 0
+        tick_no = 0
+        for tick_time, senses, actions in self._trace.ticks:
+            self._senses.clear()
+            self._results.clear()
+            for name, value in senses:
+                self._senses.setdefault(name, []).append(value)
+            recorded = []
+            for name, result in actions:
+                self._results.setdefault(name, []).append(result)
+                recorded.append(name)
+            self._performed = []
+            self._agent.followDrive()
+            if self._performed != recorded:
+                diverged += 1
+                if len(divergences) < max_divergences:
+                    divergences.append((tick_no, recorded, self._performed))
+            tick_no += 1
+        return ReplayReport(tick_no, diverged, divergences, self._unmatched)
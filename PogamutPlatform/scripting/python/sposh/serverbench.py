@@ -0,0 +1,97 @@
+"""A load generator for the engine server.
+
+The benchmark starts an L{SPOSH.engineserver.EngineServer} for a plan,
+and drives it with an L{SPOSH.engineserver.EngineClient} that stands in
+for a game connector. For groups of different sizes and different
+numbers of pipelined requests, it reports the ticks per second, the
+agent-ticks per second and the mean time from sending a tick to
+receiving its response. It is run as follows::
+
+    print loadReport(plan, senses, actions, log)
+
+The sense readings are random integers between 0 and 100, and are
+generated before the time is measured.
+"""
+
+# Python modules
+import time
+
+# Java modules
+from java.util import Random
+
+# POSH modules
+from engineserver import EngineServer, EngineClient
+
+DEFAULT_SIZES = (10, 100, 1000)
+DEFAULT_DEPTHS = (1, 4, 16)
+
+
+def _randomColumns(n, senses, random):
+    """Returns random readings of the given senses for n agents.
+    """
+    columns = []
+    for sense in senses:
+        column = []
+        for i in xrange(n):
+            column.append(random.nextInt(101))
+        columns.append(column)
+    return columns
+
+
+def loadReport(plan, senses, actions, log, sizes = DEFAULT_SIZES,
+               depths = DEFAULT_DEPTHS, ticks = 100):
+    """Returns a report of the server's throughput and latency.
+
+    @param plan: Name of the plan (complete path + file + extension).
+    @type plan: string
+    @param senses: The names of all senses (and sense-acts) of the plan.
+    @type senses: sequence of strings
+    @param actions: The names of all actions of the plan.
+    @type actions: sequence of strings
+    @param log: java.util.logging.Logger instance
+    @type log: java.util.logging.Logger
+    @param sizes: The numbers of agents per group.
+    @type sizes: sequence of int
+    @param depths: The numbers of pipelined requests.
+    @type depths: sequence of int
+    @param ticks: The number of ticks for each size and depth.
+    @type ticks: int
+    @return: The report.
+    @rtype: string
+    """
+    server = EngineServer({"plan": plan}, log)
+    server.start()
+    client = EngineClient(server.getPort())
+    random = Random(0)
+    lines = ["%8s%8s%14s%18s%14s" % ("agents", "depth", "ticks/s",
+                                     "agent-ticks/s", "latency ms")]
+    try:
+        for n in sizes:
+            group = client.open("plan", n, senses, actions)
+            columns = []
+            for i in range(ticks):
+                columns.append(_randomColumns(n, senses, random))
+            for depth in depths:
+                sent = {}
+                latency = 0.0
+                start = time.time()
+                received = 0
+                for i in range(ticks):
+                    sent[client.sendTick(group, columns[i])] = time.time()
+                    if i - received + 1 >= depth:
+                        request_id = client.receive()[0]
+                        latency = latency + time.time() - sent[request_id]
+                        received = received + 1
+                while received < ticks:
+                    request_id = client.receive()[0]
+                    latency = latency + time.time() - sent[request_id]
+                    received = received + 1
+                elapsed = time.time() - start
+                lines.append("%8d%8d%14.1f%18.0f%14.3f" % (
+                    n, depth, ticks / elapsed, ticks * n / elapsed,
+                    latency * 1000.0 / ticks))
+            client.close(group)
+    finally:
+        client.disconnect()
+        server.stop()
+    return "\n".join(lines)
@@ -0,0 +1,133 @@
+"""Speculative evaluation of drive element triggers while the timer waits.
+
+With a real-time timer, L{SPOSH.RealTimeTimer.loopWait} waits for the
+rest of each loop period. If speculation is enabled (see
+L{SPOSH.Agent.enableSpeculation}), a L{Speculator} uses this idle time to
+evaluate the triggers of the drive elements in their order of priority,
+until the wait ends. The result of each trigger is held by the trigger
+and returned by its next firing in the following tick, rather than
+evaluating its senses. Results that were not used in that tick become
+stale and are discarded at its end.
+
+Only triggers whose senses were all declared speculative (see
+L{SPOSH.Behaviour.getSpeculativeSenses}) are evaluated ahead of time. The
+senses are read a little earlier than the tick in which they are used,
+which the behaviour has to allow by declaring them.
+"""
+
+# Python modules
+import time
+
+
+class Speculator:
+    """Evaluates the triggers of the drive elements ahead of time.
+
+    The speculator is the idle task of the agent's timer, and a tick
+    listener of the agent.
+    """
+    def __init__(self, agent, max_elements = None):
+        """Initialises the speculator for the plan of the given agent.
+
+        @param agent: The agent.
+        @type agent: L{SPOSH.Agent}
+        @param max_elements: The number of drive elements, in their order
+            of priority, whose triggers are evaluated, or None for all.
+        @type max_elements: int or None
+        """
+        self._bdict = agent.getBehaviourDict()
+        self._max_elements = max_elements
+        # (trigger, [(sense, method), ...]) to evaluate, in priority order
+        self._candidates = []
+        # the triggers evaluated for the next tick
+        self._pending = []
+        # triggers evaluated, and how many of them were used or wasted
+        self.speculated, self.used, self.wasted = 0, 0, 0
+        # idle periods that ended before all triggers were evaluated
+        self.interrupted = 0
+        self.prepare(agent.getDriveCollection())
+
+    def prepare(self, drive_collection):
+        """Selects the triggers to evaluate from the given plan.
+
+        @param drive_collection: The root of the plan.
+        @type drive_collection: L{SPOSH.DriveCollection}
+        """
+        self.discard()
+        candidates = []
+        drive_elements = []
+        for priority_element in drive_collection.getElements():
+            drive_elements.extend(priority_element.getElements())
+        if self._max_elements != None:
+            drive_elements = drive_elements[:self._max_elements]
+        for element in drive_elements:
+            trigger = element.getTrigger()
+            if not trigger:
+                continue
+            senses = []
+            for sense in trigger.getSenses():
+                name = sense.getSenseName()
+                if not self._bdict.isSpeculativeSense(name):
+                    break
+                senses.append((sense, self._bdict.getSense(name)))
+            else:
+                candidates.append((trigger, senses))
+        self._candidates = candidates
+
+    def getTriggerCount(self):
+        """Returns the number of triggers that are evaluated ahead of time.
+
+        @rtype: int
+        """
+        return len(self._candidates)
+
+    def idle(self, deadline):
+        """Evaluates triggers until all are evaluated or the deadline is
+        reached.
+
+        @param deadline: The system time (as returned by C{time.time()})
+            at which to return.
+        @type deadline: float
+        """
+        # results of an earlier idle period without a tick are stale
+        self.discard()
+        pending = self._pending
+        for trigger, senses in self._candidates:
+            if time.time() >= deadline:
+                self.interrupted += 1
+                return
+            result = 1
+            for sense, method in senses:
+                if not sense.compare(method()):
+                    result = 0
+                    break
+            trigger.setSpeculated(result)
+            pending.append(trigger)
+            self.speculated += 1
+
+    def tickStart(self, agent):
+        """Does nothing.
+        """
+        pass
+
+    def tickEnd(self, agent, result):
+        """Discards the results that were not used in the tick.
+        """
+        self.discard()
+
+    def discard(self):
+        """Discards the pending results and counts the unused ones.
+        """
+        for trigger in self._pending:
+            if trigger.clearSpeculated():
+                self.wasted += 1
+            else:
+                self.used += 1
+        self._pending = []
+
+    def getStats(self):
+        """Returns a summary of the use of the speculated results.
+
+        @rtype: string
+        """
+        return "speculated: %d; used: %d; wasted: %d; interrupted: %d" % \
+               (self.speculated, self.used, self.wasted, self.interrupted)
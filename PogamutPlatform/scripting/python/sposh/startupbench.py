@@ -0,0 +1,105 @@
+"""A benchmark of the startup of an agent, up to its first tick.
+
+The benchmark measures, in a fresh interpreter, the time to import the
+package, to create the behaviours (including the import of their
+modules), to register the behaviours, to parse and to build the plan,
+and to perform the first call to L{SPOSH.Agent.followDrive}. It is run as
+a script with the plan and the behaviour classes, given by their module
+and class name, which are created with a logger as their only argument::
+
+    jython startupbench.py plan.lap mybehaviours.Bot [...]
+
+The package is imported from the parent directory of this script. As
+the import is only measured once per interpreter, the benchmark is not
+meant to be imported.
+"""
+
+# Python modules
+import os
+import sys
+import time
+
+# the time to first tick that the startup should stay below
+TARGET_MS = 100.0
+
+
+def _ms(start):
+    """Returns the milliseconds since the given time.
+    """
+    return (time.time() - start) * 1000.0
+
+
+def _loadClass(path):
+    """Imports the class given by 'module.Class'.
+    """
+    dot = path.rfind(".")
+    module = __import__(path[:dot], globals(), locals(), [path[dot + 1:]])
+    return getattr(module, path[dot + 1:])
+
+
+def startupReport(plan, class_paths, log):
+    """Starts an agent and returns the report of its startup times.
+
+    @param plan: Name of the plan (complete path + file + extension).
+    @type plan: string
+    @param class_paths: The behaviour classes, as 'module.Class'.
+    @type class_paths: sequence of strings
+    @param log: java.util.logging.Logger instance
+    @type log: java.util.logging.Logger
+    @return: The report, and the time to the end of the first tick
+        in milliseconds.
+    @rtype: (string, float)
+    """
+    times = []
+    start = time.time()
+    sposh = __import__("sposh")
+    times.append(("import sposh", _ms(start)))
+    phase = time.time()
+    behaviours = [_loadClass(path)(log) for path in class_paths]
+    times.append(("create behaviours", _ms(phase)))
+    agent = sposh.Agent(behaviours, plan, log)
+    register, parse, build = agent.getStartupTimes()
+    times.append(("register behaviours", register))
+    times.append(("parse plan", parse))
+    times.append(("build plan", build))
+    phase = time.time()
+    agent.followDrive()
+    times.append(("first followDrive()", _ms(phase)))
+    total = _ms(start)
+    lines = []
+    for name, ms in times:
+        lines.append("%-24s%10.1f ms" % (name, ms))
+    lines.append("%-24s%10.1f ms (target %.0f ms)" % ("time to first tick",
+                                                      total, TARGET_MS))
+    return "\n".join(lines), total
+
+
+def main(args):
+    """Runs the benchmark with the command line arguments.
+
+    @param args: The arguments, "plan module.Class [...]".
+    @type args: list of strings
+    @return: The exit status: 0 if the first tick was reached within the
+        target time, 1 if not, and 2 on wrong arguments.
+    @rtype: int
+    """
+    if len(args) < 2:
+        print "Usage: startupbench.py plan.lap module.Class [...]"
+        return 2
+    # Java modules
+    from java.util.logging import Logger
+    # the package is imported as 'sposh' from its parent directory
+    here = os.path.dirname(os.path.abspath(sys.argv[0]))
+    sys.path.insert(0, os.path.dirname(here))
+    if here in sys.path:
+        sys.path.remove(here)
+    text, total = startupReport(args[0], args[1:],
+                                Logger.getLogger("startupbench"))
+    print text
+    if total > TARGET_MS:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,114 @@
+"""Tests of the checks that the plan builder performs on a plan, and of
+the senses that it gives for the built plan.
+
+Unreachable competences and action pattern are pruned from the plan, but
+only after all names of the plan have been checked. The tests are run by::
+
+    jython test_planbuilder.py
+"""
+
+# Python modules
+import unittest
+
+# Java modules
+from java.util.logging import Logger
+
+# POSH modules
+from behaviour import Behaviour
+from agent import Agent
+from lapparser import LAPParser
+
+# the unreachable competence is filled in by the tests
+PLAN = """(
+  %s
+  (C used (goal ((tired))) (elements
+     ((rest (trigger ((tired))) sleep))
+  ))
+  (SDC life (goal ((tired))) (drives
+     ((drive (trigger ((alive))) used))
+  ))
+)"""
+
+
+class World(Behaviour):
+    """Provides the actions and senses of the plan.
+    """
+    _discover_methods = 1
+
+    def action_sleep(self):
+        return 1
+
+    def sense_alive(self):
+        return 1
+
+    def sense_tired(self):
+        return 0
+
+
+class PruningTest(unittest.TestCase):
+    """Builds plans with an unreachable competence.
+    """
+    def setUp(self):
+        self.log = Logger.getLogger("sposh.test")
+
+    def build(self, unused, prune = 1, lazy = 0):
+        """Builds the plan with the given unreachable competence, and
+        returns its plan builder.
+        """
+        builder = LAPParser().parse(PLAN % unused)
+        builder.setPruning(prune)
+        builder.setLazy(lazy)
+        Agent([World(self.log)], "<pruning>", self.log,
+              plan_builder = builder)
+        return builder
+
+    def test_valid_unreachable(self):
+        builder = self.build("""(C unused (goal ((tired))) (elements
+            ((x (trigger ((tired))) sleep))))""")
+        self.assertEqual(builder.getPruned(), ["C.unused"])
+
+    def test_unknown_name(self):
+        unused = """(C unused (goal ((tired))) (elements
+            ((x (trigger ((tired))) no_such_action))))"""
+        for prune, lazy in ((1, 0), (1, 1), (0, 0), (0, 1)):
+            self.assertRaises(NameError, self.build, unused, prune, lazy)
+
+    def test_unknown_sense(self):
+        unused = """(C unused (goal ((tired))) (elements
+            ((x (trigger ((no_such_sense))) sleep))))"""
+        self.assertRaises(NameError, self.build, unused)
+
+    def test_name_clash(self):
+        unused = """(C alive (goal ((tired))) (elements
+            ((x (trigger ((tired))) used))))"""
+        self.assertRaises(NameError, self.build, unused)
+
+
+class SensesTest(unittest.TestCase):
+    """Counts the senses of the built plan.
+    """
+    def setUp(self):
+        self.log = Logger.getLogger("sposh.test")
+
+    def senses(self, intern):
+        """Builds the plan and returns the names of its senses.
+        """
+        builder = LAPParser().parse(PLAN % "")
+        builder.setInterning(intern)
+        agent = Agent([World(self.log)], "<senses>", self.log,
+                      plan_builder = builder)
+        names = [sense.getSenseName() for sense in agent.getPlanSenses()]
+        names.sort()
+        return names
+
+    def test_interned(self):
+        self.assertEqual(self.senses(1), ["alive", "tired"])
+
+    def test_not_interned(self):
+        # 'tired' is the goal of the drive collection and of the
+        # competence, and the trigger of the competence element
+        self.assertEqual(self.senses(0), ["alive", "tired", "tired", "tired"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""Tests of the time limits of competences and action patterns.
+
+The plans are run on the stepped timer of the agent, whose time advances
+by 1 millisecond per tick, and on a timer whose time is set before each
+tick, as by an engine that drives the agent with simulated time. The tests
+are run by::
+
+    jython test_timelimit.py
+"""
+
+# Python modules
+import unittest
+
+# Java modules
+from java.util.logging import Logger
+
+# POSH modules
+from behaviour import Behaviour
+from agent import Agent
+from lapparser import LAPParser
+
+# the root element of the single drive is filled in by the tests
+PLAN = """(
+  (C inner (seconds 0.005) (goal ((done))) (elements
+     ((step (trigger ((alive))) b))
+  ))
+  (C outer (goal ((done))) (elements
+     ((go-in (trigger ((alive))) inner))
+  ))
+  (AP slow (seconds 0.005) (a b a b a b a b a b))
+  (SDC life (goal ((game_over))) (drives
+     ((drive (trigger ((alive))) %s))
+  ))
+)"""
+
+
+class World(Behaviour):
+    """Records its actions. Its goal is reached after a given number of
+    actions, if any.
+    """
+    _discover_methods = 1
+
+    def __init__(self, log, goal = None):
+        Behaviour.__init__(self, log)
+        self.goal = goal
+        self.calls = []
+
+    def action_a(self):
+        self.calls.append('a')
+        return 1
+
+    def action_b(self):
+        self.calls.append('b')
+        return 1
+
+    def sense_alive(self):
+        return 1
+
+    def sense_done(self):
+        return self.goal != None and len(self.calls) >= self.goal
+
+    def sense_game_over(self):
+        return 0
+
+
+class TimeLimitTest(unittest.TestCase):
+    """Runs a plan whose single drive has the given root element.
+    """
+    def setUp(self):
+        self.log = Logger.getLogger("sposh.test")
+
+    def run_plan(self, root, ticks, step = None, goal = None):
+        """Runs the plan with the given root for the given ticks, and
+        returns the behaviour and the drive element. If a step is given,
+        the time is set to tick * step before each tick.
+        """
+        world = World(self.log, goal)
+        agent = Agent([world], "<%s>" % root, self.log,
+                      plan_builder = LAPParser().parse(PLAN % root))
+        element = agent.getDriveCollection().getElements()[0]. \
+                  getElements()[0]
+        for tick in range(ticks):
+            if step != None:
+                agent.getTimer().setTime(tick * step)
+            agent.followDrive()
+        return world, element
+
+    def test_competence_at_root(self):
+        # each action returns to the root, but the time in the
+        # competence runs on, and runs out after 5 ms
+        world, element = self.run_plan("inner", 30)
+        self.assertEqual(len(world.calls), 30)
+        self.assertEqual(element.getTimeouts(), 4)
+
+    def test_nested_competence(self):
+        world, element = self.run_plan("outer", 30)
+        self.assertEqual(element.getTimeouts(), 4)
+        # outer descends into inner every other tick
+        self.assertEqual(len(world.calls), 15)
+
+    def test_action_pattern(self):
+        # six actions in 5 ms, then the pattern is reset, and the drive
+        # element starts again at its root
+        world, element = self.run_plan("slow", 14)
+        self.assertEqual(''.join(world.calls), "abababababab" + "ab")
+        self.assertEqual(element.getTimeouts(), 2)
+        self.assertEqual(element.getState()[0].getName(), "slow")
+
+    def test_goal_ends_time(self):
+        # the goal is reached after 3 actions, which ends the time in
+        # the competence before it runs out
+        world, element = self.run_plan("inner", 30, goal = 3)
+        self.assertEqual(element.getTimeouts(), 0)
+
+    def test_set_time(self):
+        # 2 ms per tick, with the time set from outside
+        world, element = self.run_plan("inner", 30, 2)
+        self.assertEqual(element.getTimeouts(), 9)
+        world, element = self.run_plan("outer", 30, 2)
+        self.assertEqual(element.getTimeouts(), 9)
+
+    def test_jump_in_time(self):
+        world, element = self.run_plan("slow", 3, 1)
+        self.assertEqual(element.getTimeouts(), 0)
+        world, element = self.run_plan("slow", 3, 10)
+        # the pattern is entered at 0, and timed out at 10 and 20
+        self.assertEqual(element.getTimeouts(), 2)
+        self.assertEqual(''.join(world.calls), "aaa")
+
+
+if __name__ == '__main__':
+    unittest.main()
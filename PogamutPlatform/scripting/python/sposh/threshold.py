@@ -0,0 +1,161 @@
+"""Threshold indices for senses that are compared to numeric constants.
+
+Plans often compare the same sense to several constants in different
+elements, like '(health < 30)' and '(health >= 70)'. For each pure sense
+(see L{SPOSH.Behaviour.getPureSenses}) that is compared by '<', '<=', '>'
+or '>=' to at least two different constants, the plan builder creates a
+L{ThresholdIndex} that holds the sorted constants. The sense is then read
+only once per tick, and a binary search of its reading in the constants
+gives the truth value of all of these comparisons.
+
+The indices are built by the plan builder, and attached to their senses
+and the agent's tick listeners when the plan is put in place.
+"""
+
+# the predicates that are answered by the index
+_ORDER_PREDICATES = {"<": 1, "<=": 1, ">": 1, ">=": 1}
+
+
+def _isNumber(value):
+    """Returns if the given sense value is an int, long or float.
+    """
+    return type(value) == type(0) or type(value) == type(0L) or \
+           type(value) == type(0.0)
+
+
+def buildThresholdIndices(beh_dict, senses):
+    """Builds the threshold indices for the given senses.
+
+    @param beh_dict: The behaviour dictionary that provides the senses.
+    @type beh_dict: L{SPOSH.BehaviourDict}
+    @param senses: The senses of a plan.
+    @type senses: sequence of L{SPOSH.Sense}
+    @return: The threshold indices, one for each sense name that is
+        compared to at least two different constants.
+    @rtype: list of L{ThresholdIndex}
+    """
+    by_name = {}
+    for sense in senses:
+        name = sense.getSenseName()
+        if _ORDER_PREDICATES.has_key(sense.getPredicate()) and \
+           _isNumber(sense.getValue()) and beh_dict.isPureSense(name):
+            by_name.setdefault(name, []).append(sense)
+    indices = []
+    for name, name_senses in by_name.items():
+        values = {}
+        for sense in name_senses:
+            values[sense.getValue()] = 1
+        if len(values) > 1:
+            indices.append(ThresholdIndex(name_senses))
+    return indices
+
+
+class ThresholdIndex:
+    """The sorted constants that a single sense is compared to.
+
+    The index is a tick listener, which forgets the reading of the sense
+    at the start of each tick.
+    """
+    def __init__(self, senses):
+        """Initialises the index.
+
+        @param senses: The senses of the same name that compare its result
+            to a numeric constant by '<', '<=', '>' or '>='.
+        @type senses: sequence of L{SPOSH.Sense}
+        """
+        # the sense whose method is called, which might have been
+        # replaced by a wrapper after building the index
+        self._reader = senses[0]
+        values = {}
+        for sense in senses:
+            values[sense.getValue()] = 1
+        self._thresholds = values.keys()
+        self._thresholds.sort()
+        # (sense, position of its constant in the thresholds)
+        self._senses = []
+        for sense in senses:
+            self._senses.append((sense,
+                                 self._thresholds.index(sense.getValue())))
+        # the bounds of the reading in the current tick, or None
+        self._bounds = None
+
+    def getThresholds(self):
+        """Returns the sorted constants of the index.
+
+        @rtype: list of int, long or float
+        """
+        return self._thresholds
+
+    def attach(self):
+        """Makes the senses of the index use the index when fired.
+        """
+        for sense, position in self._senses:
+            sense.setThresholdIndex(self, position)
+
+    def detach(self):
+        """Makes the senses of the index compare their result again.
+        """
+        for sense, position in self._senses:
+            sense.setThresholdIndex(None, 0)
+
+    def tickStart(self, agent):
+        """Forgets the reading of the sense.
+        """
+        self._bounds = None
+
+    def tickEnd(self, agent, result):
+        """Does nothing.
+        """
+        pass
+
+    def _search(self, reading):
+        """Returns the bounds of the given reading in the thresholds.
+
+        @param reading: The result of the sense.
+        @type reading: any
+        @return: The number of thresholds smaller than the reading, and
+            the number of thresholds smaller than or equal to the reading.
+        @rtype: (int, int)
+        """
+        thresholds = self._thresholds
+        low, high = 0, len(thresholds)
+        while low < high:
+            middle = (low + high) / 2
+            if thresholds[middle] < reading:
+                low = middle + 1
+            else:
+                high = middle
+        lower = low
+        high = len(thresholds)
+        while low < high:
+            middle = (low + high) / 2
+            if reading < thresholds[middle]:
+                high = middle
+            else:
+                low = middle + 1
+        return lower, low
+
+    def holds(self, position, predicate):
+        """Returns if the reading of the sense compares to a threshold.
+
+        The sense is read at the first call in a tick.
+
+        @param position: The position of the threshold.
+        @type position: int
+        @param predicate: "<", "<=", ">" or ">=".
+        @type predicate: string
+        @return: If 'reading predicate threshold' holds.
+        @rtype: boolean
+        """
+        bounds = self._bounds
+        if bounds == None:
+            bounds = self._bounds = self._search(self._reader.read())
+        lower, upper = bounds
+        if predicate == "<":
+            return position >= upper
+        elif predicate == "<=":
+            return position >= lower
+        elif predicate == ">":
+            return position < lower
+        else:
+            return position < upper
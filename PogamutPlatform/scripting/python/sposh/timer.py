@@ -39,6 +39,11 @@ class TimerBase:
 
     This class defines the interface of an agent timer class.
     """
+    # the task to run instead of waiting in loopWait(), or None
+    _idle_task = None
+    # the milliseconds by which the current loop started late
+    _lateness = 0L
+
     def __init__(self):
         """Initialises the timer.
 
@@ -64,6 +69,17 @@ class TimerBase:
         """
         raise NotImplementedError
 
+    def setTime(self, time):
+        """Sets the current time in milliseconds.
+
+        Subsequent calls to L{time} continue from the given time. This
+        is used to restore the timer of an agent from a checkpoint.
+
+        @param time: The time in milliseconds.
+        @type time: long
+        """
+        raise NotImplementedError
+
     def loopEnd(self):
         """To be called at the end of each loop.
 
@@ -84,6 +100,31 @@ class TimerBase:
         """
         raise NotImplementedError
 
+    def getLateness(self):
+        """Returns how late the current loop started.
+
+        The lateness is the time by which the time inbetween the starts of
+        the last two loops exceeded the loop period. Only real-time timers
+        measure it; for all others it is 0.
+
+        @return: The lateness in milliseconds.
+        @rtype: long
+        """
+        return self._lateness
+
+    def setIdleTask(self, task):
+        """Sets the task to run when L{loopWait} would otherwise wait.
+
+        The task provides the method C{idle(deadline)}, which is given the
+        system time (in seconds, as returned by C{time.time()}) at which
+        the wait ends, and has to return before then. Only real-time
+        timers wait, and hence run the task.
+
+        @param task: The idle task, or None.
+        @type task: object providing idle()
+        """
+        self._idle_task = task
+
     def setLoopFreq(self, loop_freq):
         """Sets the new loop frequency and resets the timer.
 
@@ -122,6 +163,14 @@ class SteppedTimer(TimerBase):
         """
         return self._time
 
+    def setTime(self, time):
+        """Sets the state of the internal timer.
+
+        @param time: The new state of the internal timer.
+        @type time: long
+        """
+        self._time = long(time)
+
     def loopEnd(self):
         """Increases the internal timer by 1.
         """
@@ -160,7 +209,8 @@ class RealTimeTimer(TimerBase):
         self._last_return = 0
         self._proc_time = None
         self._freq = loop_freq
-        self._wait = float(1) / float(self._freq)
+        # the time of one loop in seconds, as used by time.sleep()
+        self._wait = float(self._freq) / 1000.0
         TimerBase.__init__(self)
 
     def reset(self):
@@ -171,6 +221,7 @@ class RealTimeTimer(TimerBase):
         """
         self._last_return = 0
         self._proc_time = None
+        self._lateness = 0L
         self._base = timestamp()
 
     def time(self):
@@ -181,6 +232,16 @@ class RealTimeTimer(TimerBase):
         """
         return timestamp() - self._base
 
+    def setTime(self, time):
+        """Moves the timer such that the given time has passed since
+        the last reset.
+
+        @param time: Time passed in milliseconds.
+        @type time: long
+        """
+        self._base = timestamp() - long(time)
+        self._proc_time = None
+
     def loopEnd(self):
         self._proc_time = self.time()
 
@@ -202,14 +263,36 @@ class RealTimeTimer(TimerBase):
         To make sure that the process time estimate is accurate, the
         timer has to be resetted (by calling L{reset}) just before the
         loop is started (for the first time, or after a pause).
+
+        If an idle task is set, it is run first, and the remaining time
+        is waited for.
+
+        The method also measures the lateness of the loop, as returned by
+        L{getLateness}.
         """
-        if self._proc_time == None:
-            return
         ts = self.time()
+        if self._proc_time != None:
+            self._lateness = max(0L, ts - self._last_return - self._freq)
+            self._sleep(ts)
+        self._last_return = self.time()
+
+    def _sleep(self, ts):
+        """Waits for the rest of the loop period.
+
+        @param ts: The current time in milliseconds.
+        @type ts: long
+        """
         pc = self._proc_time
-        diff = ts - pc
+        diff = (ts - pc) / 1000.0
         if diff >= self._wait:
             return            
+        if self._idle_task:
+            deadline = time.time() + self._wait - diff
+            self._idle_task.idle(deadline)
+            remaining = deadline - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+            return
         time.sleep(self._wait - diff)
         
     def setLoopFreq(self, loop_freq):
@@ -220,5 +303,5 @@ class RealTimeTimer(TimerBase):
         @type loop_freq: long.
         """
         self._freq = loop_freq
-        self._wait = float(1) / float(self._freq)
+        self._wait = float(self._freq) / 1000.0
         self.reset()
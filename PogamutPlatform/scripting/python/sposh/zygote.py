@@ -0,0 +1,87 @@
+"""Fast launching of agents from pre-parsed plan templates.
+
+Launching an agent imports the engine, registers its behaviours, and
+reads, parses and builds its plan. When many agents are launched, like
+when bots respawn between matches, a L{Zygote} does the work that is the
+same for all agents once: it imports the engine and the optional modules
+that the agents use, and parses each plan into a template. Agents are
+then spawned from the templates, such that only their behaviours are
+registered and their plan is built.
+
+The zygote takes the place of forking pre-initialised worker processes,
+which the JVM does not support: all agents run in the zygote's JVM, and
+the structure of each plan is shared by all agents that use the plan,
+rather than being copied for each of them. Everything that holds the
+state of an agent, like its behaviours and plan elements, is still
+created per agent. The zygote is used as follows::
+
+    zygote = Zygote([plan])
+    agent = zygote.spawn(behaviours, plan, log)
+"""
+
+# Java modules
+from java.io import File
+
+# POSH modules
+from agent import Agent
+from lapparser import LAPParser
+
+
+class Zygote:
+    """Spawns agents from pre-parsed plans.
+    """
+    def __init__(self, plans = (), modules = ()):
+        """Initialises the zygote, and parses the given plans.
+
+        @param plans: Names of the plans (complete path + file + extension)
+            to parse up front.
+        @type plans: sequence of strings
+        @param modules: Names of optional modules of the package to import
+            up front, like 'speculation' or 'parallelsense'.
+        @type modules: sequence of strings
+        """
+        # plan name -> (modification time, plan builder)
+        self._templates = {}
+        for module in modules:
+            __import__(module, globals(), locals(), [])
+        for plan in plans:
+            self.getTemplate(plan)
+
+    def getTemplate(self, plan):
+        """Returns the parsed plan of the given name.
+
+        The plan is parsed at the first call, and again if the plan file
+        changed since.
+
+        @param plan: Name of the plan (complete path + file + extension).
+        @type plan: string
+        @return: The parsed plan, which must not be built.
+        @rtype: L{SPOSH.PlanBuilder}
+        @raise ParseError: If the plan could not be parsed.
+        """
+        modified = File(plan).lastModified()
+        template = self._templates.get(plan)
+        if template == None or template[0] != modified:
+            template = (modified, LAPParser().parse(open(plan).read()))
+            self._templates[plan] = template
+        return template[1]
+
+    def getPlans(self):
+        """Returns the names of the parsed plans.
+
+        @rtype: list of strings
+        """
+        return self._templates.keys()
+
+    def spawn(self, behaviours, plan, log, recorder = None, lazy = 0):
+        """Creates an agent from the template of the given plan.
+
+        See L{SPOSH.Agent} for the parameters.
+
+        @return: The new agent.
+        @rtype: L{SPOSH.Agent}
+        @raise ParseError: If the plan could not be parsed.
+        @raise NameError: If the plan could not be built.
+        """
+        return Agent(behaviours, plan, log, recorder, lazy,
+                     self.getTemplate(plan).copy())
@@ -0,0 +1,62 @@
+"""A benchmark of launching agents with and without a zygote.
+
+The benchmark launches agents one after another, either cold, by
+creating each L{SPOSH.Agent} from its plan file, or from the templates of
+a L{SPOSH.zygote.Zygote}. It reports the mean time from the start of a
+launch to the end of the agent's first tick, and the heap bytes per
+agent. It is run as follows::
+
+    print launchReport(lambda log=log: [MyBehaviour(log)], plan, log)
+
+As all agents run in the same JVM, the memory of each agent is the
+growth of the used heap, rather than the memory of a process.
+"""
+
+# Python modules
+import time
+
+# POSH modules
+from agent import Agent
+from memreport import measureAgentBytes
+from zygote import Zygote
+
+
+def _launchTime(launch, n):
+    """Returns the mean milliseconds to launch an agent and tick it once.
+    """
+    total = 0.0
+    for i in range(n):
+        start = time.time()
+        launch().followDrive()
+        total = total + time.time() - start
+    return total * 1000.0 / n
+
+
+def launchReport(create_behaviours, plan, log, n = 50):
+    """Returns a report of cold and zygote launches.
+
+    @param create_behaviours: A function that creates the behaviours of
+        a single agent, taking no arguments.
+    @type create_behaviours: callable
+    @param plan: Name of the plan (complete path + file + extension).
+    @type plan: string
+    @param log: java.util.logging.Logger instance
+    @type log: java.util.logging.Logger
+    @param n: The number of agents to launch for each measurement.
+    @type n: int
+    @return: The report.
+    @rtype: string
+    """
+    start = time.time()
+    zygote = Zygote([plan])
+    template_ms = (time.time() - start) * 1000.0
+    cold = lambda c=create_behaviours, p=plan, l=log: Agent(c(), p, l)
+    spawned = lambda z=zygote, c=create_behaviours, p=plan, l=log: \
+              z.spawn(c(), p, l)
+    lines = ["%-12s%24s%20s" % ("launch", "ms to first tick",
+                                "bytes per agent")]
+    for name, launch in (("cold", cold), ("zygote", spawned)):
+        lines.append("%-12s%24.2f%20d" % (name, _launchTime(launch, n),
+                                          measureAgentBytes(launch, n)))
+    lines.append("zygote templates parsed once in %.2f ms" % template_ms)
+    return "\n".join(lines)